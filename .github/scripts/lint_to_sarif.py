@@ -0,0 +1,259 @@
+"""
+This script converts Android lint XML reports into SARIF, streaming them, and can drop the issues that a
+`lint-baseline.xml` already suppresses so that only new issues reach the upload.
+
+## Usage:
+1. Convert a report, next to it as `lint-results-debug.sarif`, without the issues of its module's baseline:
+   ```bash
+   python3 .github/scripts/lint_to_sarif.py app/build/reports/lint-results-debug.xml --auto-baseline
+   ```
+2. Or pick the output and the baselines explicitly:
+   ```bash
+   python3 .github/scripts/lint_to_sarif.py report.xml -o report.sarif --baseline app/lint-baseline.xml
+   ```
+3. Merge the SARIF files as usual with `merge_sarif.py`.
+
+## Note:
+Reports are read with `iterparse` and every `<issue>` is converted, written and discarded as soon as it ends, so
+memory stays flat whatever the report size; the rules (one per issue id) are written after the results.
+
+Baselines are indexed by issue id, file and line, as a multiset: each baseline entry suppresses one matching
+issue. Baselines written with `absolutePaths = false` name files relative to their module, or through Gradle path
+variables such as `${:automotive*fullDebug*MAIN*sourceProvider*0*javaDir*7}/io/...`, which cannot be resolved
+outside Gradle; files are therefore compared by their path below the source directory (`src/<set>/<kind>/`),
+or below the variable.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+from collections import Counter
+
+BASELINE_NAME = "lint-baseline.xml"
+REPORTS_DIRECTORY = os.path.join("build", "reports")
+
+# Lint severities, as SARIF levels
+LEVELS = {
+    "fatal": "error",
+    "error": "error",
+    "warning": "warning",
+    "information": "note",
+    "informational": "note",
+    "ignore": "none",
+}
+
+_SOURCE_ROOT = re.compile(r"(?:^|/)src/[^/]+/[^/]+/(.+)$")
+_PATH_VARIABLE = re.compile(r"^\$\{[^}]*\}/(.+)$")
+
+
+def source_path(path):
+    """Return the part of a lint file path that identifies it across baselines and reports"""
+    path = path.replace("\\", "/")
+    for pattern in (_PATH_VARIABLE, _SOURCE_ROOT):
+        match = pattern.search(path)
+        if match:
+            return match.group(1)
+    return os.path.normpath(path).replace(os.sep, "/")
+
+
+def iter_issues(path):
+    """Yield the `<issue>` elements of a lint XML file one at a time, freeing each one once it is consumed"""
+    root = None
+    for event, element in ET.iterparse(path, events=("start", "end")):
+        if root is None:
+            root = element
+        elif event == "end" and element.tag == "issue":
+            yield element
+            # Issues are children of the root; dropping them keeps the tree empty
+            root.clear()
+
+
+class BaselineIndex:
+    """Issues suppressed by lint baselines, counted by (issue id, source path, line)"""
+
+    def __init__(self, paths=()):
+        self.issues = Counter()
+        self.loaded = []
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        path = os.path.abspath(path)
+        if path in self.loaded:
+            return
+        self.loaded.append(path)
+        for issue in iter_issues(path):
+            location = issue.find("location")
+            if location is not None:
+                self.issues[self.key(issue.get("id"), location.get("file", ""), location.get("line"))] += 1
+
+    @staticmethod
+    def key(issue_id, file, line):
+        return issue_id, source_path(file), line or ""
+
+    def suppress(self, issue_id, file, line):
+        """Consume the baseline entry matching an issue; returns whether there was one"""
+        key = self.key(issue_id, file, line)
+        if self.issues[key] > 0:
+            self.issues[key] -= 1
+            return True
+        return False
+
+    @property
+    def unmatched(self):
+        return sum(self.issues.values())
+
+
+def module_directory(report):
+    """Return the Gradle module of a report under `<module>/build/reports/`, else the report's directory"""
+    directory = os.path.dirname(os.path.abspath(report))
+    if directory.endswith(os.sep + REPORTS_DIRECTORY):
+        return os.path.dirname(os.path.dirname(directory))
+    return directory
+
+
+def artifact_uri(file, module, root):
+    """Return a location URI relative to `root` when the file is inside it, else a file URI"""
+    path = file if os.path.isabs(file) else os.path.join(module, file)
+    relative = os.path.relpath(os.path.normpath(path), root)
+    if relative.startswith(".."):
+        return "file://" + os.path.normpath(path).replace(os.sep, "/")
+    return relative.replace(os.sep, "/")
+
+
+def _location(element, module, root):
+    region = {}
+    for attribute, name in (("line", "startLine"), ("column", "startColumn")):
+        value = element.get(attribute)
+        if value and value.isdigit() and int(value) > 0:
+            region[name] = int(value)
+    physical_location = {"artifactLocation": {"uri": artifact_uri(element.get("file", ""), module, root)}}
+    if region:
+        physical_location["region"] = region
+    return {"physicalLocation": physical_location}
+
+
+def _rule(issue):
+    rule = {
+        "id": issue.get("id"),
+        "shortDescription": {"text": issue.get("summary") or issue.get("id")},
+        "defaultConfiguration": {"level": LEVELS.get((issue.get("severity") or "").lower(), "warning")},
+        "properties": {"category": issue.get("category"), "priority": issue.get("priority")},
+    }
+    if issue.get("explanation"):
+        rule["fullDescription"] = {"text": issue.get("explanation")}
+    if issue.get("url"):
+        rule["helpUri"] = issue.get("url")
+    rule["properties"] = {key: value for key, value in rule["properties"].items() if value is not None}
+    return rule
+
+
+def convert(report, output, baseline=None, root="."):
+    """
+    Convert one lint XML report to a SARIF file, leaving out the issues `baseline` suppresses.
+    Returns (issues written, issues suppressed).
+    """
+    module = module_directory(report)
+    root = os.path.abspath(root)
+    rules = {}
+    occurrences = Counter()
+    written = suppressed = 0
+    with open(output, "w", encoding="utf-8") as file:
+        file.write('{\n"$schema": "https://json.schemastore.org/sarif-2.1.0.json",\n"version": "2.1.0",\n')
+        file.write('"runs": [{\n"results": [')
+        for issue in iter_issues(report):
+            locations = issue.findall("location")
+            primary = locations[0] if locations else None
+            if baseline is not None and primary is not None and baseline.suppress(
+                issue.get("id"), primary.get("file", ""), primary.get("line")
+            ):
+                suppressed += 1
+                continue
+            if issue.get("id") not in rules:
+                rules[issue.get("id")] = (len(rules), _rule(issue))
+            result = {
+                "ruleId": issue.get("id"),
+                "ruleIndex": rules[issue.get("id")][0],
+                "level": LEVELS.get((issue.get("severity") or "").lower(), "warning"),
+                "message": {"text": issue.get("message") or issue.get("summary") or issue.get("id")},
+            }
+            if primary is not None:
+                result["locations"] = [_location(primary, module, root)]
+                # Stable across line shifts: the issue, its file and the offending source line, plus an occurrence
+                # number for identical lines, like GitHub's own primaryLocationLineHash
+                fingerprint = hashlib.sha256("\0".join([
+                    issue.get("id") or "", source_path(primary.get("file", "")), (issue.get("errorLine1") or "").strip(),
+                ]).encode("utf-8")).hexdigest()[:32]
+                occurrences[fingerprint] += 1
+                result["partialFingerprints"] = {"lintIssue/v1": f"{fingerprint}:{occurrences[fingerprint]}"}
+            if len(locations) > 1:
+                result["relatedLocations"] = [
+                    dict(_location(location, module, root), id=index)
+                    for index, location in enumerate(locations[1:], 1)
+                ]
+            file.write(("," if written else "") + "\n" + json.dumps(result))
+            written += 1
+        tool = {
+            "driver": {
+                "name": "Android Lint",
+                "informationUri": "https://developer.android.com/studio/write/lint",
+                "rules": [rule for _, rule in rules.values()],
+            }
+        }
+        file.write('\n],\n"tool": ' + json.dumps(tool) + "\n}]\n}\n")
+    return written, suppressed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Convert Android lint XML reports to SARIF")
+    parser.add_argument("reports", nargs="+", metavar="REPORT", help="lint XML report, e.g. lint-results-debug.xml")
+    parser.add_argument(
+        "-o", "--output", metavar="FILE",
+        help="SARIF file to write (only with a single report; default: the report path with a .sarif extension)",
+    )
+    parser.add_argument(
+        "--baseline", action="append", default=[], metavar="FILE",
+        help="drop the issues suppressed by this lint baseline (repeatable)",
+    )
+    parser.add_argument(
+        "--auto-baseline", action="store_true",
+        help=f"drop the issues suppressed by the {BASELINE_NAME} of each report's module",
+    )
+    parser.add_argument(
+        "--root", default=".",
+        help="directory location URIs are made relative to (default: the working directory)",
+    )
+    args = parser.parse_args(argv)
+    if args.output and len(args.reports) > 1:
+        parser.error("--output can only be used with a single report")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    for report in args.reports:
+        output = args.output or os.path.splitext(report)[0] + ".sarif"
+        baselines = list(args.baseline)
+        if args.auto_baseline:
+            module_baseline = os.path.join(module_directory(report), BASELINE_NAME)
+            if os.path.isfile(module_baseline):
+                baselines.append(module_baseline)
+        baseline = BaselineIndex(baselines) if baselines else None
+        try:
+            written, suppressed = convert(report, output, baseline, args.root)
+        except (OSError, ET.ParseError) as e:
+            print(f"❌ Could not convert {report}: {e}")
+            return 1
+        message = f"Converted {report} to {output}: {written} issue(s)"
+        if baseline is not None:
+            message += f", {suppressed} suppressed by {', '.join(baselines)}, {baseline.unmatched} baseline entries unmatched"
+        print(message)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,6 @@
 """
 This script merges multiple SARIF (Static Analysis Results Interchange Format) files into a single SARIF file.
-It is designed to process SARIF files generated by static analysis tools, clean up file paths for compatibility 
+It is designed to process SARIF files generated by static analysis tools, clean up file paths for compatibility
 with GitHub annotations, and produce a consolidated SARIF file for easier reporting and analysis.
 
 ## Usage:
@@ -13,71 +13,1235 @@ with GitHub annotations, and produce a consolidated SARIF file for easier report
 ## Note:
 We merge `tool/driver/rules` and `results` JSON blocks from all the SARIF files so that Github can properly handle
 the annotations creation.
+
+Results are streamed: each SARIF file is read in chunks, every result is cleaned and written to a spool file as
+soon as it is parsed, and the output is assembled from the first file's structure, the deduplicated rules and the
+spooled results. Memory is bounded by the largest single result (plus the rules), not by the total number of
+findings, and the output is formatted like a `json.dump(..., indent=4)` of the fully merged document.
+
+Every run of every file is merged into the first run of the output. `ruleIndex` values are rewritten to point
+into the merged rule table, and a result reported twice (same rule and `partialFingerprints`, or same rule,
+locations and message when it has no fingerprints) is written once.
+
+SARIF files are discovered with a pruned `os.scandir` walk: VCS, IDE and Gradle caches are skipped, and inside a
+`build` directory only `reports` is searched. `--include` narrows the walk to directory patterns such as
+`*/build/reports`, `--exclude` drops matching paths, and `--manifest` merges an exact list of files instead.
+
+With `--category NAME=PATTERN[,PATTERN...]` (repeatable) one invocation writes one `merged_results.<name>.sarif`
+per category from a single discovery pass, parsing each file once even when it belongs to several categories.
+
+Every artifact location URI (results, related locations, code and thread flows, fixes, artifacts) is rewritten
+by `DEFAULT_URI_REWRITES` plus any `--rewrite-uri` rules, matched with a trie and memoized per URI. The roots of
+`originalUriBaseIds` are only rewritten by anchored (`^`) rules, so relative locations keep resolving into the
+checkout.
+
+`--compact` drops the indentation and `--gzip` compresses the output. When the output would exceed the GitHub
+code scanning limits (25,000 results, 10 MB gzip-compressed) it is split into `merged_results.shard-N.sarif`
+files, filled by severity so errors always land in the first shard; the upload-sarif-results action uploads
+up to `MAX_SHARDS` of them, each under its own category. Code scanning only closes the alerts of a category
+when that category is uploaded again, so `--pad-shards` writes an empty document for every shard up to
+`--max-shards` that has no results this time: a category whose results are fixed or moved to another shard
+is then uploaded empty instead of keeping its alerts open.
+
+With `--cache-dir` the cleaned results of each input file are cached under the hash of its content, so reruns
+only parse the files that changed. Every output gets a `<output>.sha256` next to it; with a cache, a run whose
+outputs hash the same as the last run with the same `--output-key` reports `changed=false` to `$GITHUB_OUTPUT`
+so the upload can be skipped.
+
+`--baseline FILE` indexes a reference SARIF by the same fingerprint used for deduplication and writes only the
+results that are new, or whose level or message changed; `--baseline-summary` writes the new, changed,
+unchanged and fixed counts as JSON.
+
+`--sqlite FILE` indexes the merged outputs into a SQLite database for `sarif_query.py`.
+
+`--validate` checks every input, inside the parse workers and while it is streamed, against the SARIF subset
+defined in `sarif_schema.py`; the first invalid file stops the run before anything is merged.
+
+Files are parsed and normalized in a process pool (`--jobs`, one spool per file) and merged in discovery order,
+so the output is the same whatever the number of workers.
 """
 
+import argparse
+import copy
+import fnmatch
 import json
 import glob
 import os
+import sys
+import re
+import struct
+import hashlib
+import gzip
+import tempfile
+import shutil
+import time
+import zlib
+from collections import Counter, namedtuple
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+
+from sarif_schema import SarifValidationError, check_document, check_result, check_tool
 
 # Directory containing SARIF files
-sarif_directory = "."
-output_file = os.path.join(sarif_directory, "merged_results.sarif")
+SARIF_DIRECTORY = "."
+OUTPUT_FILE = os.path.join(SARIF_DIRECTORY, "merged_results.sarif")
+
+# Directories never holding SARIF reports, skipped during discovery
+PRUNED_DIRECTORIES = frozenset({".git", ".gradle", ".idea", ".cxx", ".kotlin", "node_modules"})
+# Inside a Gradle `build` directory only these hold reports; intermediates, generated sources and caches are skipped
+BUILD_DIRECTORY = "build"
+BUILD_REPORT_DIRECTORIES = frozenset({"reports"})
+
+# URI rewrites applied to every artifact location, as (pattern, replacement); a leading `^` anchors the pattern.
+# Removing 'work/android/android/' turns CI paths into ones Github can create annotations for
+DEFAULT_URI_REWRITES = (("work/android/android/", ""),)
+
+# Characters read from a SARIF file at a time
+CHUNK_SIZE = 1 << 16
+
+# `runs[0].results` of the merged document sits at this depth with `indent=4`, so its items are written with
+# a 16 space prefix and its closing bracket with a 12 space one
+RESULT_INDENT = " " * 16
+RESULTS_CLOSE_INDENT = " " * 12
+
+# How a merged result compares with the --baseline; `fixed` counts the baseline results no longer reported
+BASELINE_STATUSES = ("new", "changed", "unchanged")
+
+# Result levels from the most to the least severe; shards are filled in this order
+LEVELS = ("error", "warning", "note", "none")
+
+# GitHub code scanning rejects uploads above 10 MB gzip-compressed and runs above 25,000 results
+MAX_UPLOAD_BYTES = 10 * 1000 * 1000
+MAX_RESULTS = 25000
+# The upload-sarif-results action uploads at most this many shards
+MAX_SHARDS = 4
+# gzip header and trailer, plus the final deflate block
+GZIP_OVERHEAD = 64
+
+# Cached chunks are keyed by input content; bump the version whenever normalization or the spool format changes
+CACHE_VERSION = 3
+# Chunks unused for this long are pruned
+CACHE_MAX_AGE = 14 * 24 * 60 * 60
 
-print(f"Looking for SARIF files in: {sarif_directory}")
+# Spool records: deduplication key, then the content digest, level and length of the serialized result
+_KEY_SIZE = 16
+_RECORD_HEADER = struct.Struct("<8sBI")
 
-# Initialize the merged SARIF structure
-merged_sarif = None
-merged_results = []
-# Use a dictionary to track unique rules by their 'id'
-unique_rules = {}
+Category = namedtuple("Category", ["name", "patterns"])
+ParseOptions = namedtuple(
+    "ParseOptions", ["compact", "cache_directory", "rewrites", "validate"],
+    defaults=[False, None, DEFAULT_URI_REWRITES, False],
+)
+OutputLimits = namedtuple(
+    "OutputLimits", ["compact", "gzip", "max_results", "max_bytes", "max_shards", "pad_shards"], defaults=[False]
+)
+# shards: [(path, result count)]
+# baseline: Counter of new, changed and unchanged results, or None without --baseline
+# padding: [path] of the empty shards written with --pad-shards
+MergeSummary = namedtuple("MergeSummary", ["shards", "duplicates", "dropped", "baseline", "padding"])
+
+_DECODER = json.JSONDecoder()
+_NON_WHITESPACE = re.compile(r"\S")
+
+
+class UriRewriter:
+    """
+    Rewrites URIs with (pattern, replacement) rules held in a trie. A pattern starting with `^` only matches at
+    the start of a URI; other patterns are replaced wherever they occur, left to right, the longest one winning
+    at each position. Rewritten URIs are memoized and interned, since a large report repeats the same few
+    thousand paths over and over.
+    """
+
+    MEMO_LIMIT = 1 << 16
+
+    def __init__(self, rewrites=DEFAULT_URI_REWRITES):
+        self.anchored = {}
+        self.floating = {}
+        for pattern, replacement in rewrites:
+            trie = self.anchored if pattern.startswith("^") else self.floating
+            pattern = pattern[1:] if pattern.startswith("^") else pattern
+            if not pattern:
+                raise ValueError("URI rewrite patterns must not be empty")
+            node = trie
+            for character in pattern:
+                node = node.setdefault(character, {})
+            # Characters are one long, so the empty key marks the end of a pattern
+            node[""] = replacement
+        self.memo = {}
+
+    @staticmethod
+    def _longest_match(trie, uri, start):
+        """Return (end, replacement) of the longest pattern of `trie` at `uri[start:]`, or None"""
+        match = None
+        node = trie
+        position = start
+        while True:
+            if "" in node:
+                match = position, node[""]
+            if position == len(uri):
+                return match
+            node = node.get(uri[position])
+            if node is None:
+                return match
+            position += 1
+
+    def _rewrite(self, uri):
+        parts = []
+        start = 0
+        if self.anchored:
+            match = self._longest_match(self.anchored, uri, 0)
+            if match:
+                start, replacement = match
+                parts.append(replacement)
+        position = start
+        while self.floating and position < len(uri):
+            match = uri[position] in self.floating and self._longest_match(self.floating, uri, position)
+            if match:
+                parts.append(uri[start:position])
+                parts.append(match[1])
+                position = start = match[0]
+            else:
+                position += 1
+        parts.append(uri[start:])
+        return "".join(parts)
+
+    def __call__(self, uri):
+        rewritten = self.memo.get(uri)
+        if rewritten is None:
+            if len(self.memo) >= self.MEMO_LIMIT:
+                self.memo.clear()
+            rewritten = self.memo[uri] = sys.intern(self._rewrite(uri))
+        return rewritten
+
+    def rewrite_locations(self, value):
+        """
+        Rewrite, in place, every `uri` member of a SARIF object and its descendants. Only artifact locations have
+        one: `locations`, `relatedLocations`, `codeFlows`/`threadFlows`, `stacks`, `fixes`, `artifacts` and the
+        like. `originalUriBaseIds` is left to `rewrite_base_ids`.
+        """
+        pending = [value]
+        while pending:
+            current = pending.pop()
+            if isinstance(current, dict):
+                for key, item in current.items():
+                    if key == "uri" and isinstance(item, str):
+                        current[key] = self(item)
+                    elif key != "originalUriBaseIds" and isinstance(item, (dict, list)):
+                        pending.append(item)
+            else:
+                pending.extend(item for item in current if isinstance(item, (dict, list)))
+
+
+    def rewrite_base_ids(self, run):
+        """
+        Rewrite, in place, the root URIs of a run's `originalUriBaseIds` with the anchored rules only. Relative
+        locations resolve against these roots: a floating rule, such as the default one, would turn
+        `file:///home/runner/work/android/android/` into `file:///home/runner/` and move every one of them out
+        of the checkout.
+        """
+        for base in (run.get("originalUriBaseIds") or {}).values():
+            if not isinstance(base, dict) or not isinstance(base.get("uri"), str) or not self.anchored:
+                continue
+            match = self._longest_match(self.anchored, base["uri"], 0)
+            if match:
+                base["uri"] = match[1] + base["uri"][match[0]:]
+
+
+def resolve_uri(artifact_location, base_ids):
+    """
+    Return the URI an artifact location stands for: its `uri` when absolute, else the `uri` joined to the root
+    of its `uriBaseId` (itself resolved, as roots may be relative to other roots). Returns None when a base id
+    is undefined.
+    """
+    uri = artifact_location.get("uri", "")
+    base_id = artifact_location.get("uriBaseId")
+    seen = set()
+    while base_id is not None and not re.match(r"[A-Za-z][A-Za-z0-9+.-]*:", uri):
+        base = (base_ids or {}).get(base_id)
+        if not isinstance(base, dict) or base_id in seen:
+            return None
+        seen.add(base_id)
+        uri = base.get("uri", "") + uri
+        base_id = base.get("uriBaseId")
+    return uri
+
+
+_REWRITERS = {}
+
+
+def uri_rewriter(rewrites):
+    """Return the rewriter of a rule set, built once per process"""
+    rewrites = tuple(map(tuple, rewrites))
+    if rewrites not in _REWRITERS:
+        _REWRITERS[rewrites] = UriRewriter(rewrites)
+    return _REWRITERS[rewrites]
 
 
 # Function to clean the 'uri' field inside 'artifactLocation' blocks from CI paths so that Github
 # can interpret them correctly and create the annotation.
-def clean_artifact_location_uris(results):
+def clean_artifact_location_uris(results, rewrites=DEFAULT_URI_REWRITES):
+    rewriter = uri_rewriter(rewrites)
     for result in results:
-        locations = result.get("locations", [])
-        for location in locations:
-            physical_location = location.get("physicalLocation", {})
-            artifact_location = physical_location.get("artifactLocation", {})
-            if "uri" in artifact_location and isinstance(artifact_location["uri"], str):
-                # Remove 'work/android/android/' from the URI
-                artifact_location["uri"] = artifact_location["uri"].replace(
-                    "work/android/android/", ""
-                )
+        rewriter.rewrite_locations(result)
 
 
-# Iterate over all SARIF files in the directory
-for sarif_file in glob.glob(
-    os.path.join(sarif_directory, "**/*.sarif"), recursive=True
-):
-    print(f"Processing SARIF file: {sarif_file}")
-    with open(sarif_file, "r") as file:
-        sarif_data = json.load(file)
-        if merged_sarif is None:
-            # Use the first file's structure as the base
-            merged_sarif = sarif_data
-        # Merge the `results` array
-        merged_results.extend(sarif_data.get("runs", [])[0].get("results", []))
-        # Merge the `rules` array, ensuring no duplicates by using the rule ID
-        for rule in sarif_data.get("runs", [])[0].get("tool", {}).get("driver", {}).get("rules", []):
-            rule_id = rule.get("id")
-            if rule_id and rule_id not in unique_rules:
-                unique_rules[rule_id] = rule
+class JsonStreamReader:
+    """Pulls JSON values out of a text file chunk by chunk, so a document never has to fit in memory at once."""
+
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def _fill(self, minimum=0):
+        # Drop what was consumed, then read at least `minimum` more characters
+        self.buffer = self.buffer[self.position:]
+        self.position = 0
+        data = self.file.read(max(self.chunk_size, minimum))
+        if not data:
+            self.eof = True
+        self.buffer += data
+        return bool(data)
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it, or '' at the end of the file."""
+        while True:
+            match = _NON_WHITESPACE.search(self.buffer, self.position)
+            if match:
+                self.position = match.start()
+                return self.buffer[self.position]
+            self.position = len(self.buffer)
+            if not self._fill():
+                return ""
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise json.JSONDecodeError(f"Expected one of {characters!r}", self.buffer, self.position)
+        self.position += 1
+        return character
+
+    def value(self):
+        """Decode the next complete value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.position)
+                # A number at the very end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Grow geometrically so a large value is not re-parsed once per chunk
+            self._fill(len(self.buffer) - self.position)
+
+    def members(self):
+        """Yield the keys of the next object; the caller must consume each value before resuming."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.position += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    def items(self):
+        """Yield the indexes of the next array; the caller must consume each item before resuming."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.position += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self.expect(",]") == "]":
+                return
+
+
+def read_sarif(path, on_result):
+    """
+    Read a SARIF file, passing every result to `on_result(run_index, result, run)` as soon as it is parsed, where
+    `run` holds the members of the run read so far. Returns the rest of the document, with the `results` of every
+    run left empty.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as file:
+        reader = JsonStreamReader(file)
+        document = {}
+        for key in reader.members():
+            if key != "runs":
+                document[key] = reader.value()
+                continue
+            runs = document["runs"] = []
+            for run_index in reader.items():
+                run = {}
+                for run_key in reader.members():
+                    if run_key != "results":
+                        run[run_key] = reader.value()
+                        continue
+                    run["results"] = []
+                    for _ in reader.items():
+                        on_result(run_index, reader.value(), run)
+                runs.append(run)
+        return document
+
+
+def run_rules(run):
+    return run.get("tool", {}).get("driver", {}).get("rules", [])
+
+
+def _rule_placeholder(run_index, rule_index):
+    # Serialized as "\u0000<run>:<index>\u0000", which no real SARIF string is; replaced by the merged rule index
+    return f"\0{run_index}:{rule_index}\0"
+
+
+_RULE_PLACEHOLDER = re.compile(rb'"\\u0000(\d+):(-?\d+)\\u0000"')
+
+
+def result_key(result):
+    """
+    Return the deduplication key of a cleaned result: its rule and `partialFingerprints` when it has any,
+    otherwise its rule, locations (URI and region) and message.
+    """
+    rule = result.get("ruleId")
+    if rule is None:
+        rule = result.get("rule", {}).get("id", result.get("ruleIndex", result.get("rule", {}).get("index")))
+    fingerprints = result.get("partialFingerprints")
+    if fingerprints:
+        identity = [rule, fingerprints]
+    else:
+        identity = [
+            rule,
+            [
+                [
+                    location.get("physicalLocation", {}).get("artifactLocation", {}).get("uri"),
+                    location.get("physicalLocation", {}).get("region"),
+                ]
+                for location in result.get("locations", [])
+            ],
+            result.get("message"),
+        ]
+    return hashlib.blake2b(json.dumps(identity, sort_keys=True).encode("utf-8"), digest_size=16).digest()
+
+
+def result_level(result, run, rule_levels):
+    """
+    Return the position in LEVELS of a result's level: its own `level`, else the default level of its rule when
+    the run's rules were read before its results, else `warning` as SARIF specifies.
+    `rule_levels` caches ({rule index: level}, {rule id: level}) per run.
+    """
+    level = result.get("level")
+    if level not in LEVELS:
+        level = None
+        if "tool" in run:
+            if id(run) not in rule_levels:
+                by_index, by_id = {}, {}
+                for index, rule in enumerate(run_rules(run)):
+                    default = rule.get("defaultConfiguration", {}).get("level")
+                    if default in LEVELS:
+                        by_index[index] = default
+                        by_id.setdefault(rule.get("id"), default)
+                rule_levels[id(run)] = (by_index, by_id)
+            by_index, by_id = rule_levels[id(run)]
+            level = by_index.get(result.get("ruleIndex"), by_id.get(result.get("ruleId")))
+    return LEVELS.index(level or "warning")
+
+
+def serialize_result(result, compact):
+    """Serialize a result for its place in `runs[0].results` of the merged document"""
+    if compact:
+        return json.dumps(result, separators=(",", ":"))
+    return RESULT_INDENT + json.dumps(result, indent=4).replace("\n", "\n" + RESULT_INDENT)
+
+
+def content_digest(result):
+    """Return an 8 byte digest of what may change in a result whose deduplication key stays the same"""
+    content = [result.get("level"), result.get("kind"), result.get("message")]
+    return hashlib.blake2b(json.dumps(content, sort_keys=True).encode("utf-8"), digest_size=8).digest()
+
+
+class ResultSpool:
+    """
+    Temporary file collecting the serialized results of one SARIF file, as records of a 16 byte deduplication
+    key, an 8 byte content digest, a 1 byte level, a 4 byte length and the result text formatted for its place in
+    the merged document.
+    """
+
+    def __init__(self, directory, compact=False, rewrites=DEFAULT_URI_REWRITES):
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix=".results")
+        self.file = os.fdopen(fd, "wb")
+        self.compact = compact
+        self.rewriter = uri_rewriter(rewrites)
+        self.count = 0
+        self.rule_levels = {}
+
+    def add(self, run_index, result, run):
+        self.rewriter.rewrite_locations(result)
+        key = result_key(result)
+        content = content_digest(result)
+        level = result_level(result, run, self.rule_levels)
+        # Rule indexes point into this run's rule table; they are rewritten against the merged one when written
+        if isinstance(result.get("ruleIndex"), int):
+            result["ruleIndex"] = _rule_placeholder(run_index, result["ruleIndex"])
+        rule = result.get("rule")
+        if isinstance(rule, dict) and isinstance(rule.get("index"), int) and "toolComponent" not in rule:
+            rule["index"] = _rule_placeholder(run_index, rule["index"])
+        text = serialize_result(result, self.compact).encode("utf-8")
+        self.file.write(key + _RECORD_HEADER.pack(content, level, len(text)) + text)
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+def read_spool(path):
+    """Yield the (key, content digest, level, text) records of a spool file"""
+    header_size = _KEY_SIZE + _RECORD_HEADER.size
+    with open(path, "rb") as spool:
+        while True:
+            header = spool.read(header_size)
+            if not header:
+                return
+            content, level, length = _RECORD_HEADER.unpack_from(header, _KEY_SIZE)
+            yield header[:_KEY_SIZE], content, level, spool.read(length)
+
+
+def file_digest(path, prefix=b""):
+    """Return the SHA-256 hex digest of `prefix` followed by the content of `path`"""
+    digest = hashlib.sha256(prefix)
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_paths(cache_directory, key):
+    """Return the (spool, document) paths of a cached chunk"""
+    directory = os.path.join(cache_directory, f"v{CACHE_VERSION}", "chunks", key[:2])
+    return os.path.join(directory, f"{key}.results"), os.path.join(directory, f"{key}.json")
+
+
+def load_chunk(cache_directory, key):
+    """Return the cached (document, spool path, result count) of a chunk, or None when it is not cached"""
+    spool_path, document_path = chunk_paths(cache_directory, key)
+    try:
+        with open(document_path, "r", encoding="utf-8") as file:
+            chunk = json.load(file)
+        if not os.path.isfile(spool_path):
+            return None
+        # Keep chunks in use from being pruned
+        os.utime(document_path)
+        os.utime(spool_path)
+    except (OSError, ValueError):
+        return None
+    return chunk["document"], spool_path, chunk["count"]
+
+
+def store_chunk(cache_directory, key, document, spool):
+    """Move a finished spool into the cache next to its document; returns the cached spool path"""
+    spool_path, document_path = chunk_paths(cache_directory, key)
+    os.replace(spool.path, spool_path)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(document_path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as file:
+        json.dump({"document": document, "count": spool.count}, file)
+    os.replace(temp_path, document_path)
+    return spool_path
+
+
+def prune_cache(cache_directory, max_age=CACHE_MAX_AGE):
+    """Remove cached chunks not used for `max_age` seconds, and the chunks of older cache versions"""
+    now = time.time()
+    for entry in os.scandir(cache_directory):
+        if entry.is_dir() and entry.name.startswith("v") and entry.name != f"v{CACHE_VERSION}":
+            shutil.rmtree(entry.path, ignore_errors=True)
+    for directory, _, files in os.walk(os.path.join(cache_directory, f"v{CACHE_VERSION}", "chunks")):
+        for name in files:
+            path = os.path.join(directory, name)
+            try:
+                if now - os.stat(path).st_mtime > max_age:
+                    os.remove(path)
+            except OSError:
+                pass
 
 
-# Clean up 'uri' fields in the 'artifactLocation' blocks
-clean_artifact_location_uris(merged_results)
+def validating(sarif_file, on_result):
+    """Wrap a `read_sarif` callback so that every result, and every run's tool, is validated before it is used"""
+    next_indexes = {}
+    checked_tools = set()
 
-# Update the merged SARIF structure with the combined results
-if merged_sarif:
-    merged_sarif["runs"][0]["results"] = merged_results
-    merged_sarif["runs"][0]["tool"]["driver"]["rules"] = list(unique_rules.values())
+    def on_valid_result(run_index, result, run):
+        index = next_indexes.get(run_index, 0)
+        next_indexes[run_index] = index + 1
+        if run_index not in checked_tools and "tool" in run:
+            # Usually read before the results, so a bad tool is rejected before any result is spooled
+            check_tool(run["tool"], sarif_file, f"/runs/{run_index}/tool")
+            checked_tools.add(run_index)
+        check_result(result, sarif_file, f"/runs/{run_index}/results/{index}")
+        on_result(run_index, result, run)
+
+    return on_valid_result
+
+
+def process_sarif(sarif_file, spool_directory, options=ParseOptions()):
+    """
+    Parse one SARIF file and spool its cleaned, serialized results, or reuse the chunk cached for identical
+    content. Runs in a worker process; returns (path, document without results, spool path, result count,
+    whether the chunk was cached) for the ordered merge. With `options.validate`, raises SarifValidationError
+    at the first part of the file that does not match the schema.
+    """
+    key = None
+    spool = None
+    try:
+        if options.cache_directory:
+            # The spool depends on --compact, the URI rewrites and validation, so they are part of the key
+            key = file_digest(
+                sarif_file, json.dumps([options.compact, options.rewrites, options.validate]).encode("utf-8") + b"\0"
+            )
+            cached = load_chunk(options.cache_directory, key)
+            if cached:
+                return (sarif_file, *cached, True)
+            spool_directory = os.path.dirname(chunk_paths(options.cache_directory, key)[0])
+            os.makedirs(spool_directory, exist_ok=True)
+        spool = ResultSpool(spool_directory, options.compact, options.rewrites)
+        on_result = validating(sarif_file, spool.add) if options.validate else spool.add
+        document = read_sarif(sarif_file, on_result)
+        if options.validate:
+            check_document(document, sarif_file)
+        # Run-level locations too (`artifacts`, invocation working directories); base id roots only by anchored rules
+        for run in document.get("runs", []):
+            spool.rewriter.rewrite_locations(run)
+            spool.rewriter.rewrite_base_ids(run)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        if spool is not None and key:
+            spool.close()
+            os.remove(spool.path)
+        if options.validate:
+            raise SarifValidationError(sarif_file, "", f"invalid JSON: {e}") from None
+        raise
+    except BaseException:
+        if spool is not None:
+            spool.close()
+            if key:
+                os.remove(spool.path)
+        raise
+    spool.close()
+    spool_path = store_chunk(options.cache_directory, key, document, spool) if key else spool.path
+    return sarif_file, document, spool_path, spool.count, False
+
+
+def process_all(sarif_files, spool_directory, jobs, options=ParseOptions()):
+    """
+    Yield the processed SARIF files in input order, parsing up to `jobs` of them at once. The first failure
+    of any file is raised as soon as it happens, without waiting for the files before it.
+    """
+    if jobs == 1 or len(sarif_files) < 2:
+        for sarif_file in sarif_files:
+            yield process_sarif(sarif_file, spool_directory, options)
+        return
+    with ProcessPoolExecutor(max_workers=min(jobs, len(sarif_files))) as pool:
+        futures = [pool.submit(process_sarif, sarif_file, spool_directory, options) for sarif_file in sarif_files]
+        wait(futures, return_when=FIRST_EXCEPTION)
+        for future in futures:
+            if future.done() and future.exception() is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise future.exception()
+        for future in futures:
+            yield future.result()
+
+
+class Baseline:
+    """
+    The results of a reference SARIF file, indexed by deduplication key (the stable fingerprint) with their
+    content digest. `matched` collects the keys found again in any output, so the rest were fixed.
+    """
+
+    def __init__(self, paths, rewrites=DEFAULT_URI_REWRITES):
+        self.index = {}
+        self.matched = set()
+        rewriter = uri_rewriter(rewrites)
+
+        def add(run_index, result, run):
+            # Normalized like the results being merged, so the keys compare
+            rewriter.rewrite_locations(result)
+            self.index.setdefault(result_key(result), content_digest(result))
+
+        for path in paths:
+            read_sarif(path, add)
+
+    @property
+    def fixed(self):
+        return len(self.index) - len(self.matched)
+
+    def classify(self, key, content):
+        """Return whether a result is `new`, `changed` or `unchanged` relative to the baseline"""
+        baseline_content = self.index.get(key)
+        if baseline_content is None:
+            return "new"
+        self.matched.add(key)
+        return "unchanged" if baseline_content == content else "changed"
+
+
+def merged_records(spools, stats, baseline=None):
+    """
+    Yield the (level, text) of the spooled results in spool order, skipping duplicates and, with a `baseline`,
+    the results it already has unchanged; `stats` counts them, and the new and changed results. Rule indexes
+    are rewritten: `spools` holds (spool path, {(run, local rule index): merged rule index}) pairs.
+    """
+    seen = set()
+    for path, rule_indexes in spools:
+        def merged_index(match):
+            return str(rule_indexes.get((int(match.group(1)), int(match.group(2))), -1)).encode("ascii")
+
+        for key, content, level, text in read_spool(path):
+            if key in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(key)
+            if baseline is not None:
+                status = baseline.classify(key, content)
+                stats[status] += 1
+                if status == "unchanged":
+                    continue
+            if b"\\u0000" in text:
+                text = _RULE_PLACEHOLDER.sub(merged_index, text)
+            yield level, text
+
+
+class ShardWriter:
+    """
+    Writes one output file, plain or gzip-compressed, while tracking an upper bound of its gzip-compressed size:
+    the compressed bytes produced so far plus the input the compressor has not flushed yet.
+    """
+
+    def __init__(self, path, compress):
+        self.path = path
+        self.compress = compress
+        self.file = open(path, "wb")
+        # Without --gzip the size only has to be bounded, so the fastest level (which compresses worst) is enough
+        self.compressor = zlib.compressobj(6 if compress else 1, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self.compressed = 0
+        self.pending = 0
+        self.count = 0
+
+    def write(self, data):
+        output = self.compressor.compress(data)
+        if output:
+            self.compressed += len(output)
+            self.pending = len(data)
+        else:
+            self.pending += len(data)
+        self.file.write(output if self.compress else data)
+
+    def size_bound(self):
+        return self.compressed + self.pending + GZIP_OVERHEAD
+
+    def flush(self):
+        """Flush the compressor so that the size bound becomes exact, at the cost of a few bytes"""
+        output = self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.compressed += len(output)
+        self.pending = 0
+        if self.compress:
+            self.file.write(output)
+
+    def close(self):
+        output = self.compressor.flush()
+        self.compressed += len(output)
+        if self.compress:
+            self.file.write(output)
+        self.file.close()
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.path)
+
+
+def shard_output_file(output_file, number, compress=False):
+    """Return the path of shard `number` (from 1) of an output, e.g. `merged_results.shard-2.sarif`"""
+    if number > 1:
+        stem, extension = os.path.splitext(output_file)
+        output_file = f"{stem}.shard-{number}{extension}"
+    return output_file + ".gz" if compress else output_file
+
+
+def remove_stale_shards(output_file):
+    """Remove the shards and gzip outputs a previous run wrote for `output_file`"""
+    stem, extension = os.path.splitext(output_file)
+    stale = glob.glob(f"{glob.escape(stem)}.shard-*{extension}") + glob.glob(f"{glob.escape(stem)}.shard-*{extension}.gz")
+    for path in stale + [output_file, output_file + ".gz"]:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def write_merged(output_file, merged_sarif, spools, limits, baseline=None):
+    """
+    Write `merged_sarif` with the spooled results spliced in as `runs[0].results`. When one file would exceed the
+    result count or compressed size of `limits`, the results are split into shards by severity, errors first,
+    each shard a complete SARIF document. With a `baseline`, only new and changed results are written.
+    With `limits.pad_shards`, empty shards are written up to `limits.max_shards`. Returns a MergeSummary.
+    """
+    marker = "merged-results-placeholder"
+    while marker in json.dumps(merged_sarif):
+        marker += "-"
+    merged_sarif["runs"][0]["results"] = marker
+    if limits.compact:
+        document = json.dumps(merged_sarif, separators=(",", ":"))
+        opening, separator, closing = b"[", b",", b"]"
+    else:
+        document = json.dumps(merged_sarif, indent=4)
+        opening, separator, closing = b"[\n", b",\n", b"\n" + RESULTS_CLOSE_INDENT.encode("ascii") + b"]"
+    head, tail = (part.encode("utf-8") for part in document.split(json.dumps(marker), 1))
+    remove_stale_shards(output_file)
+
+    def fits(writer, text):
+        if writer.count >= limits.max_results:
+            return False
+        needed = len(separator) + len(text) + len(closing) + len(tail)
+        if writer.size_bound() + needed <= limits.max_bytes:
+            return True
+        # The bound counts unflushed input as uncompressed; only pay for a flush once it gets close to the limit
+        if writer.pending:
+            writer.flush()
+        return writer.size_bound() + needed <= limits.max_bytes
+
+    def open_shard(number):
+        writer = ShardWriter(shard_output_file(output_file, number, limits.gzip), limits.gzip)
+        writer.write(head)
+        return writer
+
+    def close_shard(writer):
+        writer.write(closing + tail if writer.count else b"[]" + tail)
+        writer.close()
+        return writer.path, writer.count
+
+    def summary(shards, stats, dropped):
+        baseline_stats = Counter({status: stats[status] for status in BASELINE_STATUSES}) if baseline else None
+        padding = []
+        if limits.pad_shards:
+            for number in range(len(shards) + 1, limits.max_shards + 1):
+                padding.append(close_shard(open_shard(number))[0])
+        return MergeSummary(shards, stats["duplicates"], dropped, baseline_stats, padding)
+
+    # Usually everything fits in one file, written in input order
+    stats = Counter()
+    writer = open_shard(1)
+    for _, text in merged_records(spools, stats, baseline):
+        if not fits(writer, text):
+            writer.discard()
+            break
+        writer.write((separator if writer.count else opening) + text)
+        writer.count += 1
+    else:
+        return summary([close_shard(writer)], stats, 0)
+
+    # Otherwise fill the shards one severity at a time, so the most severe results land in the first shards
+    shards = []
+    dropped = 0
+    writer = None
+    for level in range(len(LEVELS)):
+        stats = Counter()
+        for result_level, text in merged_records(spools, stats, baseline):
+            if result_level != level:
+                continue
+            # A result that does not fit even in an empty shard still gets one of its own
+            if writer is None or (writer.count and not fits(writer, text)):
+                if writer is not None:
+                    shards.append(close_shard(writer))
+                    writer = None
+                if len(shards) == limits.max_shards:
+                    dropped += 1
+                    continue
+                writer = open_shard(len(shards) + 1)
+            writer.write((separator if writer.count else opening) + text)
+            writer.count += 1
+    if writer is not None:
+        shards.append(close_shard(writer))
+    return summary(shards, stats, dropped)
+
+
+def _is_output(path):
+    name = os.path.basename(path)
+    return (
+        os.path.dirname(os.path.normpath(path)) == os.path.dirname(os.path.normpath(OUTPUT_FILE))
+        and name.startswith("merged_results")
+    )
+
+
+def _excluded(root, path, excludes):
+    if not excludes:
+        return False
+    relative_path = os.path.relpath(path, root).replace(os.sep, "/")
+    return any(fnmatch.fnmatchcase(relative_path, pattern) for pattern in excludes)
+
+
+def walk_sarif_files(root, directory, excludes):
+    """Yield the SARIF files under `directory` with os.scandir, pruning directories that cannot hold reports"""
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        in_build = os.path.basename(current) == BUILD_DIRECTORY
+        try:
+            entries = list(os.scandir(current))
+        except OSError as e:
+            print(f"Skipping unreadable directory {current}: {e}")
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name in PRUNED_DIRECTORIES or (in_build and entry.name not in BUILD_REPORT_DIRECTORIES):
+                    continue
+                if not _excluded(root, entry.path, excludes):
+                    pending.append(entry.path)
+            elif entry.name.endswith(".sarif") and not _excluded(root, entry.path, excludes):
+                yield entry.path
+
+
+def read_manifest(manifest):
+    """Return the paths listed in a manifest file, one per line; blank lines and '#' comments are ignored"""
+    paths = []
+    with open(manifest, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if os.path.isfile(line):
+                paths.append(line)
+            else:
+                print(f"Skipping missing SARIF file from manifest: {line}")
+    return paths
+
+
+def discover_sarif_files(root, includes=(), excludes=(), manifest=None):
+    """
+    Return the SARIF files to merge, in a stable order. With a manifest, exactly the files it lists; otherwise
+    the files under the `includes` directory patterns (relative to `root`, default: all of `root`), minus the
+    `excludes` patterns matched against paths relative to `root`.
+    """
+    if manifest:
+        return read_manifest(manifest)
+    directories = [root] if not includes else []
+    for pattern in includes:
+        directories.extend(
+            path for path in sorted(glob.glob(os.path.join(root, pattern))) if os.path.isdir(path)
+        )
+    found = set()
+    for directory in directories:
+        found.update(walk_sarif_files(root, directory, excludes))
+    # Never merge the output of a previous run back in
+    found = {path for path in found if not _is_output(path)}
+    return sorted(found)
+
+
+def category_output_file(name):
+    """Return the merged output path of a category, e.g. `merged_results.android-lint.sarif`"""
+    slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+    return os.path.join(SARIF_DIRECTORY, f"merged_results.{slug}.sarif")
+
+
+def parse_category(text):
+    """Parse a `--category NAME=PATTERN[,PATTERN...]` argument"""
+    name, separator, patterns = text.partition("=")
+    patterns = [pattern.strip() for pattern in patterns.split(",") if pattern.strip()]
+    if not separator or not name.strip() or not patterns:
+        raise argparse.ArgumentTypeError(f"expected NAME=PATTERN[,PATTERN...], got {text!r}")
+    return Category(name.strip(), patterns)
+
+
+def categories_of(path, categories):
+    """Return the categories whose patterns match `path` (relative to the SARIF directory)"""
+    relative_path = os.path.relpath(path, SARIF_DIRECTORY).replace(os.sep, "/")
+    return [
+        category for category in categories
+        if any(fnmatch.fnmatchcase(relative_path, pattern) for pattern in category.patterns)
+    ]
+
+
+def parse_rewrite(text):
+    """Parse a `--rewrite-uri [^]PATTERN=REPLACEMENT` argument"""
+    pattern, separator, replacement = text.partition("=")
+    if not separator or not pattern.lstrip("^"):
+        raise argparse.ArgumentTypeError(f"expected [^]PATTERN=REPLACEMENT, got {text!r}")
+    return pattern, replacement
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Merge SARIF files into a single SARIF file")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count() or 1,
+        help="number of SARIF files parsed in parallel (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--include", action="append", default=[], metavar="PATTERN",
+        help="directory pattern to search, relative to the working directory, e.g. '*/build/reports' "
+             "(repeatable; default: the whole tree)",
+    )
+    parser.add_argument(
+        "--exclude", action="append", default=[], metavar="PATTERN",
+        help="fnmatch pattern of relative file or directory paths to skip (repeatable)",
+    )
+    parser.add_argument(
+        "--manifest", metavar="FILE",
+        help="merge exactly the SARIF files listed in FILE, one path per line, instead of searching",
+    )
+    parser.add_argument(
+        "--category", action="append", default=[], type=parse_category, metavar="NAME=PATTERN[,PATTERN...]",
+        help="write the files matching the fnmatch PATTERNs (relative paths) to merged_results.<name>.sarif; "
+             "repeatable, every file is still discovered and parsed only once",
+    )
+    parser.add_argument(
+        "--validate", action="store_true",
+        help="check every input against the SARIF 2.1.0 subset the merge relies on, and reject the run with "
+             "the file and JSON pointer of the first mismatch",
+    )
+    parser.add_argument(
+        "--rewrite-uri", action="append", default=[], type=parse_rewrite, metavar="[^]PATTERN=REPLACEMENT",
+        help="also replace PATTERN in every artifact location URI, only as a prefix with a leading '^' "
+             "(repeatable; 'work/android/android/' is always removed)",
+    )
+    parser.add_argument(
+        "--baseline", action="append", default=[], metavar="FILE",
+        help="only write the results that are new or changed compared with the SARIF FILE, e.g. the merged "
+             "output of the target branch (repeatable, for sharded or .gz baselines)",
+    )
+    parser.add_argument(
+        "--baseline-summary", metavar="FILE",
+        help="with --baseline, write the new, changed, unchanged and fixed counts to FILE as JSON",
+    )
+    parser.add_argument(
+        "--sqlite", metavar="FILE",
+        help="also index the merged results into a SQLite database at FILE, queried with sarif_query.py",
+    )
+    parser.add_argument(
+        "--cache-dir", metavar="DIR",
+        help="reuse the normalized results of unchanged input files from DIR, and remember output hashes there",
+    )
+    parser.add_argument(
+        "--output-key", default="", metavar="KEY",
+        help="with --cache-dir, compare each output hash with the one remembered for KEY (e.g. the commit)",
+    )
+    parser.add_argument(
+        "--compact", action="store_true",
+        help="write the merged SARIF without indentation",
+    )
+    parser.add_argument(
+        "--gzip", action="store_true",
+        help="gzip-compress the output files (written with a .gz suffix)",
+    )
+    parser.add_argument(
+        "--max-results", type=int, default=MAX_RESULTS, metavar="N",
+        help=f"results per output file before it is sharded (default: {MAX_RESULTS}, the GitHub limit)",
+    )
+    parser.add_argument(
+        "--max-bytes", type=int, default=MAX_UPLOAD_BYTES, metavar="BYTES",
+        help=f"gzip-compressed size per output file before it is sharded (default: {MAX_UPLOAD_BYTES}, the GitHub limit)",
+    )
+    parser.add_argument(
+        "--max-shards", type=int, default=MAX_SHARDS, metavar="N",
+        help=f"shards per output; the least severe results beyond them are dropped (default: {MAX_SHARDS})",
+    )
+    parser.add_argument(
+        "--pad-shards", action="store_true",
+        help="write an empty document for every shard up to --max-shards without results, so that uploading "
+             "each shard category closes the alerts it no longer has",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.baseline_summary and not args.baseline:
+        parser.error("--baseline-summary requires --baseline")
+    if min(args.max_results, args.max_bytes, args.max_shards) < 1:
+        parser.error("--max-results, --max-bytes and --max-shards must be at least 1")
+    return args
+
+
+def merge(processed, output_file, limits, baseline=None):
+    """
+    Merge every run of the processed SARIF files, in order, into the first run of `output_file`, sharded
+    within `limits`. Returns a MergeSummary, or None when there was nothing to merge.
+    """
+    # Initialize the merged SARIF structure
+    merged_sarif = None
+    # Use a dictionary to track unique rules by their 'id', and where each one lands in the merged table
+    unique_rules = {}
+    spools = []
+    for sarif_data, spool_path, count in processed:
+        if merged_sarif is None:
+            # Use the first file's first run as the base; it may also be the base of another category
+            merged_sarif = copy.deepcopy(sarif_data)
+            merged_sarif["runs"] = merged_sarif["runs"][:1]
+        # Merge the `rules` array of every run, ensuring no duplicates by using the rule ID
+        rule_indexes = {}
+        for run_index, run in enumerate(sarif_data["runs"]):
+            for rule_index, rule in enumerate(run_rules(run)):
+                rule_id = rule.get("id")
+                if not rule_id:
+                    continue
+                if rule_id not in unique_rules:
+                    unique_rules[rule_id] = (len(unique_rules), rule)
+                rule_indexes[(run_index, rule_index)] = unique_rules[rule_id][0]
+        # Merge the `results` arrays
+        spools.append((spool_path, rule_indexes))
+
+    # Update the merged SARIF structure with the combined results
+    if not merged_sarif:
+        return None
+    merged_sarif["runs"][0]["tool"]["driver"]["rules"] = [rule for _, rule in unique_rules.values()]
 
     # Write the merged SARIF to a new file
-    with open(output_file, "w") as file:
-        json.dump(merged_sarif, file, indent=4)
+    return write_merged(output_file, merged_sarif, spools, limits, baseline)
+
+
+def describe_summary(summary):
+    written = sum(count for _, count in summary.shards)
+    description = f"{written} result(s), {summary.duplicates} duplicate(s) dropped"
+    if len(summary.shards) > 1:
+        description += f", split into {len(summary.shards)} shards: " + ", ".join(
+            f"{path} ({count})" for path, count in summary.shards
+        )
+    if summary.baseline is not None:
+        description += ", " + ", ".join(f"{summary.baseline[status]} {status}" for status in BASELINE_STATUSES)
+    if summary.padding:
+        description += f", {len(summary.padding)} empty shard(s) padded"
+    if summary.dropped:
+        description += f"; ⚠️ {summary.dropped} least severe result(s) did not fit in {len(summary.shards)} shard(s)"
+    return description
+
+
+def write_baseline_summary(path, baseline, outputs):
+    """Write the new, changed, unchanged and fixed counts of every output, and their totals, as JSON"""
+    summary = {status: 0 for status in BASELINE_STATUSES}
+    summary["fixed"] = baseline.fixed
+    summary["outputs"] = {}
+    for output_file, merge_summary, _ in outputs:
+        summary["outputs"][output_file] = dict(merge_summary.baseline)
+        for status in BASELINE_STATUSES:
+            summary[status] += merge_summary.baseline[status]
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(summary, file, indent=2)
+
+
+def write_output_hash(output_file, summary):
+    """Write `<output>.sha256` listing the SHA-256 of every shard, in `sha256sum` format; returns its text"""
+    paths = [path for path, _ in summary.shards] + summary.padding
+    text = "".join(f"{file_digest(path)}  {os.path.basename(path)}\n" for path in paths)
+    with open(output_file + ".sha256", "w", encoding="utf-8") as file:
+        file.write(text)
+    return text
+
+
+def record_output_hash(cache_directory, output_key, output_file, text):
+    """Remember the hash of an output in the cache; returns whether it differs from the one remembered before"""
+    directory = os.path.join(cache_directory, "outputs", re.sub(r"[^A-Za-z0-9._-]+", "-", output_key) or "default")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, os.path.basename(output_file) + ".sha256")
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            changed = file.read() != text
+    except OSError:
+        changed = True
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(text)
+    return changed
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    limits = OutputLimits(
+        args.compact, args.gzip, args.max_results, args.max_bytes, args.max_shards, args.pad_shards
+    )
+    print(f"Looking for SARIF files in: {SARIF_DIRECTORY}")
+
+    sarif_files = discover_sarif_files(SARIF_DIRECTORY, args.include, args.exclude, args.manifest)
+    if args.category:
+        sarif_files = [path for path in sarif_files if categories_of(path, args.category)]
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
+    rewrites = DEFAULT_URI_REWRITES + tuple(args.rewrite_uri)
+    baseline = None
+    if args.baseline:
+        baseline = Baseline(args.baseline, rewrites)
+        print(f"Loaded {len(baseline.index)} baseline result(s) from: {', '.join(args.baseline)}")
+    with tempfile.TemporaryDirectory() as spool_directory:
+        # Every file is parsed once, in parallel, and merged in input order so the output does not depend on --jobs
+        processed = []
+        reused = 0
+        options = ParseOptions(args.compact, args.cache_dir, rewrites, args.validate)
+        try:
+            processed_files = list(process_all(sarif_files, spool_directory, args.jobs, options))
+        except SarifValidationError as e:
+            print(f"❌ Invalid SARIF file, nothing was merged: {e}")
+            return 1
+        for sarif_file, sarif_data, spool_path, count, cached in processed_files:
+            print(f"Processing SARIF file: {sarif_file}{' (cached)' if cached else ''}")
+            reused += cached
+            if not sarif_data.get("runs"):
+                print(f"Skipping SARIF file without runs: {sarif_file}")
+                continue
+            processed.append((sarif_file, (sarif_data, spool_path, count)))
+        if args.cache_dir:
+            print(f"Reused {reused} of {len(sarif_files)} SARIF file(s) from the cache at: {args.cache_dir}")
+
+        outputs = []
+        if not args.category:
+            summary = merge([entry for _, entry in processed], OUTPUT_FILE, limits, baseline)
+            if summary:
+                print(f"Merged SARIF file created at: {summary.shards[0][0]} ({describe_summary(summary)})")
+                outputs.append((OUTPUT_FILE, summary, ""))
+            else:
+                print("No SARIF files found or invalid SARIF structure.")
+
+        for category in args.category:
+            output_file = category_output_file(category.name)
+            entries = [entry for path, entry in processed if category in categories_of(path, args.category)]
+            summary = merge(entries, output_file, limits, baseline)
+            if summary:
+                print(
+                    f"Merged {len(entries)} SARIF file(s) for {category.name} at: {summary.shards[0][0]} "
+                    f"({describe_summary(summary)})"
+                )
+                outputs.append((output_file, summary, category.name))
+            else:
+                print(f"No SARIF files found for {category.name}.")
+
+    if baseline is not None:
+        print(f"{baseline.fixed} baseline result(s) fixed")
+        if args.baseline_summary:
+            write_baseline_summary(args.baseline_summary, baseline, outputs)
+            print(f"Baseline summary written to: {args.baseline_summary}")
+
+    if args.sqlite:
+        # Imported here: the query script imports this one
+        from sarif_query import write_database
+
+        count = write_database(
+            args.sqlite,
+            [(path, category) for _, summary, category in outputs for path, _ in summary.shards],
+            rewrites,
+        )
+        print(f"Indexed {count} result(s) into the SARIF database at: {args.sqlite}")
+
+    changed = bool(outputs)
+    if args.cache_dir:
+        changed = False
+        for output_file, summary, _ in outputs:
+            text = write_output_hash(output_file, summary)
+            if record_output_hash(args.cache_dir, args.output_key, output_file, text):
+                changed = True
+            else:
+                print(f"Unchanged since the last run with output key {args.output_key!r}: {output_file}")
+        prune_cache(args.cache_dir)
+    else:
+        for output_file, summary, _ in outputs:
+            write_output_hash(output_file, summary)
+    if os.environ.get("GITHUB_OUTPUT"):
+        with open(os.environ["GITHUB_OUTPUT"], "a", encoding="utf-8") as file:
+            file.write(f"changed={'true' if changed else 'false'}\n")
+
 
-    print(f"Merged SARIF file created at: {output_file}")
-else:
-    print("No SARIF files found or invalid SARIF structure.")
+if __name__ == "__main__":
+    sys.exit(main())
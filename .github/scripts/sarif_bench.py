@@ -0,0 +1,524 @@
+"""
+This script generates synthetic SARIF report trees and benchmarks `merge_sarif.py` on them.
+
+## Usage:
+1. Generate a tree shaped like a Gradle build's lint reports:
+   ```bash
+   python3 .github/scripts/sarif_bench.py generate /tmp/sarif-tree --files 50 --results 2000 --duplicates 0.2
+   ```
+2. Benchmark the merge at several scales and store the measurements:
+   ```bash
+   python3 .github/scripts/sarif_bench.py run --scale small --scale medium --output bench.json
+   ```
+3. Compare with the measurements of another commit:
+   ```bash
+   python3 .github/scripts/sarif_bench.py run --merge-args='--compact' --output bench.json --compare main-bench.json
+   ```
+
+## Note:
+Every scale is merged in a fresh `merge_sarif.py` process, timed from start to exit; its peak RSS comes from
+`wait4`, so it covers the pool workers the merge waited for. Generated trees are deterministic for a given shape
+and seed, and are kept in the work directory so later runs only pay for the merge. `--compare` exits with status
+1 when a scale got slower, or used more memory, than the allowed regression.
+
+Every merged output is also checked against its inputs, and any problem fails the run: locations relative to
+`%SRCROOT%` must resolve to the same URIs as in the inputs, the outputs hold one result per distinct input
+result, every `ruleIndex` points at the rule of its `ruleId`, and merging with `-j 1` and `-j 4` writes the
+same bytes. The small `golden` tree must also merge to exactly `sarif_bench.golden.json`; after an intended
+change of the output, rewrite it with:
+```bash
+python3 .github/scripts/sarif_bench.py golden --update
+```
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import platform
+import random
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+from merge_sarif import DEFAULT_URI_REWRITES, resolve_uri, result_key, uri_rewriter
+
+MERGE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "merge_sarif.py")
+
+Shape = namedtuple("Shape", ["files", "results", "rules", "depth", "related", "duplicates", "seed"])
+
+# Named scales, from a quick smoke run to millions of results
+SCALES = {
+    "tiny": Shape(files=10, results=100, rules=20, depth=3, related=1, duplicates=0.1, seed=1),
+    "small": Shape(files=20, results=1000, rules=50, depth=4, related=1, duplicates=0.2, seed=1),
+    "medium": Shape(files=50, results=5000, rules=100, depth=5, related=2, duplicates=0.2, seed=1),
+    "large": Shape(files=200, results=5000, rules=200, depth=6, related=2, duplicates=0.3, seed=1),
+    "huge": Shape(files=500, results=5000, rules=300, depth=6, related=2, duplicates=0.3, seed=1),
+}
+DEFAULT_SCALES = ("tiny", "small", "medium")
+# Merged with the default arguments and compared byte for byte with GOLDEN_FILE
+GOLDEN_SHAPE = Shape(files=2, results=4, rules=3, depth=2, related=1, duplicates=0.5, seed=7)
+# Not a .sarif file, so that merging from the repository root never picks it up
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sarif_bench.golden.json")
+# Merge arguments that may leave input results out of the outputs
+DROPPING_ARGUMENTS = ("--baseline", "--max-shards")
+
+LEVELS = ("error", "warning", "note")
+# Default relative slowdown or memory growth tolerated by --compare
+MAX_REGRESSION = 0.2
+SHAPE_FILE = "shape.json"
+# Bumped when generated trees change for the same shape; trees and reports of other versions are not reused
+GENERATOR_VERSION = 2
+SOURCE_ROOT = "file:///home/runner/work/android/android/"
+
+
+def _rule(number):
+    return {
+        "id": f"Rule{number}",
+        "name": f"SyntheticRule{number}",
+        "shortDescription": {"text": f"Synthetic rule {number}"},
+        "fullDescription": {"text": f"Synthetic rule {number}, generated for benchmarking the SARIF merge."},
+        "defaultConfiguration": {"level": LEVELS[number % len(LEVELS)]},
+        "properties": {"tags": ["synthetic"], "precision": "high"},
+    }
+
+
+def _location(module, depth, number, line, relative=True):
+    """A location relative to %SRCROOT%, as lint writes them, or an absolute one in the CI checkout"""
+    directories = "/".join(f"pkg{(number >> level) % 7}" for level in range(depth))
+    path = f"{module}/src/main/kotlin/{directories}/File{number}.kt"
+    artifact_location = {"uri": path, "uriBaseId": "%SRCROOT%"} if relative else {"uri": SOURCE_ROOT + path}
+    return {
+        "physicalLocation": {
+            "artifactLocation": artifact_location,
+            "region": {"startLine": line, "startColumn": 1 + line % 80, "endLine": line},
+        }
+    }
+
+
+def _result(random_source, module, rules, shape, number):
+    rule_index = random_source.randrange(len(rules))
+    line = random_source.randint(1, 2000)
+    file_number = random_source.randrange(max(1, shape.results // 10))
+    result = {
+        "ruleId": rules[rule_index]["id"],
+        "ruleIndex": rule_index,
+        "level": random_source.choice(LEVELS),
+        "message": {"text": f"Finding {number} of {rules[rule_index]['id']} in {module}"},
+        "locations": [_location(module, shape.depth, file_number, line)],
+        "partialFingerprints": {"primaryLocationLineHash": f"{module}:{number:x}:{line}"},
+    }
+    if shape.related:
+        result["relatedLocations"] = [
+            dict(_location(
+                module, shape.depth, random_source.randrange(max(1, shape.results // 10)), line + i, relative=False,
+            ), id=i)
+            for i in range(shape.related)
+        ]
+    return result
+
+
+def generate_tree(root, shape):
+    """
+    Write `shape.files` SARIF files under `root/<module>/build/reports/`. A `shape.duplicates` fraction of
+    every file's results repeats results of the previous file, as when two Gradle tasks report the same issue.
+    Returns the total number of results written.
+    """
+    random_source = random.Random(shape.seed)
+    rule_pool = [_rule(number) for number in range(shape.rules * 2)]
+    previous = []
+    total = 0
+    for file_number in range(shape.files):
+        module = f"module{file_number}"
+        directory = os.path.join(root, module, "build", "reports")
+        os.makedirs(directory, exist_ok=True)
+        rules = random_source.sample(rule_pool, shape.rules)
+        duplicated = int(shape.results * shape.duplicates) if previous else 0
+        results = [dict(result) for result in random_source.sample(previous, min(duplicated, len(previous)))]
+        # A duplicate keeps its rule id; its index has to point into this file's rules, if they have it
+        rule_indexes = {rule["id"]: index for index, rule in enumerate(rules)}
+        for result in results:
+            if result["ruleId"] in rule_indexes:
+                result["ruleIndex"] = rule_indexes[result["ruleId"]]
+            else:
+                result.pop("ruleIndex", None)
+        results.extend(
+            _result(random_source, module, rules, shape, number)
+            for number in range(shape.results - len(results))
+        )
+        document = {
+            "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+            "version": "2.1.0",
+            "runs": [{
+                "tool": {"driver": {"name": "Android Lint", "version": "8.0.0", "rules": rules}},
+                "originalUriBaseIds": {"%SRCROOT%": {"uri": SOURCE_ROOT}},
+                "results": [],
+            }],
+        }
+        head, tail = json.dumps(document, indent=2).split('"results": []', 1)
+        with open(os.path.join(directory, f"lint-results-{module}.sarif"), "w", encoding="utf-8") as file:
+            file.write(head + '"results": [\n')
+            for index, result in enumerate(results):
+                file.write((",\n" if index else "") + json.dumps(result))
+            file.write("\n]" + tail)
+        previous = results
+        total += len(results)
+    return total
+
+
+def prepare_tree(work_directory, name, shape):
+    """Return the tree of `shape` in the work directory, generating it unless an identical one is there"""
+    root = os.path.join(work_directory, name)
+    shape_path = os.path.join(root, SHAPE_FILE)
+    try:
+        with open(shape_path, "r", encoding="utf-8") as file:
+            stored = json.load(file)
+        if stored.pop("generator", 1) == GENERATOR_VERSION and Shape(**stored) == shape:
+            return root, False
+    except (OSError, ValueError, TypeError):
+        pass
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(root)
+    generate_tree(root, shape)
+    with open(shape_path, "w", encoding="utf-8") as file:
+        json.dump(dict(shape._asdict(), generator=GENERATOR_VERSION), file)
+    return root, True
+
+
+def _output_files(root):
+    return [
+        os.path.join(root, name) for name in sorted(os.listdir(root))
+        if name.startswith("merged_results") and (name.endswith(".sarif") or name.endswith(".sarif.gz"))
+    ]
+
+
+def _input_files(root):
+    return [
+        os.path.join(directory, name)
+        for directory, _, files in sorted(os.walk(root)) for name in sorted(files)
+        if name.endswith(".sarif") and not name.startswith("merged_results")
+    ]
+
+
+def _load_sarif(path):
+    with (gzip.open if path.endswith(".gz") else open)(path, "rt", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _resolved_uris(document):
+    """Yield the resolved URI of every result location of `document` that is relative to a base id"""
+    for run in document.get("runs", []):
+        base_ids = run.get("originalUriBaseIds")
+        for result in run.get("results", []):
+            for location in result.get("locations", []) + result.get("relatedLocations", []):
+                artifact_location = location.get("physicalLocation", {}).get("artifactLocation", {})
+                if "uriBaseId" in artifact_location:
+                    yield resolve_uri(artifact_location, base_ids)
+
+
+def _result_keys(document, rewriter):
+    """Yield the deduplication key of every result of `document`, with its locations rewritten as in a merge"""
+    for run in document.get("runs", []):
+        for result in run.get("results", []):
+            rewriter.rewrite_locations(result)
+            yield result_key(result)
+
+
+def _rule_mismatches(document):
+    """Return how many results have a `ruleIndex` that does not point at the rule of their `ruleId`"""
+    mismatches = 0
+    for run in document.get("runs", []):
+        rules = run.get("tool", {}).get("driver", {}).get("rules", [])
+        for result in run.get("results", []):
+            index = result.get("ruleIndex")
+            if index is None:
+                continue
+            if not 0 <= index < len(rules) or rules[index].get("id") != result.get("ruleId", rules[index].get("id")):
+                mismatches += 1
+    return mismatches
+
+
+def check_outputs(root, complete=True):
+    """
+    Return the problems found in the merged outputs of `root`, checked against its inputs. With `complete`, the
+    outputs must hold every distinct input result, otherwise they may leave some out.
+    """
+    problems = []
+    rewriter = uri_rewriter(DEFAULT_URI_REWRITES)
+    expected_uris = set()
+    expected_keys = set()
+    for path in _input_files(root):
+        document = _load_sarif(path)
+        expected_uris.update(_resolved_uris(document))
+        expected_keys.update(_result_keys(document, rewriter))
+    written = 0
+    for path in _output_files(root):
+        name = os.path.basename(path)
+        document = _load_sarif(path)
+        # The default URI rewrite must not move locations that resolve through a base id
+        moved = set(_resolved_uris(document)) - expected_uris
+        if moved:
+            problems.append(
+                f"{name}: {len(moved)} relative location(s) no longer resolve to an input location, "
+                f"e.g. {min(moved, key=str)}"
+            )
+        mismatches = _rule_mismatches(document)
+        if mismatches:
+            problems.append(f"{name}: {mismatches} result(s) with a ruleIndex that is not the rule of their ruleId")
+        keys = list(_result_keys(document, rewriter))
+        written += len(keys)
+        if len(set(keys)) != len(keys):
+            problems.append(f"{name}: {len(keys) - len(set(keys))} duplicate result(s) left after the merge")
+    if written > len(expected_keys) or (complete and written < len(expected_keys)):
+        problems.append(f"{written} result(s) written for {len(expected_keys)} distinct input result(s)")
+    return problems
+
+
+def _output_digests(root):
+    digests = {}
+    for path in _output_files(root):
+        with open(path, "rb") as file:
+            digests[os.path.basename(path)] = hashlib.sha256(file.read()).hexdigest()
+    return digests
+
+
+def check_jobs(root, merge_arguments, digests):
+    """
+    Merge `root` again with one and with several jobs; returns the problems found when the outputs differ from
+    each other or from `digests`, those of the measured merge
+    """
+    problems = []
+    for jobs in (1, 4):
+        run_merge(root, [*merge_arguments, "-j", str(jobs)])
+        if _output_digests(root) != digests:
+            problems.append(f"merging with -j {jobs} writes different outputs than {shlex.join(merge_arguments)!r}")
+    return problems
+
+
+def check_golden(work_directory, update=False):
+    """
+    Merge the golden tree with the default arguments and return the problems found when the output differs from
+    GOLDEN_FILE; with `update`, rewrite GOLDEN_FILE instead
+    """
+    root, _ = prepare_tree(work_directory, "golden", GOLDEN_SHAPE)
+    run_merge(root, [])
+    with open(os.path.join(root, "merged_results.sarif"), "rb") as file:
+        output = file.read()
+    if update:
+        with open(GOLDEN_FILE, "wb") as file:
+            file.write(output)
+        return []
+    try:
+        with open(GOLDEN_FILE, "rb") as file:
+            golden = file.read()
+    except OSError:
+        return [f"no golden output at {GOLDEN_FILE}"]
+    if output != golden:
+        return [f"the golden tree no longer merges to {os.path.basename(GOLDEN_FILE)}"]
+    return []
+
+
+def run_merge(root, merge_arguments):
+    """Run one merge in `root`; returns (wall seconds, peak RSS bytes, output bytes, output files)"""
+    for path in _output_files(root):
+        os.remove(path)
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, MERGE_SCRIPT, *merge_arguments], cwd=root, stdout=subprocess.DEVNULL
+    )
+    _, status, usage = os.wait4(process.pid, 0)
+    wall_time = time.perf_counter() - started
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise SystemExit(f"merge_sarif.py failed in {root} with status {process.returncode}")
+    outputs = _output_files(root)
+    # ru_maxrss is in kibibytes on Linux
+    return wall_time, usage.ru_maxrss * 1024, sum(os.path.getsize(path) for path in outputs), len(outputs)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(MERGE_SCRIPT),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(scales, work_directory, merge_arguments, repeat):
+    """Measure every scale, keeping the fastest of `repeat` merges; returns the report as a dict"""
+    report = {
+        "commit": _git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "generator": GENERATOR_VERSION,
+        "merge_arguments": merge_arguments,
+        "scales": {},
+    }
+    for name in scales:
+        shape = SCALES[name]
+        root, generated = prepare_tree(work_directory, name, shape)
+        input_bytes = sum(
+            os.path.getsize(os.path.join(directory, file))
+            for directory, _, files in os.walk(root) for file in files if file.endswith(".sarif")
+            and not file.startswith("merged_results")
+        )
+        runs = [run_merge(root, merge_arguments) for _ in range(repeat)]
+        wall_time, peak_rss, output_bytes, output_files = min(runs)
+        complete = not any(argument.split("=")[0] in DROPPING_ARGUMENTS for argument in merge_arguments)
+        problems = check_outputs(root, complete)
+        problems += check_jobs(root, merge_arguments, _output_digests(root))
+        report["scales"][name] = {
+            "shape": shape._asdict(),
+            "input_results": shape.files * shape.results,
+            "input_bytes": input_bytes,
+            "wall_time": wall_time,
+            "wall_times": [run[0] for run in runs],
+            "peak_rss": max(run[1] for run in runs),
+            "output_bytes": output_bytes,
+            "output_files": output_files,
+            "problems": problems,
+        }
+        print(
+            f"{name:>8}: {shape.files * shape.results:>9} results, {input_bytes / 2**20:8.1f} MiB in"
+            f"{' (generated)' if generated else ''} -> {wall_time:7.2f} s, "
+            f"peak RSS {max(run[1] for run in runs) / 2**20:7.1f} MiB, {output_bytes / 2**20:8.1f} MiB out "
+            f"in {output_files} file(s)",
+            flush=True,
+        )
+        for problem in problems:
+            print(f"{'':>8}  ❌ {problem}", flush=True)
+    report["golden_problems"] = check_golden(work_directory)
+    for problem in report["golden_problems"]:
+        print(f"{'golden':>8}  ❌ {problem}", flush=True)
+    return report
+
+
+def compare(report, previous, max_regression=MAX_REGRESSION):
+    """Print the change of every scale measured in both reports; returns the names of the regressed scales"""
+    print(f"Compared with {previous.get('commit') or 'previous run'} ({previous.get('created')}):")
+    regressed = []
+    if previous.get("generator", 1) != report["generator"]:
+        print("Generated trees changed since then, not comparable")
+        return regressed
+    for name, current in report["scales"].items():
+        before = previous.get("scales", {}).get(name)
+        if not before:
+            continue
+        if before["shape"] != current["shape"]:
+            print(f"{name:>8}: shape changed, not comparable")
+            continue
+        changes = {
+            metric: (current[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            for metric in ("wall_time", "peak_rss", "output_bytes")
+        }
+        worse = changes["wall_time"] > max_regression or changes["peak_rss"] > max_regression
+        if worse:
+            regressed.append(name)
+        print(
+            f"{name:>8}: time {changes['wall_time']:+7.1%}, peak RSS {changes['peak_rss']:+7.1%}, "
+            f"output {changes['output_bytes']:+7.1%}{'  ❌ regression' if worse else ''}"
+        )
+    return regressed
+
+
+def parse_shape(args):
+    return Shape(args.files, args.results, args.rules, args.depth, args.related, args.duplicates, args.seed)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic SARIF trees and benchmark merge_sarif.py")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="write a synthetic SARIF tree")
+    generate.add_argument("root", help="directory to generate the tree in")
+    generate.add_argument("--files", type=int, default=20, help="number of SARIF files (modules)")
+    generate.add_argument("--results", type=int, default=1000, help="results per file")
+    generate.add_argument("--rules", type=int, default=50, help="rules per file, drawn from a shared pool")
+    generate.add_argument("--depth", type=int, default=4, help="package directories in every location URI")
+    generate.add_argument("--related", type=int, default=1, help="related locations per result")
+    generate.add_argument(
+        "--duplicates", type=float, default=0.2,
+        help="fraction of each file's results repeated from the previous file (0 to 1)",
+    )
+    generate.add_argument("--seed", type=int, default=1)
+
+    golden = commands.add_parser("golden", help="check the merge of the golden tree against its stored output")
+    golden.add_argument("--update", action="store_true", help="rewrite the stored output instead")
+
+    run = commands.add_parser("run", help="benchmark merge_sarif.py at several scales")
+    run.add_argument(
+        "--scale", action="append", choices=sorted(SCALES), metavar="NAME",
+        help=f"scale to measure, one of {', '.join(SCALES)} (repeatable; default: {', '.join(DEFAULT_SCALES)})",
+    )
+    for command in (golden, run):
+        command.add_argument(
+            "--work-dir", default=os.path.join(tempfile.gettempdir(), "sarif-bench"),
+            help="where generated trees are kept between runs",
+        )
+    run.add_argument(
+        "--merge-args", default="", metavar="ARGS",
+        help="arguments passed to merge_sarif.py, given with '=' since they start with dashes, "
+             "e.g. --merge-args='--compact -j 4'",
+    )
+    run.add_argument("--repeat", type=int, default=1, help="merges per scale; the fastest one is reported")
+    run.add_argument("--output", metavar="FILE", help="write the measurements to FILE as JSON")
+    run.add_argument("--compare", metavar="FILE", help="compare with the measurements in FILE")
+    run.add_argument(
+        "--max-regression", type=float, default=MAX_REGRESSION,
+        help=f"relative slowdown or memory growth that fails --compare (default: {MAX_REGRESSION})",
+    )
+    args = parser.parse_args(argv)
+    if args.command == "generate" and not 0 <= args.duplicates <= 1:
+        parser.error("--duplicates must be between 0 and 1")
+    if args.command == "run" and args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "generate":
+        shape = parse_shape(args)
+        started = time.perf_counter()
+        total = generate_tree(args.root, shape)
+        print(f"Generated {total} result(s) in {shape.files} SARIF file(s) under {args.root} "
+              f"in {time.perf_counter() - started:.1f} s")
+        return 0
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    if args.command == "golden":
+        problems = check_golden(args.work_dir, args.update)
+        for problem in problems:
+            print(f"❌ {problem}")
+        if args.update:
+            print(f"Golden output written to: {GOLDEN_FILE}")
+        elif not problems:
+            print(f"The golden tree merges to {GOLDEN_FILE}")
+        return 1 if problems else 0
+
+    report = benchmark(args.scale or DEFAULT_SCALES, args.work_dir, shlex.split(args.merge_args), args.repeat)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"Benchmark results written to: {args.output}")
+    if report["golden_problems"] or any(scale["problems"] for scale in report["scales"].values()):
+        return 1
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            previous = json.load(file)
+        if compare(report, previous, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
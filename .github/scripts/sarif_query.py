@@ -0,0 +1,394 @@
+"""
+This script indexes merged SARIF files into a SQLite database and answers common questions about them, without
+re-parsing the JSON.
+
+## Usage:
+1. Write the database while merging:
+   ```bash
+   python3 .github/scripts/merge_sarif.py --sqlite sarif.db
+   ```
+   or index existing SARIF files:
+   ```bash
+   python3 .github/scripts/sarif_query.py sarif.db index merged_results.sarif
+   ```
+2. Query it:
+   ```bash
+   python3 .github/scripts/sarif_query.py sarif.db rules --limit 10
+   python3 .github/scripts/sarif_query.py sarif.db findings 'app/src/main/*/webview/*' --level error
+   python3 .github/scripts/sarif_query.py sarif.db files
+   python3 .github/scripts/sarif_query.py sarif.db trend previous.db
+   ```
+
+## Note:
+The database has one `runs` row per indexed file and run, the `rules` of each run, the `results` with their
+effective level and fingerprint (the merge deduplication key, so it is stable across merges), and the primary
+and related `locations` of every result. Results are indexed by rule id and level, locations by URI. The tool
+of a run and the default levels of its rules are resolved once the whole run is read, so they are also right
+when a file lists its results before its tool.
+
+Findings patterns are SQLite GLOBs (`*` also matches `/`) matched from any directory boundary of the URI, so
+`app/src/main` finds both relative locations and absolute ones such as `file:///home/runner/app/src/main/...`;
+a pattern without wildcards matches a path prefix.
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from merge_sarif import DEFAULT_URI_REWRITES, LEVELS, read_sarif, result_key, result_level, run_rules, uri_rewriter
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE runs (
+    id INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,
+    category TEXT NOT NULL,
+    run_index INTEGER NOT NULL,
+    tool TEXT,
+    tool_version TEXT
+);
+CREATE TABLE rules (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    rule_id TEXT,
+    name TEXT,
+    description TEXT,
+    default_level TEXT
+);
+CREATE TABLE results (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    rule_id TEXT,
+    level TEXT NOT NULL,
+    message TEXT,
+    fingerprint TEXT NOT NULL
+);
+CREATE TABLE locations (
+    result_id INTEGER NOT NULL REFERENCES results (id),
+    kind TEXT NOT NULL,
+    uri TEXT,
+    start_line INTEGER,
+    start_column INTEGER,
+    end_line INTEGER
+);
+"""
+
+INDEXES = """
+CREATE INDEX rules_rule_id ON rules (rule_id);
+CREATE INDEX results_rule_id ON results (rule_id);
+CREATE INDEX results_level ON results (level);
+CREATE INDEX results_fingerprint ON results (fingerprint);
+CREATE INDEX locations_uri ON locations (uri);
+CREATE INDEX locations_result_id ON locations (result_id);
+"""
+
+# Results are inserted in batches of this many rows
+BATCH_SIZE = 5000
+
+
+def _location_rows(result_id, result):
+    for kind in ("locations", "relatedLocations"):
+        for location in result.get(kind) or []:
+            physical_location = location.get("physicalLocation", {})
+            region = physical_location.get("region", {})
+            yield (
+                result_id,
+                "primary" if kind == "locations" else "related",
+                physical_location.get("artifactLocation", {}).get("uri"),
+                region.get("startLine"),
+                region.get("startColumn"),
+                region.get("endLine", region.get("startLine")),
+            )
+
+
+class DatabaseWriter:
+    """Streams SARIF files into a new database, batching inserts in one transaction"""
+
+    def __init__(self, connection, rewrites=DEFAULT_URI_REWRITES):
+        self.connection = connection
+        self.rewriter = uri_rewriter(rewrites)
+        self.results = []
+        self.locations = []
+        self.next_result_id = 1
+        self.run_ids = {}
+
+    def _flush(self):
+        self.connection.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?)", self.results)
+        self.connection.executemany("INSERT INTO locations VALUES (?, ?, ?, ?, ?, ?)", self.locations)
+        self.results.clear()
+        self.locations.clear()
+
+    def _run_id(self, path, category, run_index):
+        # The row is inserted at the first result; the tool is only known once the whole run is read
+        key = (path, run_index)
+        if key not in self.run_ids:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (file, category, run_index) VALUES (?, ?, ?)", (path, category, run_index)
+            )
+            self.run_ids[key] = cursor.lastrowid
+        return self.run_ids[key]
+
+    def add_file(self, path, category=""):
+        """Index every run of a SARIF file; returns the number of results"""
+        count = 0
+        # {run index: [(result id, rule index, rule id)]} of the results read before the rules of their run
+        deferred = {}
+        # Per file, as the cache is keyed by the id() of the run dictionaries
+        rule_levels = {}
+
+        def add(run_index, result, run):
+            nonlocal count
+            # Already normalized when it is a merge output; rewriting again keeps fingerprints comparable otherwise
+            self.rewriter.rewrite_locations(result)
+            result_id = self.next_result_id
+            self.next_result_id += 1
+            message = result.get("message", {})
+            rule_id = result.get("ruleId") or result.get("rule", {}).get("id")
+            if result.get("level") not in LEVELS and "tool" not in run:
+                deferred.setdefault(run_index, []).append((result_id, result.get("ruleIndex"), result.get("ruleId")))
+            self.results.append((
+                result_id,
+                self._run_id(path, category, run_index),
+                rule_id,
+                LEVELS[result_level(result, run, rule_levels)],
+                message.get("text") if isinstance(message, dict) else None,
+                result_key(result).hex(),
+            ))
+            self.locations.extend(_location_rows(result_id, result))
+            count += 1
+            if len(self.results) >= BATCH_SIZE:
+                self._flush()
+
+        document = read_sarif(path, add)
+        self._flush()
+        for run_index, run in enumerate(document.get("runs", [])):
+            run_id = self._run_id(path, category, run_index)
+            driver = run.get("tool", {}).get("driver", {})
+            self.connection.execute(
+                "UPDATE runs SET tool = ?, tool_version = ? WHERE id = ?",
+                (driver.get("name"), driver.get("version") or driver.get("semanticVersion"), run_id),
+            )
+            self.connection.executemany(
+                "INSERT INTO rules (run_id, rule_id, name, description, default_level) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (
+                        run_id,
+                        rule.get("id"),
+                        rule.get("name"),
+                        rule.get("shortDescription", {}).get("text"),
+                        rule.get("defaultConfiguration", {}).get("level"),
+                    )
+                    for rule in run_rules(run)
+                ),
+            )
+            # Results read before the tool defaulted to `warning`; their rules may say otherwise
+            updates = []
+            for result_id, rule_index, rule_id in deferred.get(run_index, ()):
+                level = LEVELS[result_level({"ruleIndex": rule_index, "ruleId": rule_id}, run, rule_levels)]
+                if level != "warning":
+                    updates.append((level, result_id))
+            self.connection.executemany("UPDATE results SET level = ? WHERE id = ?", updates)
+        return count
+
+
+def write_database(database, sarif_files, rewrites=DEFAULT_URI_REWRITES):
+    """
+    Write a new database at `database` from `sarif_files`, a list of (path, category) pairs, replacing any
+    previous one only once it is complete. Returns the number of indexed results.
+    """
+    directory = os.path.dirname(os.path.abspath(database))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".db.tmp")
+    os.close(fd)
+    count = 0
+    try:
+        connection = sqlite3.connect(temp_path)
+        try:
+            # A half-written file is discarded anyway, so skip the journal
+            connection.execute("PRAGMA journal_mode = OFF")
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.executescript(SCHEMA)
+            writer = DatabaseWriter(connection, rewrites)
+            for path, category in sarif_files:
+                count += writer.add_file(path, category)
+            # Indexes are built once at the end, which is faster than maintaining them on every insert
+            connection.executescript(INDEXES)
+            connection.executemany("INSERT INTO metadata VALUES (?, ?)", [
+                ("schema_version", str(SCHEMA_VERSION)),
+                ("created", time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())),
+            ])
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(temp_path, database)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return count
+
+
+def open_database(database):
+    if not os.path.isfile(database):
+        raise SystemExit(f"No SARIF database at: {database}")
+    return sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+
+
+def _level_filter(level):
+    return ("AND results.level = ?", (level,)) if level else ("", ())
+
+
+def top_rules(connection, limit=20, level=None):
+    """Return [(rule id, level, count)] of the most reported rules"""
+    condition, parameters = _level_filter(level)
+    return connection.execute(
+        f"""
+        SELECT rule_id, level, COUNT(*) AS count FROM results
+        WHERE 1 {condition}
+        GROUP BY rule_id, level ORDER BY count DESC, rule_id LIMIT ?
+        """,
+        (*parameters, limit),
+    ).fetchall()
+
+
+def top_files(connection, limit=20, level=None):
+    """Return [(uri, count)] of the files with the most results"""
+    condition, parameters = _level_filter(level)
+    return connection.execute(
+        f"""
+        SELECT locations.uri, COUNT(DISTINCT results.id) AS count FROM locations
+        JOIN results ON results.id = locations.result_id
+        WHERE locations.kind = 'primary' {condition}
+        GROUP BY locations.uri ORDER BY count DESC, locations.uri LIMIT ?
+        """,
+        (*parameters, limit),
+    ).fetchall()
+
+
+def findings(connection, pattern, rule=None, level=None, limit=None):
+    """
+    Return [(uri, line, level, rule id, message)] of the results located in files matching `pattern`, from the
+    start of the URI or from any `/` in it
+    """
+    if not any(character in pattern for character in "*?["):
+        pattern += "*"
+    condition, parameters = _level_filter(level)
+    if rule:
+        condition += " AND results.rule_id = ?"
+        parameters += (rule,)
+    return connection.execute(
+        f"""
+        SELECT DISTINCT locations.uri, locations.start_line, results.level, results.rule_id, results.message
+        FROM locations JOIN results ON results.id = locations.result_id
+        WHERE locations.kind = 'primary' AND (locations.uri GLOB ? OR locations.uri GLOB ?) {condition}
+        ORDER BY locations.uri, locations.start_line
+        LIMIT ?
+        """,
+        (pattern, "*/" + pattern, *parameters, -1 if limit is None else limit),
+    ).fetchall()
+
+
+def trend(connection, previous_database):
+    """
+    Compare with an older database by fingerprint. Returns (totals, per rule) where totals is (new, fixed,
+    unchanged) and per rule is [(rule id, previous count, current count)] for the rules whose count changed.
+    """
+    connection.execute("ATTACH DATABASE ? AS previous", (f"file:{previous_database}?mode=ro",))
+    new, fixed, unchanged = connection.execute(
+        """
+        SELECT
+            (SELECT COUNT(DISTINCT fingerprint) FROM main.results
+             WHERE fingerprint NOT IN (SELECT fingerprint FROM previous.results)),
+            (SELECT COUNT(DISTINCT fingerprint) FROM previous.results
+             WHERE fingerprint NOT IN (SELECT fingerprint FROM main.results)),
+            (SELECT COUNT(DISTINCT fingerprint) FROM main.results
+             WHERE fingerprint IN (SELECT fingerprint FROM previous.results))
+        """
+    ).fetchone()
+    per_rule = connection.execute(
+        """
+        WITH current AS (SELECT rule_id, COUNT(*) AS count FROM main.results GROUP BY rule_id),
+             old AS (SELECT rule_id, COUNT(*) AS count FROM previous.results GROUP BY rule_id),
+             rule_ids AS (SELECT rule_id FROM current UNION SELECT rule_id FROM old)
+        SELECT rule_ids.rule_id, COALESCE(old.count, 0), COALESCE(current.count, 0) FROM rule_ids
+        LEFT JOIN current ON current.rule_id IS rule_ids.rule_id
+        LEFT JOIN old ON old.rule_id IS rule_ids.rule_id
+        WHERE COALESCE(old.count, 0) != COALESCE(current.count, 0)
+        ORDER BY ABS(COALESCE(current.count, 0) - COALESCE(old.count, 0)) DESC, rule_ids.rule_id
+        """
+    ).fetchall()
+    return (new, fixed, unchanged), per_rule
+
+
+def print_table(header, rows):
+    rows = [tuple("" if value is None else str(value) for value in row) for row in rows]
+    widths = [max(len(value) for value in column) for column in zip(header, *rows)]
+    for row in (header, *rows):
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Index SARIF files into SQLite and query them")
+    parser.add_argument("database", help="SQLite database written by merge_sarif.py --sqlite or the index command")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index = commands.add_parser("index", help="(re)build the database from SARIF files")
+    index.add_argument("sarif_files", nargs="+", metavar="SARIF")
+
+    rules = commands.add_parser("rules", help="top rules by result count")
+    files = commands.add_parser("files", help="top files by result count")
+    for command in (rules, files):
+        command.add_argument("--limit", type=int, default=20)
+        command.add_argument("--level", choices=LEVELS)
+
+    find = commands.add_parser(
+        "findings", help="results in files matching a GLOB pattern or path prefix, from any directory of the URI"
+    )
+    find.add_argument("pattern", help="e.g. 'app/src/main/*/webview/*' or 'app/src/main'")
+    find.add_argument("--rule")
+    find.add_argument("--level", choices=LEVELS)
+    find.add_argument("--limit", type=int)
+
+    compare = commands.add_parser("trend", help="new, fixed and per-rule changes against a previous database")
+    compare.add_argument("previous", help="database of an earlier merge")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "index":
+        count = write_database(args.database, [(path, "") for path in args.sarif_files])
+        print(f"Indexed {count} result(s) from {len(args.sarif_files)} SARIF file(s) into: {args.database}")
+        return
+
+    connection = open_database(args.database)
+    try:
+        if args.command == "rules":
+            print_table(("rule", "level", "count"), top_rules(connection, args.limit, args.level))
+        elif args.command == "files":
+            print_table(("file", "count"), top_files(connection, args.limit, args.level))
+        elif args.command == "findings":
+            rows = findings(connection, args.pattern, args.rule, args.level, args.limit)
+            print_table(("file", "line", "level", "rule", "message"), (
+                (uri, line, level, rule, (message or "").splitlines()[0] if message else "")
+                for uri, line, level, rule, message in rows
+            ))
+            print(f"{len(rows)} finding(s)")
+        elif args.command == "trend":
+            if not os.path.isfile(args.previous):
+                raise SystemExit(f"No SARIF database at: {args.previous}")
+            (new, fixed, unchanged), per_rule = trend(connection, args.previous)
+            print(f"{new} new, {fixed} fixed, {unchanged} unchanged finding(s)")
+            if per_rule:
+                print_table(("rule", "previous", "current", "delta"), (
+                    (rule, old, current, f"{current - old:+d}") for rule, old, current in per_rule
+                ))
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
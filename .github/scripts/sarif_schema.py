@@ -0,0 +1,322 @@
+"""
+Validation of the subset of SARIF 2.1.0 that `merge_sarif.py` relies on.
+
+The schema below is a small JSON Schema dialect (type, required, properties, additionalProperties, items, enum,
+minimum). It is compiled once, at import, into generated Python source: one function per object or array, with
+the checks of scalar members inlined, so checking a value is a run of plain `type()` tests and dictionary
+lookups with no schema interpretation. The JSON pointer of a failure is only built while the error propagates,
+so valid documents pay nothing for it.
+
+`check_result` validates one result as it is streamed, `check_tool` a run's tool as soon as it is read, and
+`check_document` the rest of a document (with its results left out).
+"""
+
+# Levels a result or rule configuration may have
+LEVELS = ["none", "note", "warning", "error"]
+
+ARTIFACT_LOCATION = {
+    "type": "object",
+    "properties": {
+        "uri": {"type": "string"},
+        "uriBaseId": {"type": "string"},
+        "index": {"type": "integer", "minimum": -1},
+    },
+}
+
+REGION = {
+    "type": "object",
+    "properties": {
+        "startLine": {"type": "integer", "minimum": 1},
+        "startColumn": {"type": "integer", "minimum": 1},
+        "endLine": {"type": "integer", "minimum": 1},
+        "endColumn": {"type": "integer", "minimum": 1},
+    },
+}
+
+LOCATION = {
+    "type": "object",
+    "properties": {
+        "physicalLocation": {
+            "type": "object",
+            "properties": {
+                "artifactLocation": ARTIFACT_LOCATION,
+                "region": REGION,
+                "contextRegion": REGION,
+            },
+        },
+    },
+}
+
+MESSAGE = {
+    "type": "object",
+    "properties": {
+        "text": {"type": "string"},
+        "markdown": {"type": "string"},
+        "id": {"type": "string"},
+    },
+}
+
+RESULT = {
+    "type": "object",
+    "required": ["message"],
+    "properties": {
+        "ruleId": {"type": "string"},
+        "ruleIndex": {"type": "integer", "minimum": -1},
+        "rule": {
+            "type": "object",
+            "properties": {
+                "id": {"type": "string"},
+                "index": {"type": "integer", "minimum": -1},
+            },
+        },
+        "kind": {"type": "string"},
+        "level": {"enum": LEVELS},
+        "message": MESSAGE,
+        "locations": {"type": "array", "items": LOCATION},
+        "relatedLocations": {"type": "array", "items": LOCATION},
+        "partialFingerprints": {"type": "object", "additionalProperties": {"type": "string"}},
+        "fingerprints": {"type": "object", "additionalProperties": {"type": "string"}},
+        "codeFlows": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "threadFlows": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "locations": {
+                                    "type": "array",
+                                    "items": {"type": "object", "properties": {"location": LOCATION}},
+                                },
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+
+TOOL = {
+    "type": "object",
+    "required": ["driver"],
+    "properties": {
+        "driver": {
+            "type": "object",
+            "required": ["name"],
+            "properties": {
+                "name": {"type": "string"},
+                "rules": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "required": ["id"],
+                        "properties": {
+                            "id": {"type": "string"},
+                            "defaultConfiguration": {
+                                "type": "object",
+                                "properties": {"level": {"enum": LEVELS}},
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+
+# Results are checked one at a time with RESULT, so they are not part of the document schema
+DOCUMENT = {
+    "type": "object",
+    "required": ["version", "runs"],
+    "properties": {
+        "version": {"enum": ["2.1.0"]},
+        "runs": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["tool"],
+                "properties": {
+                    "tool": TOOL,
+                    "results": {"type": "array"},
+                    "originalUriBaseIds": {"type": "object", "additionalProperties": ARTIFACT_LOCATION},
+                },
+            },
+        },
+    },
+}
+
+
+class SarifValidationError(ValueError):
+    """A SARIF file does not match the schema; picklable, so it can be raised in a pool worker"""
+
+    def __init__(self, path, pointer, message):
+        super().__init__(path, pointer, message)
+        self.path = path
+        self.pointer = pointer
+        self.message = message
+
+    def __str__(self):
+        return f"{self.path}: {self.pointer or '/'}: {self.message}"
+
+
+class _Invalid(Exception):
+    """Raised by compiled checks; collects the JSON pointer segments while it propagates"""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+        self.segments = []
+
+
+def _escape(segment):
+    return str(segment).replace("~", "~0").replace("/", "~1")
+
+
+# Type tests of the generated code. JSON decodes to exactly these classes, so `type(x) is` is enough and keeps
+# booleans (an int subclass) out of integers
+_TYPE_TESTS = {
+    "object": "type({0}) is not dict",
+    "array": "type({0}) is not list",
+    "string": "type({0}) is not str",
+    "integer": "type({0}) is not int",
+    "number": "type({0}) not in (int, float)",
+    "boolean": "type({0}) is not bool",
+}
+
+
+def _error(message, segments):
+    invalid = _Invalid(message)
+    invalid.segments.extend(segments)
+    return invalid
+
+
+def _type_error(name, value, segments):
+    return _error(f"expected {name}, got {type(value).__name__}", segments)
+
+
+def _enum_error(allowed, value, segments):
+    return _error(f"expected one of {', '.join(map(repr, allowed))}, got {value!r}", segments)
+
+
+def _minimum_error(minimum, value, segments):
+    return _error(f"expected at least {minimum}, got {value}", segments)
+
+
+def _missing_error(key, segments):
+    return _error(f"missing required property {key!r}", segments)
+
+
+def _is_container(schema):
+    return any(key in schema for key in ("properties", "additionalProperties", "items", "required"))
+
+
+class _Compiler:
+    """Generates one Python function per object or array schema; scalar checks are inlined into their parent"""
+
+    def __init__(self):
+        self.lines = []
+        self.functions = {}
+        self.namespace = {
+            "_Invalid": _Invalid,
+            "_MISSING": object(),
+            "_type_error": _type_error,
+            "_enum_error": _enum_error,
+            "_minimum_error": _minimum_error,
+            "_missing_error": _missing_error,
+        }
+
+    def constant(self, value):
+        name = f"_constant_{len(self.namespace)}"
+        self.namespace[name] = value
+        return name
+
+    def function(self, schema):
+        # Subschemas shared by several members (locations, regions) get one function
+        if id(schema) in self.functions:
+            return self.functions[id(schema)]
+        name = self.functions[id(schema)] = f"_check_{len(self.functions)}"
+        body = []
+        self.checks(schema, "value", body, 1, "()")
+        self.lines.append(f"def {name}(value):")
+        self.lines.extend(body or ["    pass"])
+        self.lines.append("")
+        return name
+
+    def nested(self, schema, variable, body, depth, segment):
+        """Check a member or item: inline when it is a scalar, otherwise through its own function"""
+        pad = "    " * depth
+        if not _is_container(schema):
+            start = len(body)
+            self.checks(schema, variable, body, depth, f"({segment},)")
+            if len(body) == start:
+                body.append(f"{pad}pass")
+            return
+        body.extend([
+            f"{pad}try:",
+            f"{pad}    {self.function(schema)}({variable})",
+            f"{pad}except _Invalid as invalid:",
+            f"{pad}    invalid.segments.append({segment})",
+            f"{pad}    raise",
+        ])
+
+    def checks(self, schema, variable, body, depth, segments):
+        pad = "    " * depth
+        if "type" in schema:
+            test = _TYPE_TESTS[schema["type"]].format(variable)
+            body.append(f"{pad}if {test}: raise _type_error({schema['type']!r}, {variable}, {segments})")
+        if "enum" in schema:
+            allowed = self.constant(tuple(schema["enum"]))
+            members = self.constant(frozenset(schema["enum"]))
+            body.append(
+                f"{pad}if type({variable}) is not str or {variable} not in {members}: "
+                f"raise _enum_error({allowed}, {variable}, {segments})"
+            )
+        if "minimum" in schema:
+            body.append(
+                f"{pad}if {variable} < {schema['minimum']!r}: "
+                f"raise _minimum_error({schema['minimum']!r}, {variable}, {segments})"
+            )
+        for key in schema.get("required", ()):
+            body.append(f"{pad}if {key!r} not in {variable}: raise _missing_error({key!r}, {segments})")
+        for index, (key, subschema) in enumerate(schema.get("properties", {}).items()):
+            member = f"member_{depth}_{index}"
+            body.append(f"{pad}{member} = {variable}.get({key!r}, _MISSING)")
+            body.append(f"{pad}if {member} is not _MISSING:")
+            self.nested(subschema, member, body, depth + 1, repr(key))
+        if "additionalProperties" in schema:
+            known = self.constant(frozenset(schema.get("properties", ())))
+            body.append(f"{pad}for key_{depth}, item_{depth} in {variable}.items():")
+            body.append(f"{pad}    if key_{depth} not in {known}:")
+            self.nested(schema["additionalProperties"], f"item_{depth}", body, depth + 2, f"key_{depth}")
+        if "items" in schema:
+            body.append(f"{pad}for index_{depth}, item_{depth} in enumerate({variable}):")
+            self.nested(schema["items"], f"item_{depth}", body, depth + 1, f"index_{depth}")
+
+
+def compile_schema(schema):
+    """Return a function checking a value against `schema`, raising _Invalid when it does not match"""
+    compiler = _Compiler()
+    name = compiler.function(schema)
+    exec(compile("\n".join(compiler.lines), f"<sarif schema {name}>", "exec"), compiler.namespace)
+    return compiler.namespace[name]
+
+
+def _validator(schema):
+    check = compile_schema(schema)
+
+    def validate(value, path, pointer=""):
+        """Raise SarifValidationError, with the JSON pointer under `pointer`, when `value` does not match"""
+        try:
+            check(value)
+        except _Invalid as invalid:
+            suffix = "".join(f"/{_escape(segment)}" for segment in reversed(invalid.segments))
+            raise SarifValidationError(path, pointer + suffix, invalid.message) from None
+    return validate
+
+
+check_result = _validator(RESULT)
+check_tool = _validator(TOOL)
+check_document = _validator(DOCUMENT)
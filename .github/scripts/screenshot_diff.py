@@ -0,0 +1,614 @@
+"""
+This script compares a directory of candidate screenshots against the screenshot test references, such as
+`app/src/fullDebug/screenshotTest/reference`, without running the Gradle validation task.
+
+## Usage:
+1. Compare the screenshots rendered by a test run with the references:
+   ```bash
+   python3 .github/scripts/screenshot_diff.py app/src/fullDebug/screenshotTest/reference path/to/rendered
+   ```
+2. Open `screenshot-diff/index.html` (or read `screenshot-diff/report.json`): every changed screenshot is shown
+   next to its reference and a diff image where the differing pixels are red.
+3. Reuse the results of earlier runs, and tolerate small rendering differences:
+   ```bash
+   python3 .github/scripts/screenshot_diff.py REFERENCES CANDIDATES --cache-dir /tmp/screenshot-cache \
+       --tolerance 2 --threshold 0.001 --max-hash-distance 4
+   ```
+
+## Note:
+Screenshots are paired by their path relative to each directory. A pair with the same content hash is unchanged
+and never decoded; the other pairs are decoded and compared in a process pool (`--jobs`), and with `--cache-dir`
+their results and diff images are stored under the hashes of both files, so reruns only compare new pairs.
+
+PNGs are decoded with `zlib` (8-bit, non-interlaced, any color type) into RGBA rows. The Sub and Up filters are
+undone a row at a time with big-integer operations. Average and Paeth depend on the byte just decoded, so bands
+of rows that use them are undone along a wavefront instead: at step `t`, row `j` of the band decodes pixel
+`t - j`, whose left, upper and upper-left neighbors were decoded in the two previous steps, and every channel of
+every row of the band is one 16-bit lane of the integers a step works on. Rows are compared in bands:
+equal bands are skipped with a byte comparison, and the others are compared all at once by packing every channel
+into a 16-bit lane of one Python integer, so the per-pixel test `|reference - candidate| > tolerance` is a few
+big-integer operations instead of a loop over pixels. A screenshot is changed when more than `--threshold` of
+its pixels differ (the default is the `imageDifferenceThreshold` of `app/build.gradle.kts`).
+
+Every compared pair also gets a perceptual difference hash (dHash, 64 bits) distance, which is small for
+anti-aliasing or color noise and large for layout changes. Changed screenshots within `--max-hash-distance` are
+reported as minor and do not fail the run; screenshots of different sizes are only compared by their hashes.
+"""
+
+import argparse
+import functools
+import hashlib
+import html
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import zlib
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+# Matches `screenshotTests.imageDifferenceThreshold` in app/build.gradle.kts
+DEFAULT_THRESHOLD = 0.00025
+DEFAULT_REPORT_DIRECTORY = "screenshot-diff"
+CACHE_VERSION = 1
+
+# Statuses, in report order; all but "minor" and "unchanged" fail the run
+STATUSES = ("missing", "new", "resized", "changed", "minor", "unchanged")
+FAILING_STATUSES = ("missing", "new", "resized", "changed")
+
+# Rows compared at once; bounds the size of the integers the pixels are packed into
+BAND_ROWS = 64
+# Rows unfiltered at once along a wavefront when they use the Average or Paeth filter
+WAVEFRONT_ROWS = 256
+HASH_SIZE = 8
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Channels per pixel of each PNG color type
+_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+Image = namedtuple("Image", ["width", "height", "pixels"])
+CompareOptions = namedtuple("CompareOptions", ["tolerance", "threshold", "max_hash_distance"])
+
+
+class PngError(ValueError):
+    """A file is not a PNG this script can decode"""
+
+
+@functools.lru_cache(maxsize=16)
+def _repeat(pattern, count):
+    """Return the little-endian integer made of `pattern` repeated `count` times"""
+    return int.from_bytes(pattern * count, "little")
+
+
+def _add_bytes(x, y, length):
+    """Add two integers byte by byte, modulo 256 in every byte, as PNG filters do"""
+    high, low = _repeat(b"\x80", length), _repeat(b"\x7f", length)
+    return ((x & low) + (y & low)) ^ ((x ^ y) & high)
+
+
+def _unfilter_row(filter_type, row, previous, bpp):
+    length = len(row)
+    if filter_type == 0:
+        return row
+    if filter_type == 1:
+        # Sub is a prefix sum with a stride of one pixel: log2(width) shifted additions
+        value = int.from_bytes(row, "little")
+        mask = (1 << (8 * length)) - 1
+        shift = 8 * bpp
+        while shift < 8 * length:
+            value = _add_bytes(value, (value << shift) & mask, length)
+            shift *= 2
+        return value.to_bytes(length, "little")
+    if filter_type == 2:
+        return _add_bytes(int.from_bytes(row, "little"), int.from_bytes(previous, "little"), length).to_bytes(
+            length, "little"
+        )
+    raise PngError(f"unknown filter type {filter_type}")
+
+
+def _lane_mask(flags, copies):
+    """Return the integer whose 16-bit lanes are all ones where `flags`, repeated `copies` times, is true"""
+    return int.from_bytes(b"".join(b"\xff\xff" if flag else b"\0\0" for flag in flags) * copies, "little")
+
+
+def _unfilter_wavefront(rows, filters, previous, bpp):
+    """
+    Undo the filters of consecutive `rows`, of any filter types, following `previous`. Row `j` is skewed by `j`
+    pixels so that the pixels decoded at one step form a column, and lane `k * len(rows) + j` holds channel `k`
+    of row `j`. Returns the unfiltered rows.
+    """
+    count, length = len(rows), len(previous)
+    width = length // bpp
+    skewed_width = width + count - 1
+    skewed = b"".join(bytes(j * bpp) + row + bytes((count - 1 - j) * bpp) for j, row in enumerate(rows))
+    # One line of `skewed_width` bytes per channel and row, so a column is a step's input
+    lines = b"".join(skewed[k::bpp] for k in range(bpp))
+    output = bytearray(len(lines))
+    lanes = count * bpp
+    ones, low = _repeat(b"\xff\xff", lanes), _repeat(b"\xff\0", lanes)
+    unit, bias256, bias512 = _repeat(b"\1\0", lanes), _repeat(b"\0\1", lanes), _repeat(b"\0\2", lanes)
+    first = _lane_mask([j == 0 for j in range(count)], bpp)
+    below_first = ones ^ first
+    sub, up, average, paeth = (_lane_mask([f == filter_type for f in filters], bpp) for filter_type in (1, 2, 3, 4))
+
+    def nonnegative(biased, bit):
+        # Lanes whose value, biased by 2**bit, is at least that bias
+        return ((biased >> bit) & unit) * 0xFFFF
+
+    expanded = bytearray(2 * lanes)
+    current = before = 0
+    for t in range(skewed_width):
+        expanded[0::2] = lines[t::skewed_width]
+        filtered = int.from_bytes(expanded, "little")
+        # The first row of the band takes its upper neighbors from `previous`
+        top = top_left = 0
+        for k in range(bpp):
+            if t < width:
+                top |= previous[t * bpp + k] << (16 * k * count)
+            if 0 < t <= width:
+                top_left |= previous[(t - 1) * bpp + k] << (16 * k * count)
+        left = current
+        above = ((current << 16) & below_first) | top
+        above_left = ((before << 16) & below_first) | top_left
+        if t < count:
+            # Row t starts: its pixel 0 has no left neighbors
+            starting = ones ^ (first << (16 * t))
+            left &= starting
+            above_left &= starting
+        predictor = (left & sub) | (above & up)
+        if average:
+            predictor |= ((left + above) >> 1) & low & average
+        if paeth:
+            difference = above + bias256 - above_left
+            sign = nonnegative(difference, 8)
+            distance_left = ((difference & sign) | ((above_left + bias256 - above) & (ones ^ sign))) - bias256
+            difference = left + bias256 - above_left
+            sign = nonnegative(difference, 8)
+            distance_up = ((difference & sign) | ((above_left + bias256 - left) & (ones ^ sign))) - bias256
+            difference = left + above + bias512 - (above_left << 1)
+            sign = nonnegative(difference, 9)
+            distance_up_left = (
+                (difference & sign) | (((above_left << 1) + bias512 - left - above) & (ones ^ sign))
+            ) - bias512
+            pick_left = (
+                nonnegative(distance_up + bias512 - distance_left, 9)
+                & nonnegative(distance_up_left + bias512 - distance_left, 9)
+            )
+            pick_up = (ones ^ pick_left) & nonnegative(distance_up_left + bias512 - distance_up, 9)
+            pick_up_left = ones ^ pick_left ^ pick_up
+            predictor |= ((left & pick_left) | (above & pick_up) | (above_left & pick_up_left)) & paeth
+        before, current = current, (filtered + predictor) & low
+        output[t::skewed_width] = current.to_bytes(2 * lanes, "little")[0::2]
+
+    unskewed = bytearray(len(skewed))
+    plane = count * skewed_width
+    for k in range(bpp):
+        unskewed[k::bpp] = output[k * plane:(k + 1) * plane]
+    stride = skewed_width * bpp
+    return [bytes(unskewed[j * (stride + bpp):j * (stride + bpp) + length]) for j in range(count)]
+
+
+def _unfilter(raw, height, length, bpp):
+    """Undo the filter of every row of decompressed image data; returns the rows"""
+    filters = raw[::length + 1][:height]
+    if any(filter_type > 4 for filter_type in filters):
+        raise PngError(f"unknown filter type {max(filters)}")
+    rows = []
+    previous = bytes(length)
+    for start in range(0, height, WAVEFRONT_ROWS):
+        band = filters[start:start + WAVEFRONT_ROWS]
+        rows_of_band = [raw[y * (length + 1) + 1:(y + 1) * (length + 1)] for y in range(start, start + len(band))]
+        if any(filter_type >= 3 for filter_type in band):
+            rows.extend(_unfilter_wavefront(rows_of_band, band, previous, bpp))
+        else:
+            for filter_type, row in zip(band, rows_of_band):
+                rows.append(_unfilter_row(filter_type, row, rows[-1] if rows else previous, bpp))
+        previous = rows[-1]
+    return rows
+
+
+def _to_rgba(data, color_type, pixel_count, palette, transparency):
+    """Expand decoded samples of any color type to RGBA"""
+    if color_type == 6:
+        return data
+    rgba = bytearray(b"\xff" * (4 * pixel_count))
+    if color_type == 2:
+        for channel in range(3):
+            rgba[channel::4] = data[channel::3]
+    elif color_type == 0:
+        for channel in range(3):
+            rgba[channel::4] = data
+    elif color_type == 4:
+        for channel in range(3):
+            rgba[channel::4] = data[0::2]
+        rgba[3::4] = data[1::2]
+    elif color_type == 3:
+        if palette is None:
+            raise PngError("missing palette")
+        entries = [palette[i:i + 3] for i in range(0, len(palette), 3)]
+        entries += [b"\0\0\0"] * (256 - len(entries))
+        alphas = bytes(transparency or b"") + b"\xff" * (256 - len(transparency or b""))
+        for channel in range(3):
+            rgba[channel::4] = data.translate(bytes(entry[channel] for entry in entries))
+        rgba[3::4] = data.translate(alphas)
+    return bytes(rgba)
+
+
+def read_png(path):
+    """Decode an 8-bit, non-interlaced PNG into an Image of RGBA rows"""
+    with open(path, "rb") as file:
+        data = file.read()
+    if not data.startswith(PNG_SIGNATURE):
+        raise PngError(f"{path} is not a PNG file")
+    position = len(PNG_SIGNATURE)
+    header = palette = transparency = None
+    compressed = []
+    while position + 8 <= len(data):
+        length, chunk_type = struct.unpack(">I4s", data[position:position + 8])
+        chunk = data[position + 8:position + 8 + length]
+        position += 12 + length
+        if chunk_type == b"IHDR":
+            header = struct.unpack(">IIBBBBB", chunk)
+        elif chunk_type == b"PLTE":
+            palette = chunk
+        elif chunk_type == b"tRNS":
+            transparency = chunk
+        elif chunk_type == b"IDAT":
+            compressed.append(chunk)
+        elif chunk_type == b"IEND":
+            break
+    if header is None:
+        raise PngError(f"{path} has no IHDR chunk")
+    width, height, bit_depth, color_type, _, _, interlace = header
+    if bit_depth != 8 or interlace or color_type not in _CHANNELS:
+        raise PngError(
+            f"{path}: unsupported PNG (bit depth {bit_depth}, color type {color_type}, interlace {interlace})"
+        )
+    bpp = _CHANNELS[color_type]
+    stride = width * bpp
+    try:
+        raw = zlib.decompress(b"".join(compressed))
+    except zlib.error as e:
+        raise PngError(f"{path}: {e}") from None
+    if len(raw) < height * (stride + 1):
+        raise PngError(f"{path}: truncated image data")
+    rows = _unfilter(raw, height, stride, bpp)
+    return Image(width, height, _to_rgba(b"".join(rows), color_type, width * height, palette, transparency))
+
+
+def write_png(path, image):
+    """Write an RGBA Image as a PNG, without filtering"""
+    stride = 4 * image.width
+    raw = b"".join(b"\0" + image.pixels[y * stride:(y + 1) * stride] for y in range(image.height))
+
+    def chunk(chunk_type, body):
+        return struct.pack(">I", len(body)) + chunk_type + body + struct.pack(">I", zlib.crc32(chunk_type + body))
+
+    with open(path, "wb") as file:
+        file.write(PNG_SIGNATURE)
+        file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", image.width, image.height, 8, 6, 0, 0, 0)))
+        file.write(chunk(b"IDAT", zlib.compress(raw, 6)))
+        file.write(chunk(b"IEND", b""))
+
+
+def _lanes(pixels):
+    """Pack every byte of `pixels` into its own 16-bit lane of an integer"""
+    spread = bytearray(2 * len(pixels))
+    spread[0::2] = pixels
+    return int.from_bytes(spread, "little")
+
+
+def differing_pixels(reference, candidate, tolerance=0):
+    """
+    Return a bytes object with one byte per pixel, 1 where a channel of `candidate` differs from `reference` by
+    more than `tolerance`, 0 elsewhere; both are RGBA bytes of the same size.
+    """
+    pixel_count = len(reference) // 4
+    # Every lane of `reference + bias - candidate` stays within 0x4000 - 510 .. 0x4000 + 255, so lanes never
+    # borrow from each other; adding 0x3fff - tolerance sets bit 15 exactly when reference - candidate > tolerance
+    bias = _repeat(struct.pack("<H", 0x4000 + 0x3FFF - tolerance), 4 * pixel_count)
+    sign = _repeat(b"\x00\x80", 4 * pixel_count)
+    reference_lanes, candidate_lanes = _lanes(reference), _lanes(candidate)
+    over = ((reference_lanes + bias - candidate_lanes) | (candidate_lanes + bias - reference_lanes)) & sign
+    # Fold the four channel bits of every pixel into the bit 15 of its first lane
+    over |= over >> 16 | over >> 32 | over >> 48
+    over = (over & _repeat(b"\x00\x80" + bytes(6), pixel_count)) >> 15
+    return over.to_bytes(8 * pixel_count, "little")[0::8]
+
+
+def difference_hash(image):
+    """
+    Return the 64-bit dHash of an image: whether each cell of a 9x8 grayscale grid is brighter than the next.
+    Cell brightness is an integer mean, so that flat areas, where screenshots are mostly equal, hash the same
+    despite a little noise.
+    """
+    columns = [image.width * x // (HASH_SIZE + 1) for x in range(HASH_SIZE + 2)]
+    stride = 4 * image.width
+    value = 0
+    for cell_row in range(HASH_SIZE):
+        top = image.height * cell_row // HASH_SIZE
+        bottom = min(max(image.height * (cell_row + 1) // HASH_SIZE, top + 1), image.height)
+        # Sample at most 16 rows of every cell
+        rows = range(top, bottom, max((bottom - top) // 16, 1))
+        totals = [0] * (HASH_SIZE + 1)
+        for y in rows:
+            row = image.pixels[y * stride:(y + 1) * stride]
+            for x in range(HASH_SIZE + 1):
+                left, right = 4 * columns[x], 4 * max(columns[x + 1], columns[x] + 1)
+                totals[x] += sum(row[left:right:4]) + sum(row[left + 1:right:4]) + sum(row[left + 2:right:4])
+        means = [
+            totals[x] // (3 * len(rows) * max(columns[x + 1] - columns[x], 1)) for x in range(HASH_SIZE + 1)
+        ]
+        for x in range(HASH_SIZE):
+            value = value << 1 | (means[x] > means[x + 1])
+    return value
+
+
+def diff_image(image, flags):
+    """Return a copy of `image` washed out to a light gray, with the flagged pixels in red"""
+    # Lighten every channel, then make the whole image opaque
+    washed = bytearray(image.pixels.translate(bytes(192 + value // 4 for value in range(256))))
+    washed[3::4] = b"\xff" * (image.width * image.height)
+    mask = bytearray(4 * len(flags))
+    for channel in range(4):
+        mask[channel::4] = flags
+    mask = int.from_bytes(mask.translate(b"\x00" + b"\xff" * 255), "little")
+    red = _repeat(b"\xff\x00\x00\xff", len(flags))
+    pixels = (int.from_bytes(washed, "little") & ~mask | red & mask).to_bytes(len(washed), "little")
+    return Image(image.width, image.height, pixels)
+
+
+def compare_images(reference, candidate, tolerance=0):
+    """Return (number of differing pixels, flags from `differing_pixels`) of two images of the same size"""
+    stride = 4 * reference.width
+    band_size = BAND_ROWS * stride
+    flags = []
+    count = 0
+    for start in range(0, len(reference.pixels), band_size):
+        reference_band = reference.pixels[start:start + band_size]
+        candidate_band = candidate.pixels[start:start + band_size]
+        if reference_band == candidate_band:
+            flags.append(bytes(len(reference_band) // 4))
+            continue
+        band_flags = differing_pixels(reference_band, candidate_band, tolerance)
+        count += band_flags.count(1)
+        flags.append(band_flags)
+    return count, b"".join(flags)
+
+
+def compare_pair(reference_path, candidate_path, options, diff_path):
+    """Compare two screenshots; writes the diff image to `diff_path` when they differ, and returns the result"""
+    reference, candidate = read_png(reference_path), read_png(candidate_path)
+    result = {
+        "size": [reference.width, reference.height],
+        "candidateSize": [candidate.width, candidate.height],
+        "hashDistance": (difference_hash(reference) ^ difference_hash(candidate)).bit_count(),
+        "differingPixels": None,
+        "ratio": None,
+        "diff": None,
+    }
+    if (reference.width, reference.height) != (candidate.width, candidate.height):
+        result["status"] = "resized"
+        return result
+    count, flags = compare_images(reference, candidate, options.tolerance)
+    result["differingPixels"] = count
+    result["ratio"] = count / max(reference.width * reference.height, 1)
+    if result["ratio"] <= options.threshold:
+        result["status"] = "unchanged"
+    elif options.max_hash_distance is not None and result["hashDistance"] <= options.max_hash_distance:
+        result["status"] = "minor"
+    else:
+        result["status"] = "changed"
+    if count:
+        os.makedirs(os.path.dirname(diff_path), exist_ok=True)
+        write_png(diff_path, diff_image(reference, flags))
+        result["diff"] = diff_path
+    return result
+
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of the content of `path`"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_paths(cache_directory, key):
+    """Return the (result, diff image) paths of a cached comparison"""
+    directory = os.path.join(cache_directory, f"v{CACHE_VERSION}", key[:2])
+    return os.path.join(directory, f"{key}.json"), os.path.join(directory, f"{key}.png")
+
+
+def load_cached(cache_directory, key, diff_path):
+    """Return the cached result of a comparison, copying its diff image to `diff_path`, or None"""
+    result_path, image_path = cache_paths(cache_directory, key)
+    try:
+        with open(result_path, "r", encoding="utf-8") as file:
+            result = json.load(file)
+        if result["diff"] is not None:
+            os.makedirs(os.path.dirname(diff_path), exist_ok=True)
+            shutil.copyfile(image_path, diff_path)
+            result["diff"] = diff_path
+    except (OSError, ValueError, KeyError):
+        return None
+    return result
+
+
+def store_cached(cache_directory, key, result):
+    result_path, image_path = cache_paths(cache_directory, key)
+    os.makedirs(os.path.dirname(result_path), exist_ok=True)
+    if result["diff"] is not None:
+        shutil.copyfile(result["diff"], image_path)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(result_path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as file:
+        json.dump(result, file)
+    os.replace(temp_path, result_path)
+
+
+def list_screenshots(directory):
+    """Return the PNG files under `directory`, relative to it, with `/` separators"""
+    found = []
+    for root, directories, files in os.walk(directory):
+        directories.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".png"):
+                found.append(os.path.relpath(os.path.join(root, name), directory).replace(os.sep, "/"))
+    return found
+
+
+def compare_directories(reference_directory, candidate_directory, report_directory, options, jobs=1,
+                        cache_directory=None):
+    """Compare every screenshot of both directories; returns the results, keyed by relative path"""
+    references = set(list_screenshots(reference_directory))
+    candidates = set(list_screenshots(candidate_directory))
+    results = {}
+    pending = {}
+    reused = 0
+    for name in sorted(references | candidates):
+        if name not in candidates:
+            results[name] = {"status": "missing"}
+            continue
+        if name not in references:
+            results[name] = {"status": "new"}
+            continue
+        reference_path = os.path.join(reference_directory, name)
+        candidate_path = os.path.join(candidate_directory, name)
+        reference_digest, candidate_digest = file_digest(reference_path), file_digest(candidate_path)
+        if reference_digest == candidate_digest:
+            results[name] = {"status": "unchanged", "identical": True}
+            continue
+        diff_path = os.path.join(report_directory, "diffs", name)
+        key = hashlib.sha256(f"{reference_digest}:{candidate_digest}:{tuple(options)}".encode()).hexdigest()
+        if cache_directory:
+            cached = load_cached(cache_directory, key, diff_path)
+            if cached is not None:
+                results[name] = cached
+                reused += 1
+                continue
+        pending[name] = (key, reference_path, candidate_path, diff_path)
+
+    def store(name, result):
+        results[name] = result
+        if cache_directory:
+            store_cached(cache_directory, pending[name][0], result)
+
+    if jobs == 1 or len(pending) < 2:
+        for name, (_, reference_path, candidate_path, diff_path) in pending.items():
+            store(name, compare_pair(reference_path, candidate_path, options, diff_path))
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as pool:
+            futures = {
+                name: pool.submit(compare_pair, reference_path, candidate_path, options, diff_path)
+                for name, (_, reference_path, candidate_path, diff_path) in pending.items()
+            }
+            for name, future in futures.items():
+                store(name, future.result())
+    if cache_directory:
+        print(f"Reused {reused} comparison(s) from the cache at: {cache_directory}")
+    return {name: results[name] for name in sorted(results)}
+
+
+def write_report(report_directory, results, reference_directory, candidate_directory):
+    """Write `report.json`, and an `index.html` showing the screenshots that are not unchanged"""
+    with open(os.path.join(report_directory, "report.json"), "w", encoding="utf-8") as file:
+        json.dump({"reference": reference_directory, "candidate": candidate_directory, "results": results}, file,
+                  indent=4)
+
+    def image(path):
+        if path is None or not os.path.isfile(path):
+            return "<td></td>"
+        source = html.escape(os.path.relpath(path, report_directory).replace(os.sep, "/"))
+        return f'<td><a href="{source}"><img src="{source}" loading="lazy"></a></td>'
+
+    rows = []
+    for status in STATUSES[:-1]:
+        for name, result in results.items():
+            if result["status"] != status:
+                continue
+            details = ", ".join(
+                f"{key} {result[key]:.4%}" if key == "ratio" else f"{key} {result[key]}"
+                for key in ("ratio", "differingPixels", "hashDistance")
+                if result.get(key) is not None
+            )
+            rows.append(
+                f"<tr><td><b>{status}</b><br>{html.escape(name)}<br>{html.escape(details)}</td>"
+                + image(os.path.join(reference_directory, name))
+                + image(os.path.join(candidate_directory, name))
+                + image(result.get("diff"))
+                + "</tr>"
+            )
+    with open(os.path.join(report_directory, "index.html"), "w", encoding="utf-8") as file:
+        file.write(
+            "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Screenshot diff</title>"
+            "<style>img{max-width:320px;border:1px solid #ccc}td{vertical-align:top;padding:4px}</style>"
+            "</head><body>\n<table>\n<tr><th></th><th>Reference</th><th>Candidate</th><th>Diff</th></tr>\n"
+            + "\n".join(rows)
+            + "\n</table>\n</body></html>\n"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare candidate screenshots against screenshot test references")
+    parser.add_argument("reference", help="directory of reference screenshots")
+    parser.add_argument("candidate", help="directory of candidate screenshots, laid out like the references")
+    parser.add_argument(
+        "-o", "--output", default=DEFAULT_REPORT_DIRECTORY, metavar="DIRECTORY",
+        help=f"directory to write the report and diff images to (default: {DEFAULT_REPORT_DIRECTORY})",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count() or 1,
+        help="number of screenshots to decode and compare in parallel (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--tolerance", type=int, default=0,
+        help="largest difference of a channel (0-255) that still counts as the same pixel (default: 0)",
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD,
+        help=f"fraction of differing pixels a screenshot may have (default: {DEFAULT_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--max-hash-distance", type=int, metavar="BITS",
+        help="report changed screenshots whose perceptual hashes differ by at most BITS (0-64) as minor",
+    )
+    parser.add_argument("--cache-dir", help="directory caching comparisons by the content hashes of both screenshots")
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if not 0 <= args.tolerance <= 255:
+        parser.error("--tolerance must be between 0 and 255")
+    if not 0 <= args.threshold <= 1:
+        parser.error("--threshold must be between 0 and 1")
+    for directory in (args.reference, args.candidate):
+        if not os.path.isdir(directory):
+            parser.error(f"{directory} is not a directory")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    options = CompareOptions(args.tolerance, args.threshold, args.max_hash_distance)
+    if os.path.isdir(os.path.join(args.output, "diffs")):
+        shutil.rmtree(os.path.join(args.output, "diffs"))
+    os.makedirs(args.output, exist_ok=True)
+    try:
+        results = compare_directories(args.reference, args.candidate, args.output, options, args.jobs, args.cache_dir)
+    except (OSError, PngError) as e:
+        print(f"❌ Could not compare screenshots: {e}")
+        return 1
+    write_report(args.output, results, args.reference, args.candidate)
+    counts = Counter(result["status"] for result in results.values())
+    print(
+        f"Compared {len(results)} screenshot(s): "
+        + ", ".join(f"{counts[status]} {status}" for status in STATUSES if counts[status])
+    )
+    print(f"Report written to: {os.path.join(args.output, 'index.html')}")
+    return 1 if any(counts[status] for status in FAILING_STATUSES) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,70 +5,48 @@ Advanced Compilation Test for Home Assistant Android Demo Mode
 This test performs deeper analysis of the code to identify potential compilation issues.
 """
 
-import sys
-import os
 import re
+import sys
 from datetime import datetime
 
-class AndroidCompilationTest:
-    def __init__(self):
-        self.tests_run = 0
-        self.tests_passed = 0
-        self.project_root = "/app"
+from harness.kotlin import describe, lex
+from harness.kotlin_balance import check_balance, scan_files
+from harness.kotlin_graph import KotlinGraph
+from harness.snapshot import KOTLIN_TREE_ROOTS
+from harness.suite import DemoSuite
+
+class AndroidCompilationTest(DemoSuite):
+    def __init__(self, argv=None):
+        super().__init__(argv)
         self.issues_found = []
+        # Kept across runs of the same instance (watch mode) so unchanged files are not re-read
+        self.graph = KotlinGraph(self.sources)
+        self.scanned = {}
 
-    def run_test(self, name, test_func):
-        """Run a single test"""
-        self.tests_run += 1
-        print(f"\n🔍 Testing {name}...")
-        
-        try:
-            result = test_func()
-            if result:
-                self.tests_passed += 1
-                print(f"✅ Passed - {name}")
-            else:
-                print(f"❌ Failed - {name}")
-            return result
-        except Exception as e:
-            print(f"❌ Failed - {name}: {str(e)}")
-            return False
+    def issues(self):
+        return self.issues_found
 
     def test_import_consistency(self):
         """Test that all demo-related imports are consistent"""
-        demo_files = [
-            "/app/app/src/main/kotlin/io/homeassistant/companion/android/demo/DemoModeManager.kt",
-            "/app/app/src/main/kotlin/io/homeassistant/companion/android/demo/DemoEntityRepository.kt",
-            "/app/app/src/main/kotlin/io/homeassistant/companion/android/demo/DemoIntegrationRepository.kt",
-            "/app/app/src/main/kotlin/io/homeassistant/companion/android/demo/DemoWebViewContent.kt"
-        ]
-        
-        # Check that demo files have proper package declarations
-        for file_path in demo_files:
-            with open(file_path, 'r') as f:
-                content = f.read()
-            
-            if "package io.homeassistant.companion.android.demo" not in content:
-                self.issues_found.append(f"Incorrect package declaration in {file_path}")
-                return False
-        
-        # Check that files importing demo classes use correct imports
-        importing_files = [
-            "/app/app/src/main/kotlin/io/homeassistant/companion/android/webview/WebViewActivity.kt",
-            "/app/app/src/main/kotlin/io/homeassistant/companion/android/launch/LaunchActivity.kt",
-            "/app/app/src/main/kotlin/io/homeassistant/companion/android/onboarding/welcome/WelcomeFragment.kt"
-        ]
+        if not self.checks.verify("compilation.import_consistency", self.issues_found.append):
+            return False
         
-        for file_path in importing_files:
-            with open(file_path, 'r') as f:
-                content = f.read()
-            
-            # Check for proper demo imports
-            if "DemoModeManager" in content and "import io.homeassistant.companion.android.demo.DemoModeManager" not in content:
-                self.issues_found.append(f"Missing DemoModeManager import in {file_path}")
-                return False
+        # Project-wide graph: the demo package must not add unused imports or package cycles
+        demo_package = "io.homeassistant.companion.android.demo"
+        graph = self.graph.refresh()
+        issues = []
+        for path, entries in graph.unused_imports(graph.files_in(demo_package)).items():
+            for entry in entries:
+                issues.append(f"Unused import {entry['path']} in {path}:{entry['line']}")
+        for cycle in graph.package_cycles():
+            if demo_package in cycle:
+                issues.append(f"Package cycle through {demo_package}: {', '.join(cycle)}")
+        if issues:
+            self.issues_found.extend(issues)
+            return False
         
         print("All imports are consistent")
+        print(f"Demo mode changes reach {len(graph.reaching(demo_package))} of {len(graph.files)} Kotlin files")
         return True
 
     def test_dependency_injection_annotations(self):
@@ -81,11 +59,10 @@ class AndroidCompilationTest:
         ]
         
         for file_path in files_with_injection:
-            with open(file_path, 'r') as f:
-                content = f.read()
+            annotations = {annotation["name"] for annotation in self.kotlin.file(file_path)["annotations"]}
             
             # Check for @Singleton or @Inject annotations
-            if "@Singleton" not in content and "@Inject" not in content:
+            if not annotations & {"Singleton", "Inject"}:
                 self.issues_found.append(f"Missing dependency injection annotations in {file_path}")
                 return False
         
@@ -102,46 +79,49 @@ class AndroidCompilationTest:
         ]
         
         for file_path in demo_files:
-            with open(file_path, 'r') as f:
-                content = f.read()
+            content = self.sources.read(file_path)
             
-            # Check for basic syntax issues
-            if content.count('{') != content.count('}'):
-                self.issues_found.append(f"Mismatched braces in {file_path}")
+            # Check for basic syntax issues, ignoring brackets in strings and comments
+            imbalances = check_balance(content, file_path)
+            if imbalances:
+                for imbalance in imbalances:
+                    self.issues_found.append(
+                        f"Mismatched brackets in {file_path}:{imbalance.line}:{imbalance.column}: {imbalance.message}"
+                    )
                 return False
-            
-            if content.count('(') != content.count(')'):
-                self.issues_found.append(f"Mismatched parentheses in {file_path}")
-                return False
-            
-            # Check for proper class declarations
-            if "class " in content and not re.search(r'class\s+\w+', content):
+        
+            # Check for proper class declarations; files of top-level functions or constants have none
+            declares_class = re.search(r'(?<!::)\bclass\s', lex(content).code)
+            if declares_class and not self.kotlin.file(file_path)["classes"]:
                 self.issues_found.append(f"Invalid class declaration in {file_path}")
                 return False
         
         print("Basic Kotlin syntax appears correct")
         return True
 
-    def test_entity_state_management(self):
-        """Test that entity state management is properly implemented"""
-        entity_repo_file = "/app/app/src/main/kotlin/io/homeassistant/companion/android/demo/DemoEntityRepository.kt"
-        
-        with open(entity_repo_file, 'r') as f:
-            content = f.read()
-        
-        # Check for proper entity state updates
-        if "updateEntityState" not in content:
-            self.issues_found.append("Missing updateEntityState method")
+    def test_tree_bracket_balance(self):
+        """Test that every Kotlin source in the project has balanced brackets"""
+        scanned = scan_files(self.sources.walk(KOTLIN_TREE_ROOTS), previous=self.scanned)
+        self.scanned = {result.path: result for result in scanned}
+        
+        imbalances = []
+        for result in scanned:
+            self.sources.note_read(result.path, result.mtime_ns, result.size, result.sha256)
+            imbalances.extend(result.imbalances)
+        
+        for imbalance in imbalances:
+            self.issues_found.append(
+                f"Mismatched brackets in {imbalance.path}:{imbalance.line}:{imbalance.column}: {imbalance.message}"
+            )
+        if imbalances:
             return False
         
-        # Check for proper entity initialization
-        if "initializeDemoEntities" not in content:
-            self.issues_found.append("Missing initializeDemoEntities method")
-            return False
-        
-        # Check for LocalDateTime usage
-        if "LocalDateTime" not in content:
-            self.issues_found.append("Missing LocalDateTime for entity timestamps")
+        print(f"All {len(scanned)} Kotlin files have balanced brackets")
+        return True
+
+    def test_entity_state_management(self):
+        """Test that entity state management is properly implemented"""
+        if not self.checks.verify("compilation.entity_state_management", self.issues_found.append):
             return False
         
         print("Entity state management is properly implemented")
@@ -149,24 +129,7 @@ class AndroidCompilationTest:
 
     def test_webview_integration(self):
         """Test WebView integration for demo mode"""
-        webview_file = "/app/app/src/main/kotlin/io/homeassistant/companion/android/webview/WebViewActivity.kt"
-        
-        with open(webview_file, 'r') as f:
-            content = f.read()
-        
-        # Check for proper demo mode detection
-        if "demoModeManager.isDemoModeEnabled" not in content:
-            self.issues_found.append("Missing demo mode detection in WebViewActivity")
-            return False
-        
-        # Check for demo HTML loading
-        if "loadDataWithBaseURL" not in content:
-            self.issues_found.append("Missing loadDataWithBaseURL for demo content")
-            return False
-        
-        # Check for demo base URL
-        if "demo.home-assistant.local" not in content:
-            self.issues_found.append("Missing demo base URL")
+        if not self.checks.verify("compilation.webview_integration", self.issues_found.append):
             return False
         
         print("WebView integration is properly implemented")
@@ -174,52 +137,8 @@ class AndroidCompilationTest:
 
     def test_html_generation_completeness(self):
         """Test that HTML generation is complete and valid"""
-        webview_content_file = "/app/app/src/main/kotlin/io/homeassistant/companion/android/demo/DemoWebViewContent.kt"
-        webview_activity_file = "/app/app/src/main/kotlin/io/homeassistant/companion/android/webview/WebViewActivity.kt"
-        
-        with open(webview_content_file, 'r') as f:
-            content = f.read()
-        
-        with open(webview_activity_file, 'r') as f:
-            webview_content = f.read()
-        
-        # Check for complete HTML structure in DemoWebViewContent
-        html_requirements = [
-            "<!DOCTYPE html>",
-            "<html",
-            "<head>",
-            "<body>",
-            "</html>"
-        ]
-        
-        for requirement in html_requirements:
-            if requirement not in content:
-                self.issues_found.append(f"Missing HTML requirement: {requirement}")
-                return False
-        
-        # Check for MIME type and encoding in WebViewActivity
-        webview_requirements = [
-            "text/html",
-            "UTF-8"
-        ]
-        
-        for requirement in webview_requirements:
-            if requirement not in webview_content:
-                self.issues_found.append(f"Missing WebView requirement: {requirement}")
-                return False
-        
-        # Check for JavaScript functionality
-        js_requirements = [
-            "toggleEntity",
-            "externalApp",
-            "externalBus",
-            "addEventListener"
-        ]
-        
-        for requirement in js_requirements:
-            if requirement not in content:
-                self.issues_found.append(f"Missing JavaScript requirement: {requirement}")
-                return False
+        if not self.checks.verify("compilation.html_generation_completeness", self.issues_found.append):
+            return False
         
         print("HTML generation is complete and valid")
         return True
@@ -228,27 +147,27 @@ class AndroidCompilationTest:
         """Test that DemoIntegrationRepository properly implements IntegrationRepository"""
         integration_file = "/app/app/src/main/kotlin/io/homeassistant/companion/android/demo/DemoIntegrationRepository.kt"
         
-        with open(integration_file, 'r') as f:
-            content = f.read()
-        
         # Check for proper interface implementation
-        if ": IntegrationRepository" not in content:
+        repository = self.kotlin.find_class(integration_file, "DemoIntegrationRepository")
+        if repository is None or "IntegrationRepository" not in repository["supertypes"]:
             self.issues_found.append("DemoIntegrationRepository does not implement IntegrationRepository")
             return False
         
-        # Check for key method implementations
-        required_methods = [
-            "override suspend fun getEntities()",
-            "override suspend fun getEntity(entityId: String)",
-            "override suspend fun callAction",
-            "override suspend fun registerDevice",
-            "override suspend fun getConfig()"
-        ]
+        # Check that every interface member is overridden, and nothing else is
+        mismatches = self.kotlin.override_mismatches(
+            integration_file, "DemoIntegrationRepository", "IntegrationRepository"
+        )
+        if mismatches is None:
+            self.issues_found.append("IntegrationRepository source not found")
+            return False
         
-        for method in required_methods:
-            if method not in content:
-                self.issues_found.append(f"Missing method implementation: {method}")
-                return False
+        missing, unknown = mismatches
+        for function in missing:
+            self.issues_found.append(f"Missing method implementation: {describe(function)}")
+        for function in unknown:
+            self.issues_found.append(f"Override without matching interface member: {describe(function)}")
+        if missing or unknown:
+            return False
         
         print("Interface implementation is correct")
         return True
@@ -260,13 +179,12 @@ class AndroidCompilationTest:
         ]
         
         for file_path in files_with_coroutines:
-            with open(file_path, 'r') as f:
-                content = f.read()
+            index = self.kotlin.file(file_path)
             
             # Check for proper suspend function usage
-            if "suspend fun" in content:
+            if any("suspend" in function["modifiers"] for function in index["functions"]):
                 # Check for proper coroutine imports
-                if "kotlinx.coroutines" not in content:
+                if not any(entry["path"].startswith("kotlinx.coroutines.") for entry in index["imports"]):
                     self.issues_found.append(f"Missing coroutine imports in {file_path}")
                     return False
         
@@ -275,19 +193,7 @@ class AndroidCompilationTest:
 
     def test_android_context_usage(self):
         """Test that Android Context is properly used"""
-        demo_manager_file = "/app/app/src/main/kotlin/io/homeassistant/companion/android/demo/DemoModeManager.kt"
-        
-        with open(demo_manager_file, 'r') as f:
-            content = f.read()
-        
-        # Check for proper Context usage
-        if "Context" not in content:
-            self.issues_found.append("Missing Context import/usage in DemoModeManager")
-            return False
-        
-        # Check for SharedPreferences usage
-        if "SharedPreferences" not in content:
-            self.issues_found.append("Missing SharedPreferences usage in DemoModeManager")
+        if not self.checks.verify("compilation.android_context_usage", self.issues_found.append):
             return False
         
         print("Android Context usage is correct")
@@ -295,26 +201,8 @@ class AndroidCompilationTest:
 
     def test_entity_action_simulation(self):
         """Test that entity actions are properly simulated"""
-        integration_file = "/app/app/src/main/kotlin/io/homeassistant/companion/android/demo/DemoIntegrationRepository.kt"
-        
-        with open(integration_file, 'r') as f:
-            content = f.read()
-        
-        # Check for action handling
-        actions = ["turn_on", "turn_off", "toggle", "lock", "unlock"]
-        
-        for action in actions:
-            if f'"{action}"' not in content:
-                self.issues_found.append(f"Missing action simulation: {action}")
-                return False
-        
-        # Check for domain handling
-        domains = ["light", "switch"]
-        
-        for domain in domains:
-            if f'"{domain}"' not in content:
-                self.issues_found.append(f"Missing domain handling: {domain}")
-                return False
+        if not self.checks.verify("compilation.entity_action_simulation", self.issues_found.append):
+            return False
         
         print("Entity action simulation is properly implemented")
         return True
@@ -328,6 +216,7 @@ class AndroidCompilationTest:
         self.run_test("Import Consistency", self.test_import_consistency)
         self.run_test("Dependency Injection Annotations", self.test_dependency_injection_annotations)
         self.run_test("Kotlin Syntax Basics", self.test_kotlin_syntax_basics)
+        self.run_test("Tree Bracket Balance", self.test_tree_bracket_balance)
         self.run_test("Entity State Management", self.test_entity_state_management)
         self.run_test("WebView Integration", self.test_webview_integration)
         self.run_test("HTML Generation Completeness", self.test_html_generation_completeness)
@@ -336,6 +225,8 @@ class AndroidCompilationTest:
         self.run_test("Android Context Usage", self.test_android_context_usage)
         self.run_test("Entity Action Simulation", self.test_entity_action_simulation)
         
+        self.finish_run()
+
         # Print results
         print(f"\n📊 Advanced Test Results:")
         print(f"Tests passed: {self.tests_passed}/{self.tests_run}")
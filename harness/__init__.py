@@ -0,0 +1,3 @@
+"""
+Shared infrastructure for the Home Assistant Android demo mode test suites.
+"""
@@ -0,0 +1,152 @@
+"""
+Persistent result cache for the demo mode test suites.
+
+Each passing test is stored together with the files it read (mtime, size and
+sha256), the paths whose existence it probed and the listings of the source
+trees it walked. On the next run the test is skipped when none of those inputs
+changed. A stat match is enough to trust an input; when only the mtime moved,
+the content hash decides.
+"""
+
+import os
+import glob
+import json
+import hashlib
+import tempfile
+import subprocess
+
+from harness.snapshot import PROJECT_ROOT, list_sources, listing_digest
+
+CACHE_DIR = os.path.join(PROJECT_ROOT, ".harness-cache")
+HARNESS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def code_digest(suite_path, harness_dir=HARNESS_DIR):
+    """Return the digest of a suite script and of the harness code it runs"""
+    paths = sorted(glob.glob(os.path.join(harness_dir, "*.py"))) + [os.path.join(harness_dir, "checks.json")]
+    digest = hashlib.sha256()
+    for path in [suite_path, *paths]:
+        digest.update(f"{os.path.relpath(path, harness_dir)}\0{_file_digest(path)}\0".encode())
+    return digest.hexdigest()
+
+
+def changed_since(ref, root=PROJECT_ROOT):
+    """Return the absolute paths changed since git `ref`, including untracked files
+
+    Returns None when git cannot answer, in which case callers fall back to
+    comparing content hashes.
+    """
+    commands = [
+        ["git", "-C", root, "diff", "--name-only", ref, "--"],
+        ["git", "-C", root, "ls-files", "--others", "--exclude-standard"],
+    ]
+    changed = set()
+    for command in commands:
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            stderr = getattr(e, "stderr", None) or str(e)
+            print(f"⚠️  Could not diff against {ref}: {stderr.strip()}")
+            return None
+        changed.update(os.path.join(root, line) for line in result.stdout.splitlines() if line)
+    return changed
+
+
+def depends_on(inputs, paths):
+    """Return whether recorded `inputs` depend on any of `paths`"""
+    if any(path in paths for path in (*inputs["reads"], *inputs["exists"])):
+        return True
+    # Any file added or removed under a walked tree may change its listing
+    for key in inputs.get("trees", {}):
+        roots, suffix = json.loads(key)
+        if any(
+            path.endswith(suffix) and any(path.startswith(root + os.sep) for root in roots)
+            for path in paths
+        ):
+            return True
+    return False
+
+
+class ResultCache:
+    """On-disk record of passing tests and the inputs they depended on"""
+
+    def __init__(self, suite_name, suite_path, sources, cache_dir=CACHE_DIR):
+        self.sources = sources
+        self.suite_path = os.path.abspath(suite_path)
+        self.code_hash = code_digest(self.suite_path)
+        self.path = os.path.join(cache_dir, f"{suite_name}.json")
+        self.entries = self._load()
+        self.dirty = False
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def entry(self, name):
+        """Return the cached entry for test `name`, if it was recorded by this suite version"""
+        entry = self.entries.get(name)
+        if entry is None or entry.get("code") != self.code_hash:
+            return None
+        return entry
+
+    def is_fresh(self, name, changed=None):
+        """Return whether test `name` passed before and none of its inputs changed
+
+        With `changed` (a set of paths from `changed_since`) git decides what
+        changed; otherwise each recorded input is checked against the disk.
+        """
+        entry = self.entry(name)
+        if entry is None:
+            return False
+        trees = entry.get("trees", {})
+        if changed is not None:
+            return not depends_on(entry, changed)
+
+        for path, expected in entry["exists"].items():
+            if os.path.exists(path) != expected:
+                return False
+        for key, digest in trees.items():
+            roots, suffix = json.loads(key)
+            if listing_digest(list_sources(roots, suffix)) != digest:
+                return False
+        for path, (mtime_ns, size, sha256) in entry["reads"].items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return False
+            if stat.st_mtime_ns == mtime_ns and stat.st_size == size:
+                continue
+            if stat.st_size != size or self.sources.digest(path) != sha256:
+                return False
+            # Touched but identical: remember the new mtime so the next run is a plain stat
+            entry["reads"][path] = [stat.st_mtime_ns, size, sha256]
+            self.dirty = True
+        return True
+
+    def record(self, name, inputs):
+        """Remember that test `name` passed with `inputs` (see SourceSnapshot.stop_recording)"""
+        self.entries[name] = {"code": self.code_hash, **inputs}
+        self.dirty = True
+
+    def forget(self, name):
+        if self.entries.pop(name, None) is not None:
+            self.dirty = True
+
+    def save(self):
+        """Write the cache atomically, so concurrent suites never see a partial file"""
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.entries, f, sort_keys=True)
+        os.replace(temp_path, self.path)
+        self.dirty = False
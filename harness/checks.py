@@ -0,0 +1,234 @@
+"""
+Declarative content checks for the demo mode test suites.
+
+The expectations live in `checks.json`: each check id maps to an ordered list
+of entries naming a file and the tokens it must contain (`required`, or at
+least one of `any`), must not contain (`forbidden`), or the regexes it must
+match (`regex`). An entry with `when` only applies if all of those tokens are
+present.
+
+All literal tokens the whole spec asks about a file are compiled into one
+trie-shaped regex and found in a single scan of the file, so a token shared by
+several suites is only looked for once. Results are keyed by the content hash
+of the file and of the spec; `run_all_tests.py` evaluates the spec once and
+publishes the results to the suites through the shared snapshot store. A
+file's matcher is only compiled when its results are not already there, so a
+suite started by it compiles none. Parsed specs are kept per process, keyed by
+the spec's content hash, so the suites of watch mode share them.
+"""
+
+import os
+import re
+import json
+from collections import defaultdict
+
+from harness.snapshot import PROJECT_ROOT
+
+SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checks.json")
+
+# Name of the snapshot store extra holding precomputed results
+SHARED_RESULTS = "checks"
+
+# Parsed specs by (content hash, root), shared by the CheckEngines of one process
+_SPECS = {}
+
+
+def _trie_node_pattern(node):
+    terminal = "" in node
+    branches = [
+        re.escape(char) + _trie_node_pattern(child)
+        for char, child in sorted(node.items())
+        if char
+    ]
+    if not branches:
+        return ""
+    if len(branches) == 1 and not terminal:
+        return branches[0]
+    group = "(?:" + "|".join(branches) + ")"
+    return group + "?" if terminal else group
+
+
+def compile_token_matcher(tokens):
+    """Compile `tokens` into a regex matching the longest token at a position
+
+    Branches are factored by common prefix, so at every position the scan
+    follows at most one path through the trie. Since all tokens found at a
+    position lie on that path, every other token there is a prefix of the
+    reported one.
+    """
+    trie = {}
+    for token in tokens:
+        node = trie
+        for char in token:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return re.compile(_trie_node_pattern(trie))
+
+
+class TokenMatcher:
+    """Finds which of a fixed set of literal tokens occur in a text in one pass"""
+
+    def __init__(self, tokens):
+        self.tokens = sorted(set(tokens))
+        self._pattern = compile_token_matcher(self.tokens) if self.tokens else None
+        self._prefixes = {
+            token: [other for other in self.tokens if token.startswith(other)]
+            for token in self.tokens
+        }
+
+    def search(self, text):
+        """Return the set of tokens present in `text`"""
+        if self._pattern is None:
+            return set()
+        longest = set()
+        search = self._pattern.search
+        match = search(text)
+        while match is not None:
+            # Tokens may overlap, so resume right after the start of the last match
+            longest.add(match.group())
+            match = search(text, match.start() + 1)
+        present = set()
+        for token in longest:
+            present.update(self._prefixes[token])
+        return present
+
+
+class CheckSpec:
+    """Parsed `checks.json`; the predicates are merged per file on first use"""
+
+    def __init__(self, text, sha256, root=PROJECT_ROOT):
+        data = json.loads(text)
+        self.sha256 = sha256
+        self.paths = {key: os.path.join(root, path) for key, path in data["files"].items()}
+        self.checks = data["checks"]
+        self._tokens = None
+        self._regexes = None
+        self._matchers = {}
+
+    def _merge_predicates(self):
+        if self._tokens is not None:
+            return
+        tokens = defaultdict(set)
+        regexes = defaultdict(set)
+        for entries in self.checks.values():
+            for entry in entries:
+                path = self.paths[entry["file"]]
+                for field in ("when", "required", "any", "forbidden"):
+                    tokens[path].update(entry.get(field, ()))
+                regexes[path].update(entry.get("regex", ()))
+        self._tokens = dict(tokens)
+        self._regexes = {path: sorted(path_regexes) for path, path_regexes in regexes.items()}
+
+    def checked_paths(self):
+        """Return the paths the spec has predicates about"""
+        return {self.paths[entry["file"]] for entries in self.checks.values() for entry in entries}
+
+    def match(self, path, text):
+        """Evaluate every predicate of the spec about `path` against `text`"""
+        self._merge_predicates()
+        matcher = self._matchers.get(path)
+        if matcher is None and path in self._tokens:
+            matcher = self._matchers[path] = TokenMatcher(self._tokens[path])
+        return {
+            "tokens": matcher.search(text) if matcher else set(),
+            "regexes": {pattern for pattern in self._regexes.get(path, ()) if re.search(pattern, text)},
+        }
+
+
+def _failure(entry, result, path):
+    """Return the message for the first predicate of `entry` that fails, or None"""
+    tokens = result["tokens"]
+    if not all(token in tokens for token in entry.get("when", ())):
+        return None
+
+    message = entry["message"]
+    missing = [token for token in entry.get("required", ()) if token not in tokens]
+    if missing:
+        return message.format(token=missing[0], missing=missing, path=path)
+
+    any_of = entry.get("any", ())
+    if any_of and not any(token in tokens for token in any_of):
+        return message.format(token=" or ".join(any_of), missing=list(any_of), path=path)
+
+    present = [token for token in entry.get("forbidden", ()) if token in tokens]
+    if present:
+        return message.format(token=present[0], missing=present, path=path)
+
+    unmatched = [pattern for pattern in entry.get("regex", ()) if pattern not in result["regexes"]]
+    if unmatched:
+        return message.format(token=unmatched[0], missing=unmatched, path=path)
+    return None
+
+
+class CheckEngine:
+    """Evaluates spec checks against the sources of a SourceSnapshot"""
+
+    def __init__(self, sources, spec_path=SPEC_PATH):
+        self.sources = sources
+        self.spec_path = spec_path
+        self._spec = None
+        self._results = {}
+
+    def spec(self):
+        """Return the parsed spec, re-reading it only when its content changed"""
+        sha256 = self.sources.digest(self.spec_path)
+        if self._spec is None or self._spec.sha256 != sha256:
+            key = (sha256, PROJECT_ROOT)
+            if key not in _SPECS:
+                _SPECS[key] = CheckSpec(self.sources.read(self.spec_path), sha256)
+            self._spec = _SPECS[key]
+            self._results = {}
+            self._load_shared(self._spec)
+        return self._spec
+
+    def _load_shared(self, spec):
+        shared = self.sources.extra(SHARED_RESULTS)
+        if not shared or shared["spec"] != spec.sha256:
+            return
+        for key, result in shared["results"].items():
+            self._results[key] = {
+                "tokens": set(result["tokens"]),
+                "regexes": set(result["regexes"]),
+            }
+
+    def evaluate(self, path):
+        """Return the predicate results for `path`, computing them once per content"""
+        spec = self.spec()
+        source = self.sources.get(path)
+        key = f"{path}:{source.sha256}"
+        result = self._results.get(key)
+        if result is None:
+            result = spec.match(path, source.text)
+            self._results[key] = result
+        return result
+
+    def verify(self, check_id, report):
+        """Run the entries of `check_id` in order and report the first failure
+
+        `report` is called with the failure message. Returns whether every
+        entry passed.
+        """
+        spec = self.spec()
+        for entry in spec.checks[check_id]:
+            path = spec.paths[entry["file"]]
+            message = _failure(entry, self.evaluate(path), path)
+            if message is not None:
+                report(message)
+                return False
+        return True
+
+    def evaluate_all(self):
+        """Evaluate the whole spec and return it in the form the suites load from the store"""
+        spec = self.spec()
+        results = {}
+        for path in spec.checked_paths():
+            try:
+                source = self.sources.get(path)
+            except OSError:
+                continue
+            result = self.evaluate(path)
+            results[f"{path}:{source.sha256}"] = {
+                "tokens": sorted(result["tokens"]),
+                "regexes": sorted(result["regexes"]),
+            }
+        return {"spec": spec.sha256, "results": results}
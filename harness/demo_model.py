@@ -0,0 +1,528 @@
+"""
+Executable model of the demo mode entity state machine.
+
+`DemoIntegrationRepository.callAction` maps `(domain, action)` calls to
+`DemoEntityRepository.updateEntityState` transitions. `build_model` parses
+the `when (action)` block of `callAction` into a small statement tree and the
+entities `initializeDemoEntities` creates, then interprets the tree for every
+call and state each entity can reach. The result is one state-to-state table
+per (entity, domain, action) call, taken from the Kotlin rather than from a
+hand-written copy of it; a construct the interpreter does not know is a
+DemoModelError, so the model cannot silently drift from the source.
+
+Every call changes a single entity, so entities evolve independently:
+`explore` visits every reachable state of every entity and returns the
+shortest call sequence reaching each invariant violation; `ignored_actions`
+lists the actions a domain offers that leave its entities unchanged whatever
+their state. `fuzz` runs random
+call sequences over the same tables, one lookup per call, to exercise the
+tables (and any future invariant over several entities) at millions of calls
+per second per core.
+
+Usage:
+    python3 -m harness.demo_model [--steps N] [--seed N] [--jobs N] [--any-domain]
+"""
+
+import re
+import sys
+import time
+import random
+import argparse
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from harness.kotlin import brace_pairs, lex, line_column
+from harness.snapshot import KOTLIN_ROOT
+
+INTEGRATION_PATH = f"{KOTLIN_ROOT}/demo/DemoIntegrationRepository.kt"
+ENTITY_PATH = f"{KOTLIN_ROOT}/demo/DemoEntityRepository.kt"
+
+# States an entity of each domain may ever be in
+DOMAIN_STATES = {
+    "light": frozenset({"on", "off"}),
+    "switch": frozenset({"on", "off"}),
+    "lock": frozenset({"locked", "unlocked"}),
+}
+# Domains whose allowed states are listed by an attribute of the entity
+STATE_ATTRIBUTES = {"climate": "hvac_modes"}
+# Any other domain is read-only: actions must leave its entities in their initial state
+
+# Actions each domain offers, which must change the state of its entities from some reachable state
+DOMAIN_ACTIONS = {
+    "light": ("turn_on", "turn_off", "toggle"),
+    "switch": ("turn_on", "turn_off", "toggle"),
+    "lock": ("lock", "unlock"),
+    "climate": ("turn_on", "turn_off"),
+}
+
+# Domain or action value standing for every value the `when` branches do not name
+OTHER = None
+
+# Calls per random sequence; every sequence starts from the initial states
+SEQUENCE_LENGTH = 64
+
+DemoEntity = namedtuple("DemoEntity", ["entity_id", "domain", "state", "attributes"])
+Call = namedtuple("Call", ["entity", "domain", "action"])
+Violation = namedtuple("Violation", ["entity_id", "state", "trace"])
+IgnoredAction = namedtuple("IgnoredAction", ["entity_id", "action"])
+FuzzResult = namedtuple("FuzzResult", ["steps", "seconds", "violations"])
+
+
+class DemoModelError(Exception):
+    def __init__(self, message, path, text, position):
+        line, column = line_column(text, position)
+        super().__init__(f"{path}:{line}:{column}: {message}")
+
+
+def _code_with_strings(source):
+    """Return `source` with its comments blanked and its string literals kept"""
+    lexed = lex(source)
+    pieces = []
+    position = 0
+    for start, end in lexed.strings:
+        pieces.append(lexed.code[position:start])
+        pieces.append(source[start:end])
+        position = end
+    pieces.append(lexed.code[position:])
+    return "".join(pieces)
+
+
+def _function_body(text, name, path):
+    """Return the (start, end) of the body of function `name`, braces excluded"""
+    match = re.search(rf"\bfun\s+{name}\s*\(", text)
+    if match is None:
+        raise DemoModelError(f"function {name} not found", path, text, 0)
+    start = text.index("{", match.end())
+    return start + 1, brace_pairs(text)[start]
+
+
+_SPACE = re.compile(r"\s*")
+_TOKEN = re.compile(r'("[^"\n]*")|([A-Za-z_]\w*)|(\?\.|==|!=|->|[(){},=.])')
+
+
+class _Parser:
+    """Recursive descent over the statements `callAction` is written with"""
+
+    def __init__(self, text, start, end, path):
+        self.text = text
+        self.path = path
+        # (token, position, kind): kind 1 is a string literal, 2 a name, 3 an operator
+        self.tokens = []
+        position = start
+        while True:
+            position = _SPACE.match(text, position, end).end()
+            if position == end:
+                break
+            match = _TOKEN.match(text, position, end)
+            if match is None:
+                raise DemoModelError("unexpected character", path, text, position)
+            self.tokens.append((match.group(), position, match.lastindex))
+            position = match.end()
+        self.index = 0
+
+    def error(self, message, position=None):
+        if position is None:
+            position = self.tokens[min(self.index, len(self.tokens) - 1)][1] if self.tokens else 0
+        return DemoModelError(message, self.path, self.text, position)
+
+    def peek(self, offset=0):
+        index = self.index + offset
+        return self.tokens[index][0] if index < len(self.tokens) else None
+
+    def kind(self):
+        return self.tokens[self.index][2] if self.index < len(self.tokens) else None
+
+    def take(self, expected=None):
+        if self.index >= len(self.tokens):
+            raise self.error("unexpected end of code")
+        token, _, kind = self.tokens[self.index]
+        if expected is not None and token != expected:
+            raise self.error(f"expected '{expected}', found '{token}'")
+        self.index += 1
+        return token, kind
+
+    def name(self):
+        token, kind = self.take()
+        if kind != 2:
+            raise self.error(f"expected a name, found '{token}'")
+        return token
+
+    def block(self):
+        self.take("{")
+        statements = []
+        while self.peek() != "}":
+            statements.append(self.statement())
+        self.take("}")
+        return statements
+
+    def statement(self):
+        if self.peek() == "val":
+            self.take()
+            name = self.name()
+            self.take("=")
+            return ("val", name, self.expression())
+        if self.peek() == "when":
+            return self.when()
+        if self.peek(1) == "." and self.peek(2) == "updateEntityState":
+            self.name()
+            self.take(".")
+            self.take()
+            self.take("(")
+            self.name()
+            self.take(",")
+            value = self.expression()
+            self.take(")")
+            return ("update", value)
+        raise self.error(f"unsupported statement starting with '{self.peek()}'")
+
+    def when(self):
+        self.take("when")
+        self.take("(")
+        subject = self.name()
+        self.take(")")
+        self.take("{")
+        branches = []
+        while self.peek() != "}":
+            if self.peek() == "else":
+                self.take()
+                values = None
+            else:
+                values = [self.literal()]
+                while self.peek() == ",":
+                    self.take()
+                    values.append(self.literal())
+            self.take("->")
+            body = self.block() if self.peek() == "{" else [self.statement()]
+            branches.append((values, body))
+        self.take("}")
+        return ("when", subject, branches)
+
+    def literal(self):
+        token, kind = self.take()
+        if kind != 1:
+            raise self.error(f"expected a string literal, found '{token}'")
+        return token[1:-1]
+
+    def expression(self):
+        if self.kind() == 1:
+            return ("literal", self.literal())
+        if self.peek() == "if":
+            self.take()
+            self.take("(")
+            left = self.operand()
+            operator, _ = self.take()
+            if operator not in ("==", "!="):
+                raise self.error(f"unsupported comparison '{operator}'")
+            right = self.operand()
+            self.take(")")
+            then = self.expression()
+            self.take("else")
+            return ("if", operator, left, right, then, self.expression())
+        if self.peek(1) == "." and self.peek(2) == "getEntity":
+            self.name()
+            self.take(".")
+            self.take()
+            self.take("(")
+            self.name()
+            self.take(")")
+            return ("entity",)
+        return ("name", self.name())
+
+    def operand(self):
+        if self.kind() == 1:
+            return ("literal", self.literal())
+        name = self.name()
+        if self.peek() in ("?.", "."):
+            self.take()
+            if self.name() != "state":
+                raise self.error("only the state of an entity can be compared")
+            return ("state", name)
+        return ("name", name)
+
+
+class _Entity:
+    """Value of `getEntity(entityId)`: the entity as it is at that point of the call"""
+
+
+def _evaluate(expression, scope, state):
+    kind = expression[0]
+    if kind == "literal":
+        return expression[1]
+    if kind == "entity":
+        return _Entity()
+    if kind == "name":
+        return scope[expression[1]]
+    if kind == "state":
+        # Entity states are read live: `updateEntityState` replaces the entity in place
+        return state[0] if isinstance(scope[expression[1]], _Entity) else None
+    _, operator, left, right, then, otherwise = expression
+    equal = _evaluate(left, scope, state) == _evaluate(right, scope, state)
+    return _evaluate(then if equal == (operator == "==") else otherwise, scope, state)
+
+
+def _execute(statements, scope, state):
+    for statement in statements:
+        if statement[0] == "val":
+            scope[statement[1]] = _evaluate(statement[2], scope, state)
+        elif statement[0] == "update":
+            state[0] = _evaluate(statement[1], scope, state)
+        else:
+            _, subject, branches = statement
+            value = scope[subject]
+            for values, body in branches:
+                if values is None or value in values:
+                    _execute(body, scope, state)
+                    break
+
+
+def apply_call(program, domain, action, state):
+    """Return the state an entity in `state` is left in by `callAction(domain, action, ...)`"""
+    current = [state]
+    _execute(program, {"domain": domain, "action": action}, current)
+    return current[0]
+
+
+def parse_call_action(source, path=INTEGRATION_PATH):
+    """Return the statement tree of the `when (action)` block of `callAction`"""
+    text = _code_with_strings(source)
+    start, end = _function_body(text, "callAction", path)
+    match = re.compile(r"\bwhen\s*\(\s*action\s*\)").search(text, start, end)
+    if match is None:
+        raise DemoModelError("callAction has no when (action) block", path, text, start)
+    parser = _Parser(text, match.start(), brace_pairs(text)[text.index("{", match.end())] + 1, path)
+    return [parser.when()]
+
+
+def parse_entities(source, path=ENTITY_PATH):
+    """Return the DemoEntities `initializeDemoEntities` creates, in creation order"""
+    text = _code_with_strings(source)
+    start, end = _function_body(text, "initializeDemoEntities", path)
+    # Matching parentheses of the body, to find the end of every Entity(...) call
+    pairs = {}
+    stack = []
+    for match in re.finditer(r"[()]", text[start:end]):
+        if match.group() == "(":
+            stack.append(start + match.start())
+        elif stack:
+            pairs[stack.pop()] = start + match.start()
+    entities = []
+    for match in re.finditer(r'_entities\s*\[\s*"([^"]*)"\s*\]\s*=\s*Entity\s*\(', text[start:end]):
+        arguments = text[start + match.end():pairs[start + match.end() - 1]]
+        state = re.search(r'\bstate\s*=\s*"([^"]*)"', arguments)
+        if state is None:
+            raise DemoModelError(f"{match.group(1)} has no literal state", path, text, start + match.start())
+        attributes = {
+            key: tuple(re.findall(r'"([^"]*)"', values))
+            for key, values in re.findall(r'"(\w+)"\s+to\s+listOf\(([^)]*)\)', arguments)
+        }
+        entity_id = match.group(1)
+        entities.append(DemoEntity(entity_id, entity_id.split(".")[0], state.group(1), attributes))
+    return entities
+
+
+def allowed_states(entity):
+    """Return the states `entity` may be in"""
+    if entity.domain in DOMAIN_STATES:
+        return DOMAIN_STATES[entity.domain]
+    attribute = STATE_ATTRIBUTES.get(entity.domain)
+    if attribute in entity.attributes:
+        return frozenset(entity.attributes[attribute])
+    return frozenset({entity.state})
+
+
+def _branch_values(program, subject):
+    values = set()
+    for statement in program:
+        if statement[0] == "when":
+            for branch_values, body in statement[2]:
+                if statement[1] == subject:
+                    values.update(branch_values or ())
+                values |= _branch_values(body, subject)
+    return values
+
+
+class DemoModel:
+    """Entities, the calls that can reach them, and the state table of every call
+
+    Entity states are numbered per entity, 0 being the initial state;
+    `tables[i][s]` is the state call `i` leaves its entity in from state `s`.
+    """
+
+    def __init__(self, program, entities, any_domain=False):
+        self.entities = entities
+        actions = sorted(_branch_values(program, "action")) + [OTHER]
+        domains = sorted(_branch_values(program, "domain") | {entity.domain for entity in entities}) + [OTHER]
+        self.calls = [
+            Call(index, domain, action)
+            for index, entity in enumerate(entities)
+            for domain in (domains if any_domain else [entity.domain])
+            for action in actions
+        ]
+        self.states = [[entity.state] for entity in entities]
+        transitions = [[] for _ in self.calls]
+        calls_of = [[] for _ in entities]
+        for index, call in enumerate(self.calls):
+            calls_of[call.entity].append(index)
+        for entity, states in enumerate(self.states):
+            numbers = {states[0]: 0}
+            # `states` grows while it is walked, until no call leads to a new state
+            for state in states:
+                for index in calls_of[entity]:
+                    call = self.calls[index]
+                    following = apply_call(program, call.domain, call.action, state)
+                    if following not in numbers:
+                        numbers[following] = len(states)
+                        states.append(following)
+                    transitions[index].append(numbers[following])
+        self.tables = [tuple(table) for table in transitions]
+        self.violating = [
+            tuple(state not in allowed_states(entity) for state in states)
+            for entity, states in zip(entities, self.states)
+        ]
+
+    def describe(self, call):
+        domain = "*" if call.domain is OTHER else call.domain
+        action = "<other action>" if call.action is OTHER else call.action
+        return f"{domain}.{action}({self.entities[call.entity].entity_id})"
+
+
+def build_model(sources=None, any_domain=False):
+    """Build the DemoModel of the demo sources, read through `sources` (a SourceSnapshot) when given"""
+    def read(path):
+        if sources is not None:
+            return sources.read(path)
+        with open(path, "r", encoding="utf-8") as file:
+            return file.read()
+    return DemoModel(parse_call_action(read(INTEGRATION_PATH)), parse_entities(read(ENTITY_PATH)), any_domain)
+
+
+def explore(model):
+    """Return a Violation, with a shortest trace, for every reachable state an invariant forbids"""
+    violations = []
+    calls_of = [[] for _ in model.entities]
+    for index, call in enumerate(model.calls):
+        calls_of[call.entity].append(index)
+    for entity, states in enumerate(model.states):
+        parents = {0: None}
+        queue = deque([0])
+        while queue:
+            state = queue.popleft()
+            if model.violating[entity][state]:
+                trace = []
+                current = state
+                while parents[current] is not None:
+                    current, index = parents[current]
+                    trace.append(model.calls[index])
+                violations.append(Violation(model.entities[entity].entity_id, states[state], trace[::-1]))
+            for index in calls_of[entity]:
+                following = model.tables[index][state]
+                if following not in parents:
+                    parents[following] = (state, index)
+                    queue.append(following)
+    return violations
+
+
+def ignored_actions(model):
+    """Return an IgnoredAction for every action of DOMAIN_ACTIONS that leaves an entity unchanged in all its states"""
+    ignored = []
+    for index, call in enumerate(model.calls):
+        entity = model.entities[call.entity]
+        if call.domain != entity.domain or call.action not in DOMAIN_ACTIONS.get(entity.domain, ()):
+            continue
+        table = model.tables[index]
+        if all(following == state for state, following in enumerate(table)):
+            ignored.append(IgnoredAction(entity.entity_id, call.action))
+    return ignored
+
+
+def _trace(model, sequence, last):
+    """Return the calls of `sequence` up to the first one, `last`, that leaves its entity in a violating state"""
+    state = [0] * len(model.entities)
+    for position, index in enumerate(sequence):
+        entity = model.calls[index].entity
+        state[entity] = model.tables[index][state[entity]]
+        if index == last and model.violating[entity][state[entity]]:
+            return [model.calls[call] for call in sequence[:position + 1]]
+    return [model.calls[call] for call in sequence]
+
+
+def fuzz(model, steps, seed=0, length=SEQUENCE_LENGTH):
+    """Run `steps` random calls, in sequences of `length` from the initial states
+
+    Returns a FuzzResult whose violations map (entity id, state) to the first
+    call sequence found reaching it.
+    """
+    rng = random.Random(seed)
+    tables = model.tables
+    entity_of = [call.entity for call in model.calls]
+    violating = model.violating
+    initial = [0] * len(model.entities)
+    calls = range(len(model.calls))
+    # Sequences are drawn in batches to keep the sampling out of the inner loop
+    batch = max(length, 1 << 16) // length * length
+    found = {}
+    done = 0
+    started = time.perf_counter()
+    while done < steps:
+        sequences = rng.choices(calls, k=min(batch, -(-(steps - done) // length) * length))
+        for start in range(0, len(sequences), length):
+            state = initial[:]
+            for call in sequences[start:start + length]:
+                entity = entity_of[call]
+                following = state[entity] = tables[call][state[entity]]
+                if violating[entity][following]:
+                    key = (model.entities[entity].entity_id, model.states[entity][following])
+                    if key not in found:
+                        found[key] = _trace(model, sequences[start:start + length], call)
+        done += len(sequences)
+    return FuzzResult(done, time.perf_counter() - started, found)
+
+
+def _fuzz_worker(any_domain, steps, seed):
+    return fuzz(build_model(any_domain=any_domain), steps, seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the demo entity state machine against its invariants")
+    parser.add_argument("--steps", type=int, default=1_000_000, help="random calls to run (default: 1000000)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first worker's random sequences")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="worker processes, each with its own seed")
+    parser.add_argument(
+        "--any-domain", action="store_true",
+        help="also call actions with a domain other than the entity's own",
+    )
+    args = parser.parse_args(argv)
+
+    model = build_model(any_domain=args.any_domain)
+    print(f"Model: {len(model.entities)} entities, {len(model.calls)} calls, "
+          f"{sum(len(states) for states in model.states)} reachable states")
+    violations = explore(model)
+    for violation in violations:
+        trace = " -> ".join(model.describe(call) for call in violation.trace)
+        print(f"{violation.entity_id} reaches '{violation.state}': {trace}")
+    ignored = ignored_actions(model)
+    for entity_id, action in ignored:
+        print(f"{entity_id} ignores {action}")
+
+    started = time.perf_counter()
+    if args.jobs == 1:
+        results = [fuzz(model, args.steps, args.seed)]
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(
+                _fuzz_worker, [args.any_domain] * args.jobs,
+                [-(-args.steps // args.jobs)] * args.jobs, range(args.seed, args.seed + args.jobs),
+            ))
+    seconds = time.perf_counter() - started
+    steps = sum(result.steps for result in results)
+    found = {key for result in results for key in result.violations}
+    print(f"Fuzzed {steps} calls in {seconds:.2f}s ({steps / seconds / 1e6:.2f}M calls/s), "
+          f"{len(found)} violating state(s) hit")
+    missed = found - {(violation.entity_id, violation.state) for violation in violations}
+    for entity_id, state in sorted(missed):
+        print(f"Fuzzing reached {entity_id} '{state}', which exploration did not")
+    return 1 if violations or ignored or missed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,654 @@
+"""
+Lightweight Kotlin lexer and declaration index.
+
+`lex` masks comments and string literals (keeping string template expressions,
+which are code) so that later scans cannot match inside them. The masked text
+has the same length and line structure as the source, so positions map back
+1:1. `index_source` then extracts the package, imports, annotations, classes,
+functions and properties of a file from the masked text.
+
+`KotlinIndex` caches one index per file content hash, in memory and on disk,
+so only files that changed are parsed again.
+"""
+
+import os
+import re
+import json
+import glob
+import bisect
+import tempfile
+from collections import namedtuple
+
+from harness.snapshot import PROJECT_ROOT
+
+# Bump when the shape of an index changes, to invalidate the on-disk cache
+INDEX_VERSION = 1
+INDEX_CACHE_DIR = os.path.join(PROJECT_ROOT, ".harness-cache", f"kotlin-index-v{INDEX_VERSION}")
+
+MODIFIERS = frozenset({
+    "abstract", "actual", "annotation", "companion", "const", "crossinline", "data", "enum",
+    "expect", "external", "final", "fun", "infix", "inline", "inner", "internal", "lateinit",
+    "noinline", "open", "operator", "override", "private", "protected", "public", "reified",
+    "sealed", "suspend", "tailrec", "value", "vararg",
+})
+
+LexedSource = namedtuple("LexedSource", ["source", "code", "strings"])
+
+
+class KotlinSyntaxError(Exception):
+    def __init__(self, message, line, column):
+        super().__init__(f"{message} at {line}:{column}")
+        self.message = message
+        self.line = line
+        self.column = column
+
+
+def line_column(text, position):
+    """Return the 1-based (line, column) of `position` in `text`"""
+    line_start = text.rfind("\n", 0, position) + 1
+    return text.count("\n", 0, position) + 1, position - line_start + 1
+
+
+def _blank(segment):
+    if "\n" not in segment:
+        return " " * len(segment)
+    return "\n".join(" " * len(line) for line in segment.split("\n"))
+
+
+_CODE_STOP = re.compile(r"[/\"'`{}]")
+_STRING_STOP = re.compile(r"[\\$\"\n]")
+_RAW_STRING_STOP = re.compile(r"[$\"]")
+_CHAR_LITERAL = re.compile(r"'(?:\\(?:u[0-9a-fA-F]{4}|.)|[^'\\\n])'")
+_TEMPLATE_NAME = re.compile(r"[A-Za-z_]\w*")
+_NON_WORD = re.compile(r"\W")
+_BLOCK_COMMENT_TOKEN = re.compile(r"/\*|\*/")
+
+
+def _block_comment_end(source, start):
+    """Return the end of the (possibly nested) block comment opening at `start`"""
+    depth = 0
+    for token in _BLOCK_COMMENT_TOKEN.finditer(source, start):
+        depth += 1 if token.group() == "/*" else -1
+        if depth == 0:
+            return token.end()
+    raise KotlinSyntaxError("Unterminated block comment", *line_column(source, start))
+
+
+def lex(source):
+    """Mask the comments and string literals of `source`
+
+    Returns a LexedSource whose `code` has comments and literal text replaced
+    by spaces; `${...}` template expressions stay visible, as do the names of
+    `$name` templates. Backticked identifiers keep their backticks with any
+    non-word characters turned into `_`. `strings` holds the (start, end)
+    span of every string literal, quotes included.
+    """
+    pieces = []
+    strings = []
+    # One entry per open `{`: None for a code brace, (kind, literal start) for a template
+    braces = []
+    position = 0
+    length = len(source)
+    kind = None
+    literal_start = 0
+
+    while position < length:
+        if kind is None:
+            match = _CODE_STOP.search(source, position)
+            if match is None:
+                pieces.append(source[position:])
+                break
+            start = match.start()
+            char = source[start]
+            pieces.append(source[position:start])
+
+            if char == "/":
+                following = source[start + 1:start + 2]
+                if following == "/":
+                    end = source.find("\n", start)
+                    end = length if end < 0 else end
+                elif following == "*":
+                    end = _block_comment_end(source, start)
+                else:
+                    pieces.append(char)
+                    position = start + 1
+                    continue
+                pieces.append(_blank(source[start:end]))
+                position = end
+            elif char == '"':
+                kind = '"""' if source.startswith('"""', start) else '"'
+                literal_start = start
+                pieces.append(" " * len(kind))
+                position = start + len(kind)
+            elif char == "'":
+                literal = _CHAR_LITERAL.match(source, start)
+                if literal is None:
+                    raise KotlinSyntaxError("Malformed character literal", *line_column(source, start))
+                pieces.append(_blank(literal.group()))
+                position = literal.end()
+            elif char == "`":
+                end = source.find("`", start + 1)
+                newline = source.find("\n", start + 1)
+                if end < 0 or 0 <= newline < end:
+                    raise KotlinSyntaxError("Unterminated backtick identifier", *line_column(source, start))
+                pieces.append("`" + _NON_WORD.sub("_", source[start + 1:end]) + "`")
+                position = end + 1
+            elif char == "{":
+                braces.append(None)
+                pieces.append(char)
+                position = start + 1
+            else:
+                pieces.append(char)
+                position = start + 1
+                if braces:
+                    template = braces.pop()
+                    if template is not None:
+                        kind, literal_start = template
+            continue
+
+        stop = _RAW_STRING_STOP if kind == '"""' else _STRING_STOP
+        match = stop.search(source, position)
+        if match is None:
+            raise KotlinSyntaxError("Unterminated string literal", *line_column(source, literal_start))
+        start = match.start()
+        char = source[start]
+        pieces.append(_blank(source[position:start]))
+
+        if char == "\\":
+            pieces.append(_blank(source[start:start + 2]))
+            position = start + 2
+        elif char == "\n":
+            raise KotlinSyntaxError("Unterminated string literal", *line_column(source, literal_start))
+        elif char == "$":
+            if source.startswith("${", start):
+                braces.append((kind, literal_start))
+                kind = None
+                pieces.append(" {")
+                position = start + 2
+            else:
+                name = _TEMPLATE_NAME.match(source, start + 1)
+                pieces.append(" " + (name.group() if name else ""))
+                position = name.end() if name else start + 1
+        elif kind == '"':
+            pieces.append(" ")
+            strings.append((literal_start, start + 1))
+            kind = None
+            position = start + 1
+        else:
+            end = start
+            while end < length and source[end] == '"':
+                end += 1
+            pieces.append(" " * (end - start))
+            position = end
+            if end - start >= 3:
+                # Quotes before the closing three belong to the literal
+                strings.append((literal_start, end))
+                kind = None
+
+    return LexedSource(source, "".join(pieces), strings)
+
+
+def string_value(lexed, span):
+    """Return the raw text between the quotes of the literal at `span`"""
+    start, end = span
+    quotes = 3 if lexed.source.startswith('"""', start) else 1
+    return lexed.source[start + quotes:end - quotes]
+
+
+def brace_pairs(code):
+    """Map the position of every matched `{` in masked code to its `}`"""
+    pairs = {}
+    stack = []
+    for match in re.finditer(r"[{}]", code):
+        if match.group() == "{":
+            stack.append(match.start())
+        elif stack:
+            pairs[stack.pop()] = match.start()
+    return pairs
+
+
+def _balanced_end(code, start, open_char, close_char):
+    """Return the position after the bracket closing the one at `start`"""
+    depth = 0
+    for position in range(start, len(code)):
+        char = code[position]
+        if char == open_char:
+            depth += 1
+        elif char == close_char:
+            depth -= 1
+            if depth == 0:
+                return position + 1
+    return len(code)
+
+
+def split_top_level(text, separator=","):
+    """Split `text` on `separator` outside of (), <>, [] and {}"""
+    parts = []
+    depth = 0
+    current = 0
+    position = 0
+    while position < len(text):
+        char = text[position]
+        if text.startswith("->", position):
+            position += 2
+            continue
+        if char in "(<[{":
+            depth += 1
+        elif char in ")>]}":
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(text[current:position])
+            current = position + 1
+        position += 1
+    parts.append(text[current:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+_QUALIFIER = re.compile(r"\b(?:[a-z_]\w*\.)+(?=[A-Z`])")
+_ANNOTATION_USE = re.compile(r"@(?:\w+:)?[\w.]+(?:\s*\([^()]*\))?")
+
+
+def normalize_type(text):
+    """Drop package qualifiers and whitespace so equivalent types compare equal"""
+    return re.sub(r"\s+", "", _QUALIFIER.sub("", text))
+
+
+def _parse_parameter(text):
+    text = _ANNOTATION_USE.sub(" ", text).strip()
+    words = text.split()
+    while words and words[0] in MODIFIERS | {"val", "var"}:
+        words.pop(0)
+    text = " ".join(words)
+    name, _, rest = text.partition(":")
+    type_text = split_top_level(rest, "=")[0] if rest.strip() else ""
+    return [name.strip(), normalize_type(type_text)]
+
+
+_PACKAGE = re.compile(r"^[ \t]*package[ \t]+([\w.`]+)", re.M)
+_IMPORT = re.compile(r"^[ \t]*import[ \t]+([\w.`]+?)(\.\*)?(?:[ \t]+as[ \t]+(\w+))?[ \t]*;?[ \t]*$", re.M)
+_ANNOTATION = re.compile(r"(?<![\w@])@(?:(?:file|get|set|field|param|property|receiver|setparam|delegate):)?([A-Za-z_][\w.]*)")
+_CLASS = re.compile(r"(?<![\w:.])(class|interface|object)\b(?:[ \t]+(`\w+`|\w+))?")
+_FUNCTION = re.compile(
+    r"(?<![\w.])fun\b[ \t]*(?:<[^{}()=]*?>[ \t]*)?(?:([\w.<>?*, ]+?)[ \t]*\.[ \t]*)?(`\w+`|\w+)[ \t]*\("
+)
+_PROPERTY = re.compile(r"(?<![\w.])(val|var)\b[ \t]*(?:<[^{}()=]*?>[ \t]*)?(?:([\w.<>?*]+?)\.)?(`\w+`|\w+)")
+_HEADER_WORD = re.compile(r"[A-Za-z_]\w*")
+
+
+def _is_declaration_line(line):
+    """Return whether `line` only holds annotations and modifiers"""
+    words = _ANNOTATION_USE.sub(" ", line).split()
+    return all(word in MODIFIERS for word in words)
+
+
+def _declaration_prefix(code, start):
+    """Return the modifiers and annotations written before the keyword at `start`"""
+    line_start = code.rfind("\n", 0, start) + 1
+    prefix_start = line_start
+    # Pull in preceding lines made only of annotations and modifiers
+    while prefix_start > 0:
+        previous_start = code.rfind("\n", 0, prefix_start - 1) + 1
+        previous = code[previous_start:prefix_start - 1]
+        if not previous.strip() or not _is_declaration_line(previous):
+            break
+        prefix_start = previous_start
+    prefix = code[prefix_start:start]
+    # Only keep what follows the last statement boundary on the keyword's own line
+    boundary = max(prefix.rfind(char) for char in "{};=(,")
+    if boundary >= 0:
+        prefix = prefix[boundary + 1:]
+    annotations = _ANNOTATION.findall(prefix)
+    words = _HEADER_WORD.findall(_ANNOTATION_USE.sub(" ", prefix))
+    return sorted(set(words) & MODIFIERS), annotations
+
+
+def _skip_spaces(code, position):
+    while position < len(code) and code[position] in " \t\r\n":
+        position += 1
+    return position
+
+
+def _type_end(code, position):
+    """Return where a type that starts at `position` ends"""
+    depth = 0
+    while position < len(code):
+        if code.startswith("->", position):
+            position += 2
+            continue
+        char = code[position]
+        if char in "(<[":
+            depth += 1
+        elif char in ")>]":
+            if depth == 0:
+                break
+            depth -= 1
+        elif depth == 0 and (char in "{=;,\n" or code.startswith("where ", position) or code.startswith("by ", position)):
+            break
+        position += 1
+    return position
+
+
+class _Scopes:
+    """Answers which `{` most closely encloses a position"""
+
+    def __init__(self, pairs):
+        self.opens = sorted(pairs)
+        self.pairs = pairs
+
+    def enclosing(self, position):
+        index = bisect.bisect_left(self.opens, position) - 1
+        while index >= 0:
+            open_position = self.opens[index]
+            if self.pairs[open_position] > position:
+                return open_position
+            index -= 1
+        return None
+
+
+def index_source(source):
+    """Build the declaration index of a Kotlin file"""
+    lexed = lex(source)
+    code = lexed.code
+    pairs = brace_pairs(code)
+    scopes = _Scopes(pairs)
+
+    newlines = [match.start() for match in re.finditer("\n", code)]
+
+    def line_of(position):
+        return bisect.bisect_left(newlines, position) + 1
+
+    package = _PACKAGE.search(code)
+    imports = [
+        {
+            "path": match.group(1).replace("`", ""),
+            "star": bool(match.group(2)),
+            "alias": match.group(3),
+            "line": line_of(match.start()),
+        }
+        for match in _IMPORT.finditer(code)
+    ]
+    annotations = [
+        {"name": match.group(1), "line": line_of(match.start())}
+        for match in _ANNOTATION.finditer(code)
+    ]
+
+    # Classes first: their bodies decide who owns every other declaration
+    classes = []
+    bodies = {}
+    headers = []
+    for match in _CLASS.finditer(code):
+        keyword, name = match.group(1), match.group(2)
+        modifiers, class_annotations = _declaration_prefix(code, match.start())
+        if keyword == "object" and name is None:
+            if "companion" not in modifiers:
+                # Anonymous object expression
+                continue
+            name = "Companion"
+        if name is None:
+            continue
+        position = _skip_spaces(code, match.end())
+        if code.startswith("<", position):
+            position = _skip_spaces(code, _balanced_end(code, position, "<", ">"))
+        header_start = position
+        constructor = re.match(r"(?:(?:@[\w.]+|[a-z]+)\s+)*constructor\s*", code[position:])
+        if constructor:
+            position += constructor.end()
+        if code.startswith("(", position):
+            position = _skip_spaces(code, _balanced_end(code, position, "(", ")"))
+        header_end = position
+        supertypes = []
+        if code.startswith(":", position):
+            end = _type_list_end(code, position + 1)
+            supertypes = [
+                normalize_type(re.sub(r"\(.*$", "", re.sub(r"<.*$", "", entry, flags=re.S), flags=re.S))
+                for entry in split_top_level(code[position + 1:end])
+            ]
+            position = end
+        position = _skip_spaces(code, position)
+        body = position if code.startswith("{", position) and position in pairs else None
+        entry = {
+            "name": name,
+            "kind": keyword,
+            "owner": None,
+            "modifiers": modifiers,
+            "annotations": class_annotations,
+            "supertypes": supertypes,
+            "line": line_of(match.start()),
+            "_start": match.start(),
+            "_body": body,
+        }
+        classes.append(entry)
+        if body is not None:
+            bodies[body] = entry
+        headers.append((header_start, header_end, entry))
+
+    def owner_of(position):
+        """Return (is_member_or_top_level, owning class entry or None)"""
+        enclosing = scopes.enclosing(position)
+        if enclosing is None:
+            return True, None
+        if enclosing in bodies:
+            return True, bodies[enclosing]
+        return False, None
+
+    def qualified(entry):
+        names = []
+        while entry is not None:
+            names.append(entry["name"])
+            entry = entry["_owner"]
+        return ".".join(reversed(names))
+
+    for entry in classes:
+        member, owner = owner_of(entry["_start"])
+        entry["_owner"] = owner if member else None
+        entry["_local"] = not member
+    for entry in classes:
+        entry["owner"] = qualified(entry["_owner"]) if entry["_owner"] else None
+
+    functions = []
+    function_bodies = set()
+    for match in _FUNCTION.finditer(code):
+        member, owner = owner_of(match.start())
+        if not member:
+            continue
+        modifiers, function_annotations = _declaration_prefix(code, match.start())
+        params_start = match.end() - 1
+        params_end = _balanced_end(code, params_start, "(", ")")
+        params = [_parse_parameter(param) for param in split_top_level(code[params_start + 1:params_end - 1])]
+        position = _skip_spaces(code, params_end)
+        returns = None
+        if code.startswith(":", position):
+            type_start = _skip_spaces(code, position + 1)
+            type_end = _type_end(code, type_start)
+            returns = normalize_type(code[type_start:type_end])
+            position = _skip_spaces(code, type_end)
+        if code.startswith("where ", position):
+            position = _skip_spaces(code, _type_list_end(code, position + len("where ")))
+        has_body = code.startswith("{", position) or code.startswith("=", position)
+        if code.startswith("{", position):
+            function_bodies.add(position)
+        functions.append({
+            "name": match.group(2),
+            "owner": qualified(owner) if owner else None,
+            "receiver": normalize_type(match.group(1)) if match.group(1) else None,
+            "modifiers": modifiers,
+            "annotations": function_annotations,
+            "params": params,
+            "returns": returns,
+            "abstract": "abstract" in modifiers or (
+                not has_body and owner is not None and owner["kind"] == "interface"
+            ),
+            "line": line_of(match.start()),
+        })
+
+    properties = []
+    for match in _PROPERTY.finditer(code):
+        if code.startswith("(", _skip_spaces(code, match.start() + 3)):
+            # Destructuring declaration
+            continue
+        member, owner = owner_of(match.start())
+        if not member:
+            continue
+        if owner is None:
+            # A `val` in a primary constructor belongs to that class
+            for header_start, header_end, entry in headers:
+                if header_start <= match.start() < header_end:
+                    owner = entry
+                    break
+        modifiers, property_annotations = _declaration_prefix(code, match.start())
+        properties.append({
+            "name": match.group(3),
+            "owner": qualified(owner) if owner else None,
+            "mutable": match.group(1) == "var",
+            "modifiers": modifiers,
+            "annotations": property_annotations,
+            "line": line_of(match.start()),
+        })
+
+    for entry in classes:
+        for key in ("_start", "_body", "_owner", "_local"):
+            entry.pop(key)
+
+    return {
+        "package": package.group(1).replace("`", "") if package else "",
+        "imports": imports,
+        "annotations": annotations,
+        "classes": classes,
+        "functions": functions,
+        "properties": properties,
+    }
+
+
+def _type_list_end(code, position):
+    """Return where a comma-separated list of types (supertypes, `where` bounds) ends"""
+    while True:
+        end = _type_end(code, _skip_spaces(code, position))
+        if code.startswith(",", end):
+            position = end + 1
+            continue
+        if code.startswith("by ", end):
+            # Delegation: `Interface by delegate`
+            position = _type_end(code, end + 3)
+            if code.startswith(",", position):
+                position += 1
+                continue
+            return position
+        return end
+
+
+def signature(function):
+    """Return a hashable (name, receiver, parameter types) key for override matching"""
+    return (function["name"], function["receiver"], tuple(type_ for _, type_ in function["params"]))
+
+
+def describe(function):
+    params = ", ".join(f"{name}: {type_}" for name, type_ in function["params"])
+    return f"fun {function['name']}({params})"
+
+
+class KotlinIndex:
+    """Per-file declaration indexes, cached by content hash"""
+
+    def __init__(self, sources, cache_dir=INDEX_CACHE_DIR, root=PROJECT_ROOT):
+        self.sources = sources
+        self.cache_dir = cache_dir
+        self.root = root
+        self._indexes = {}
+        self._source_roots = None
+
+    def file(self, path):
+        """Return the index of `path`, parsing it only if this content was never indexed"""
+        source = self.sources.get(path)
+        index = self._indexes.get(source.sha256)
+        if index is None:
+            index = self._load(source.sha256)
+            if index is None:
+                index = index_source(source.text)
+                self._store(source.sha256, index)
+            self._indexes[source.sha256] = index
+        return index
+
+    def _cache_path(self, sha256):
+        return os.path.join(self.cache_dir, f"{sha256}.json")
+
+    def _load(self, sha256):
+        try:
+            with open(self._cache_path(sha256), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, sha256, index):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(index, f)
+            os.replace(temp_path, self._cache_path(sha256))
+        except OSError:
+            # The cache is an optimization; indexing still worked
+            pass
+
+    def source_roots(self):
+        if self._source_roots is None:
+            self._source_roots = sorted(glob.glob(os.path.join(self.root, "*", "src", "*", "kotlin")))
+        return self._source_roots
+
+    def resolve(self, qualified_name):
+        """Return the path of the file declaring top-level `qualified_name`, by file naming convention"""
+        relative = qualified_name.replace(".", os.sep) + ".kt"
+        for source_root in self.source_roots():
+            path = os.path.join(source_root, relative)
+            if self.sources.exists(path):
+                return path
+        return None
+
+    def find_class(self, path, name):
+        for entry in self.file(path)["classes"]:
+            if entry["name"] == name and entry["owner"] is None:
+                return entry
+        return None
+
+    def members(self, path, owner):
+        """Return the functions and properties declared directly in class `owner` of `path`"""
+        index = self.file(path)
+        return (
+            [function for function in index["functions"] if function["owner"] == owner],
+            [prop for prop in index["properties"] if prop["owner"] == owner],
+        )
+
+    def resolve_type(self, path, simple_name):
+        """Return the path declaring `simple_name` as seen from `path` (imports, then same package)"""
+        index = self.file(path)
+        for entry in index["imports"]:
+            if not entry["star"] and (entry["alias"] or entry["path"].rsplit(".", 1)[-1]) == simple_name:
+                return self.resolve(entry["path"])
+        if index["package"]:
+            return self.resolve(f"{index['package']}.{simple_name}")
+        return None
+
+    def override_mismatches(self, path, class_name, interface_name):
+        """Compare the overrides of `class_name` with the members of `interface_name`
+
+        Returns (missing, unknown): abstract interface functions the class does
+        not override, and `override fun`s that match nothing in the interface.
+        Returns None when the interface source cannot be found.
+        """
+        interface_path = self.resolve_type(path, interface_name)
+        if interface_path is None or self.find_class(interface_path, interface_name) is None:
+            return None
+        interface = self.find_class(interface_path, interface_name)
+        interface_functions, _ = self.members(interface_path, interface_name)
+        class_functions, _ = self.members(path, class_name)
+
+        overrides = {signature(f) for f in class_functions if "override" in f["modifiers"]}
+        declared = {signature(f) for f in interface_functions}
+        missing = [f for f in interface_functions if f["abstract"] and signature(f) not in overrides]
+        unknown = []
+        if not interface["supertypes"]:
+            # With supertypes of its own, overrides may target members we have not indexed
+            unknown = [
+                f for f in class_functions
+                if "override" in f["modifiers"] and signature(f) not in declared
+            ]
+        return missing, unknown
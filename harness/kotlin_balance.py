@@ -0,0 +1,117 @@
+"""
+Lexer-aware bracket balance checker for Kotlin sources.
+
+Brackets inside comments, string literals and character literals are ignored,
+while the ones in `${...}` string templates count, so large raw strings such as
+the HTML/CSS in DemoWebViewContent.kt cannot skew the result. Each imbalance
+is reported with its exact line and column.
+
+Usage:
+    python3 -m harness.kotlin_balance [ROOT ...] [--jobs N]
+"""
+
+import os
+import re
+import sys
+import hashlib
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from harness.kotlin import KotlinSyntaxError, lex, line_column
+from harness.snapshot import KOTLIN_TREE_ROOTS, list_sources
+
+Imbalance = namedtuple("Imbalance", ["path", "line", "column", "message"])
+ScannedFile = namedtuple("ScannedFile", ["path", "mtime_ns", "size", "sha256", "imbalances"])
+
+_BRACKET = re.compile(r"[(){}\[\]]")
+_CLOSERS = {")": "(", "}": "{", "]": "["}
+_OPENERS = {opener: closer for closer, opener in _CLOSERS.items()}
+
+
+def check_balance(source, path="<source>"):
+    """Return the Imbalances of `source`, or [] when every bracket is matched"""
+    try:
+        code = lex(source).code
+    except KotlinSyntaxError as e:
+        return [Imbalance(path, e.line, e.column, e.message)]
+
+    stack = []
+    for match in _BRACKET.finditer(code):
+        char = match.group()
+        if char in _OPENERS:
+            stack.append(match.start())
+            continue
+        if not stack:
+            return [Imbalance(path, *line_column(code, match.start()), f"Unexpected '{char}'")]
+        opener = code[stack[-1]]
+        if opener != _CLOSERS[char]:
+            line, column = line_column(code, stack[-1])
+            return [Imbalance(
+                path, *line_column(code, match.start()),
+                f"'{char}' closes '{opener}' opened at {line}:{column}",
+            )]
+        stack.pop()
+    return [
+        Imbalance(path, *line_column(code, position), f"Unclosed '{code[position]}'")
+        for position in stack
+    ]
+
+
+def scan_file(path):
+    """Read and check one file; the stat and hash let callers record the read"""
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        data = f.read()
+    imbalances = check_balance(data.decode("utf-8", errors="replace"), path)
+    return ScannedFile(path, stat.st_mtime_ns, stat.st_size, hashlib.sha256(data).hexdigest(), imbalances)
+
+
+def scan_files(paths, jobs=None, previous=None):
+    """Check `paths` across a process pool and return their ScannedFiles in order
+
+    Files whose stat matches their ScannedFile in `previous` (path -> result of
+    an earlier scan) are not read again.
+    """
+    results = {}
+    stale = []
+    for path in paths:
+        known = previous.get(path) if previous else None
+        if known is not None:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+            if stat is not None and (stat.st_mtime_ns, stat.st_size) == (known.mtime_ns, known.size):
+                results[path] = known
+                continue
+        stale.append(path)
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(stale) < 2:
+        scanned = [scan_file(path) for path in stale]
+    else:
+        chunksize = max(1, len(stale) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            scanned = list(pool.map(scan_file, stale, chunksize=chunksize))
+    results.update((result.path, result) for result in scanned)
+    return [results[path] for path in paths]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check bracket balance of Kotlin sources")
+    parser.add_argument("roots", nargs="*", default=KOTLIN_TREE_ROOTS, help="directories to scan")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    paths = list_sources(args.roots)
+    scanned = scan_files(paths, args.jobs)
+    imbalances = [imbalance for result in scanned for imbalance in result.imbalances]
+    for imbalance in imbalances:
+        print(f"{imbalance.path}:{imbalance.line}:{imbalance.column}: {imbalance.message}")
+    print(f"Scanned {len(paths)} files, {len(imbalances)} imbalance(s)")
+    return 1 if imbalances else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
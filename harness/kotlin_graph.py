@@ -0,0 +1,450 @@
+"""
+Project-wide import and reference graph of the Kotlin sources.
+
+Each file is reduced to a small record (package, imports, top-level
+declarations and the identifiers its code uses). The records are persisted
+together with the stat and hash of the file they came from, so a refresh only
+re-indexes files whose content changed. File-to-file edges are then resolved
+from explicit imports, star imports, same-package references and fully
+qualified names.
+
+Usage:
+    python3 -m harness.kotlin_graph reach io.homeassistant.companion.android.demo
+    python3 -m harness.kotlin_graph unused [PATH ...]
+    python3 -m harness.kotlin_graph cycles
+    python3 -m harness.kotlin_graph deps PATH
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import tempfile
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from harness.kotlin import KotlinSyntaxError, index_source, lex
+from harness.snapshot import KOTLIN_TREE_ROOTS, PROJECT_ROOT, list_sources
+
+# Bump when the shape of a record changes, to invalidate the on-disk graph
+GRAPH_VERSION = 1
+GRAPH_CACHE_PATH = os.path.join(PROJECT_ROOT, ".harness-cache", f"kotlin-graph-v{GRAPH_VERSION}.json")
+
+# Below this many stale files, indexing in-process beats starting a pool
+_POOL_THRESHOLD = 32
+
+_TEST_SOURCE_SETS = frozenset({"test", "androidTest", "testFixtures"})
+
+# Imports used implicitly through operator and delegate conventions
+CONVENTION_NAMES = frozenset({
+    "getValue", "setValue", "provideDelegate", "invoke", "get", "set", "contains", "iterator",
+    "next", "hasNext", "compareTo", "rangeTo", "rangeUntil", "plus", "minus", "times", "div",
+    "rem", "unaryPlus", "unaryMinus", "not", "inc", "dec", "plusAssign", "minusAssign",
+    "timesAssign", "divAssign", "remAssign",
+})
+
+_HEADER_LINE = re.compile(r"^[ \t]*(?:package|import)[ \t][^\n]*", re.M)
+_IDENTIFIER = re.compile(r"(?<![\w.])[A-Za-z_]\w*|(?<=\.)[A-Za-z_]\w*")
+_QUALIFIED_NAME = re.compile(r"(?<![\w.])(?:[a-z_]\w*\.){2,}[A-Za-z_]\w*")
+_TYPEALIAS = re.compile(r"(?<![\w.])typealias[ \t]+(\w+)")
+_KDOC_LINK = re.compile(r"\[([A-Za-z_][\w.]*)\]")
+
+
+def _source_set(path):
+    """Return the (module, source set) of a file, e.g. ("app", "main")"""
+    parts = os.path.relpath(path, PROJECT_ROOT).split(os.sep)
+    source_set = parts[2] if len(parts) > 3 and parts[1] == "src" else ""
+    return parts[0], source_set
+
+
+def _exported(record):
+    """What other files can resolve to in a record"""
+    return record["package"], record["declarations"]
+
+
+def file_record(source):
+    """Reduce a Kotlin source to what the graph needs"""
+    try:
+        index = index_source(source)
+        code = lex(source).code
+    except KotlinSyntaxError:
+        return {"package": "", "imports": [], "declarations": [], "identifiers": [], "qualified": [], "kdoc": []}
+
+    body = _HEADER_LINE.sub("", code)
+    declarations = {entry["name"] for entry in index["classes"] if entry["owner"] is None}
+    declarations.update(entry["name"] for entry in index["functions"] if entry["owner"] is None)
+    declarations.update(entry["name"] for entry in index["properties"] if entry["owner"] is None)
+    declarations.update(_TYPEALIAS.findall(code))
+
+    # Comments are blanked in `code`; KDoc links only survive in the source
+    kdoc = set()
+    for match in _KDOC_LINK.finditer(source):
+        if not code[match.start():match.end()].strip():
+            kdoc.add(match.group(1).split(".", 1)[0])
+
+    return {
+        "package": index["package"],
+        "imports": [
+            {"path": entry["path"], "star": entry["star"], "alias": entry["alias"], "line": entry["line"]}
+            for entry in index["imports"]
+        ],
+        "declarations": sorted(declarations),
+        "identifiers": sorted(set(_IDENTIFIER.findall(body))),
+        "qualified": sorted(set(_QUALIFIED_NAME.findall(body))),
+        "kdoc": sorted(kdoc),
+    }
+
+
+def index_file(path):
+    """Read and index one file; the stat and hash let callers record the read"""
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        data = f.read()
+    record = file_record(data.decode("utf-8", errors="replace"))
+    return path, stat.st_mtime_ns, stat.st_size, hashlib.sha256(data).hexdigest(), record
+
+
+def index_files(paths, jobs=None):
+    """Index `paths`, across a process pool when there are enough of them"""
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(paths) < _POOL_THRESHOLD:
+        return [index_file(path) for path in paths]
+    chunksize = max(1, len(paths) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(index_file, paths, chunksize=chunksize))
+
+
+def strongly_connected(nodes, edges):
+    """Return the strongly connected components of a graph (iterative Tarjan)"""
+    order = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for start in nodes:
+        if start in order:
+            continue
+        work = [(start, iter(edges.get(start, ())))]
+        order[start] = low[start] = len(order)
+        stack.append(start)
+        on_stack.add(start)
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in order:
+                    order[successor] = low[successor] = len(order)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(edges.get(successor, ()))))
+                    break
+                if successor in on_stack:
+                    low[node] = min(low[node], order[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == order[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+
+class KotlinGraph:
+    """Import/reference graph over every Kotlin file under `roots`, persisted between runs"""
+
+    def __init__(self, sources=None, roots=KOTLIN_TREE_ROOTS, cache_path=GRAPH_CACHE_PATH, jobs=None):
+        self.sources = sources
+        self.roots = list(roots)
+        self.cache_path = cache_path
+        self.jobs = jobs
+        self.files = {}
+        self.edges = {}
+        self.reindexed = []
+        self._refreshed = False
+        self._packages = None
+        self._reverse = None
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "r") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return {}, {}
+        if cached.get("roots") != self.roots:
+            return {}, {}
+        return cached.get("files", {}), cached.get("edges", {})
+
+    def _store(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.cache_path), suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                # json.dumps takes the C encoder; json.dump to a file does not
+                f.write(json.dumps({"roots": self.roots, "files": self.files, "edges": self.edges}))
+            os.replace(temp_path, self.cache_path)
+        except OSError:
+            # The cache is an optimization; the graph is still complete
+            pass
+
+    def refresh(self):
+        """Bring the graph up to date, re-indexing only the files whose content changed
+
+        The first call starts from the persisted graph; later ones from the
+        graph in memory, so a long-lived graph only pays for the stats.
+        """
+        cached, edges = (self.files, self.edges) if self._refreshed else self._load()
+        self.reindexed = []
+        paths = self.sources.walk(self.roots) if self.sources is not None else list_sources(self.roots)
+
+        files = {}
+        stale = []
+        for path in paths:
+            entry = cached.get(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                files[path] = entry
+            else:
+                stale.append(path)
+
+        for path, mtime_ns, size, sha256, record in index_files(stale, self.jobs):
+            entry = cached.get(path)
+            if entry is not None and entry["sha256"] == sha256:
+                # Touched but identical: keep the record, refresh the stat
+                record = entry["record"]
+            else:
+                self.reindexed.append(path)
+            files[path] = {"mtime_ns": mtime_ns, "size": size, "sha256": sha256, "record": record}
+        changed = bool(self.reindexed) or files.keys() != cached.keys()
+
+        if self.sources is not None:
+            for path, entry in files.items():
+                self.sources.note_read(path, entry["mtime_ns"], entry["size"], entry["sha256"])
+
+        self.files = files
+        if not edges or files.keys() != cached.keys() or any(
+            _exported(cached[path]["record"]) != _exported(files[path]["record"]) for path in self.reindexed
+        ):
+            self.edges = self._resolve_edges()
+        elif self.reindexed:
+            # Only bodies changed, so every other file still resolves to the same targets
+            self.edges = {**edges, **self._resolve_edges(self.reindexed)}
+        else:
+            self.edges = edges
+        if changed:
+            self._packages = self._reverse = None
+        if stale or changed or not os.path.exists(self.cache_path):
+            self._store()
+        self._refreshed = True
+        return self
+
+    def _ensure(self):
+        if not self._refreshed:
+            self.refresh()
+
+    def _resolve_edges(self, paths=None):
+        """Return the edges of `paths` (default: every file)"""
+        symbols = defaultdict(list)
+        for path, entry in self.files.items():
+            package = entry["record"]["package"]
+            for name in entry["record"]["declarations"]:
+                symbols[f"{package}.{name}" if package else name].append(path)
+
+        def resolve(qualified_name):
+            # Nested classes and enum entries resolve to the file of their top-level owner
+            while qualified_name:
+                if qualified_name in symbols:
+                    return symbols[qualified_name]
+                qualified_name = qualified_name.rpartition(".")[0]
+            return ()
+
+        def nearest(path, candidates):
+            # Modules such as app and wear declare the same names; prefer the
+            # copy in the same module and source set, and never a test source
+            # set of another module
+            if len(candidates) < 2:
+                return candidates
+            module, source_set = _source_set(path)
+            for accept in (
+                lambda other: other == (module, source_set),
+                lambda other: other[0] == module,
+                lambda other: other[1] not in _TEST_SOURCE_SETS,
+            ):
+                preferred = [candidate for candidate in candidates if accept(_source_set(candidate))]
+                if preferred:
+                    return preferred
+            return candidates
+
+        edges = {}
+        for path in self.files if paths is None else paths:
+            record = self.files[path]["record"]
+            targets = set()
+            scopes = [record["package"]] if record["package"] else []
+            for entry_import in record["imports"]:
+                if entry_import["star"]:
+                    scopes.append(entry_import["path"])
+                    if entry_import["path"] in symbols:
+                        targets.update(nearest(path, symbols[entry_import["path"]]))
+                else:
+                    targets.update(nearest(path, resolve(entry_import["path"])))
+            for scope in scopes:
+                for name in record["identifiers"]:
+                    targets.update(nearest(path, symbols.get(f"{scope}.{name}", ())))
+            for name in record["qualified"]:
+                targets.update(nearest(path, resolve(name)))
+            targets.discard(path)
+            edges[path] = sorted(targets)
+        return edges
+
+    def package_of(self, path):
+        return self.files[path]["record"]["package"]
+
+    def dependencies(self, path):
+        """Return the project files `path` references directly"""
+        self._ensure()
+        return self.edges.get(path, [])
+
+    def dependents(self):
+        """Return the reverse graph: path -> files that reference it directly"""
+        self._ensure()
+        if self._reverse is None:
+            self._reverse = defaultdict(list)
+            for path, targets in self.edges.items():
+                for target in targets:
+                    self._reverse[target].append(path)
+        return self._reverse
+
+    def packages(self):
+        """Return package -> files declaring it"""
+        self._ensure()
+        if self._packages is None:
+            self._packages = defaultdict(list)
+            for path in self.files:
+                self._packages[self.package_of(path)].append(path)
+        return self._packages
+
+    def files_in(self, package):
+        """Return the files of `package` and its subpackages"""
+        prefix = package + "."
+        return sorted(
+            path for name, paths in self.packages().items()
+            if name == package or name.startswith(prefix)
+            for path in paths
+        )
+
+    def reaching(self, package):
+        """Return the files outside `package` that depend on it, directly or transitively"""
+        inside = set(self.files_in(package))
+        reverse = self.dependents()
+        seen = set(inside)
+        pending = deque(inside)
+        while pending:
+            for dependent in reverse.get(pending.popleft(), ()):
+                if dependent not in seen:
+                    seen.add(dependent)
+                    pending.append(dependent)
+        return sorted(seen - inside)
+
+    def unused_imports(self, paths=None):
+        """Return {path: [import entries]} for explicit imports whose name the file never uses"""
+        self._ensure()
+        unused = {}
+        for path in sorted(paths if paths is not None else self.files):
+            record = self.files[path]["record"]
+            used = set(record["identifiers"]) | set(record["kdoc"])
+            found = [
+                entry for entry in record["imports"]
+                if not entry["star"]
+                and (entry["alias"] or entry["path"].rsplit(".", 1)[-1]) not in used
+                and entry["path"].rsplit(".", 1)[-1] not in CONVENTION_NAMES
+            ]
+            if found:
+                unused[path] = found
+        return unused
+
+    def package_edges(self):
+        """Return {(package, package): example (path, target)} for references across packages"""
+        self._ensure()
+        found = {}
+        for path, targets in self.edges.items():
+            source_package = self.package_of(path)
+            for target in targets:
+                target_package = self.package_of(target)
+                if target_package != source_package:
+                    found.setdefault((source_package, target_package), (path, target))
+        return found
+
+    def package_cycles(self):
+        """Return the groups of packages that depend on each other, largest first"""
+        successors = defaultdict(set)
+        for source_package, target_package in self.package_edges():
+            successors[source_package].add(target_package)
+        components = strongly_connected(sorted(self.packages()), {k: sorted(v) for k, v in successors.items()})
+        return sorted((sorted(c) for c in components if len(c) > 1), key=lambda c: (-len(c), c))
+
+
+def _relative(path):
+    return os.path.relpath(path, PROJECT_ROOT)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the Kotlin import/reference graph")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes for re-indexing (default: all cores)")
+    parser.add_argument("--rebuild", action="store_true", help="discard the persisted graph first")
+    commands = parser.add_subparsers(dest="command", required=True)
+    reach = commands.add_parser("reach", help="files that depend on a package, directly or transitively")
+    reach.add_argument("package")
+    unused = commands.add_parser("unused", help="imports a file never uses")
+    unused.add_argument("paths", nargs="*")
+    commands.add_parser("cycles", help="packages that depend on each other")
+    deps = commands.add_parser("deps", help="project files a file references directly")
+    deps.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.rebuild and os.path.exists(GRAPH_CACHE_PATH):
+        os.remove(GRAPH_CACHE_PATH)
+    graph = KotlinGraph(jobs=args.jobs).refresh()
+
+    if args.command == "reach":
+        found = graph.reaching(args.package)
+        for path in found:
+            print(_relative(path))
+        print(f"{len(found)} file(s) outside {args.package} depend on it")
+    elif args.command == "unused":
+        paths = [os.path.abspath(path) for path in args.paths] or None
+        found = graph.unused_imports(paths)
+        for path, entries in found.items():
+            for entry in entries:
+                print(f"{_relative(path)}:{entry['line']}: unused import {entry['path']}")
+        print(f"{sum(len(entries) for entries in found.values())} unused import(s)")
+    elif args.command == "cycles":
+        cycles = graph.package_cycles()
+        package_edges = graph.package_edges()
+        for cycle in cycles:
+            print(f"Cycle between {len(cycle)} packages:")
+            members = set(cycle)
+            for (source_package, target_package), (path, target) in sorted(package_edges.items()):
+                if source_package in members and target_package in members:
+                    print(f"  {source_package} -> {target_package} ({_relative(path)} -> {_relative(target)})")
+        print(f"{len(cycles)} package cycle(s)")
+    elif args.command == "deps":
+        for path in graph.dependencies(os.path.abspath(args.path)):
+            print(_relative(path))
+    if graph.reindexed:
+        print(f"Re-indexed {len(graph.reindexed)} file(s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
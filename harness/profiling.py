@@ -0,0 +1,144 @@
+"""
+cProfile support for the demo mode suites (`run_all_tests.py --profile`).
+
+Each test runs under its own profiler, so every sample belongs to exactly one
+test. A suite dumps one pstats file per test plus an index into
+`<profile dir>/<script>/`; `merge_profiles` then combines every suite into a
+single pstats file, collapsed stacks rooted at `suite;test` for flamegraph
+tools (flamegraph.pl, speedscope, inferno), and a per-test breakdown.
+
+cProfile only records caller/callee pairs, not full stacks, so the collapsed
+stacks are rebuilt from the call graph by splitting each function's time
+between its callers in proportion to the time spent through each of them.
+Work done in pool worker processes is not profiled.
+"""
+
+import os
+import re
+import json
+import shutil
+import pstats
+import cProfile
+
+INDEX_NAME = "tests.json"
+MERGED_NAME = "merged.prof"
+COLLAPSED_NAME = "collapsed.txt"
+
+# Stack expansion stops at this depth and below this many microseconds
+_MAX_DEPTH = 96
+_MIN_MICROSECONDS = 1
+
+
+def _slug(name):
+    return re.sub(r"[^A-Za-z0-9]+", "-", name).strip("-").lower()
+
+
+class SuiteProfiler:
+    """Profiles the tests of one suite, one pstats file per test"""
+
+    def __init__(self, profile_dir, script_name):
+        self.directory = os.path.join(profile_dir, os.path.splitext(os.path.basename(script_name))[0])
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory)
+        self.tests = []
+
+    def run(self, name, test_func):
+        """Call `test_func` under a fresh profiler and dump its stats"""
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return test_func()
+        finally:
+            profile.disable()
+            file_name = f"{len(self.tests):02d}-{_slug(name)}.prof"
+            profile.dump_stats(os.path.join(self.directory, file_name))
+            self.tests.append({"name": name, "file": file_name})
+
+    def finish(self):
+        with open(os.path.join(self.directory, INDEX_NAME), "w") as f:
+            json.dump(self.tests, f, indent=2)
+
+
+def function_label(function):
+    """Return a flamegraph-safe label for a pstats function key"""
+    filename, line, name = function
+    if filename == "~":
+        return name.replace(";", ",")
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ",")
+
+
+def collapsed_stacks(stats, prefix=()):
+    """Return {stack: microseconds} rebuilt from the caller graph of `stats`"""
+    raw = stats.stats
+    callees = {}
+    for function, (_, _, _, _, callers) in raw.items():
+        for caller, (_, _, _, edge_cumulative) in callers.items():
+            callees.setdefault(caller, []).append((function, edge_cumulative))
+
+    stacks = {}
+
+    def expand(function, stack, time_share):
+        _, _, total, cumulative, _ = raw[function]
+        path = stack + (function_label(function),)
+        own = int(total * time_share * 1e6)
+        if own >= _MIN_MICROSECONDS:
+            key = ";".join(path)
+            stacks[key] = stacks.get(key, 0) + own
+        if len(path) >= _MAX_DEPTH or cumulative <= 0:
+            return
+        on_stack = set(path)
+        for callee, edge_cumulative in callees.get(function, ()):
+            callee_cumulative = raw[callee][3]
+            share = edge_cumulative * time_share / callee_cumulative if callee_cumulative > 0 else 0
+            if function_label(callee) in on_stack:
+                # Recursion is already accounted for in the frame above
+                continue
+            if callee_cumulative * share * 1e6 >= _MIN_MICROSECONDS:
+                expand(callee, path, share)
+
+    roots = [function for function, entry in raw.items() if not entry[4]]
+    for root in sorted(roots):
+        expand(root, tuple(prefix), 1.0)
+    return stacks
+
+
+def test_breakdown(stats, top=3):
+    """Return (profiled seconds, [(label, self seconds)] of the hottest functions)"""
+    entries = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)
+    return stats.total_tt, [(function_label(function), entry[2]) for function, entry in entries[:top]]
+
+
+def merge_profiles(profile_dir, scripts):
+    """Merge the per-test profiles of `scripts` and write the merged and collapsed outputs
+
+    Returns [(script, test name, profiled seconds, hottest functions)] sorted
+    by profiled time, or [] when no suite was profiled.
+    """
+    merged = None
+    stacks = {}
+    breakdown = []
+    for script in scripts:
+        stem = os.path.splitext(os.path.basename(script))[0]
+        directory = os.path.join(profile_dir, stem)
+        try:
+            with open(os.path.join(directory, INDEX_NAME), "r") as f:
+                tests = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for test in tests:
+            stats = pstats.Stats(os.path.join(directory, test["file"]))
+            for stack, microseconds in collapsed_stacks(stats, (stem, test["name"])).items():
+                stacks[stack] = stacks.get(stack, 0) + microseconds
+            breakdown.append((stem, test["name"], *test_breakdown(stats)))
+            if merged is None:
+                merged = stats
+            else:
+                merged.add(stats)
+
+    if merged is None:
+        return []
+    merged.dump_stats(os.path.join(profile_dir, MERGED_NAME))
+    with open(os.path.join(profile_dir, COLLAPSED_NAME), "w") as f:
+        for stack, microseconds in sorted(stacks.items()):
+            f.write(f"{stack} {microseconds}\n")
+    return sorted(breakdown, key=lambda entry: entry[2], reverse=True)
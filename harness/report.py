@@ -0,0 +1,127 @@
+"""
+Per-test measurements and machine-readable reports for the demo mode suites.
+
+Every test gets its wall time, CPU time (including pool workers it started),
+tracemalloc peak (None with --no-trace-memory) and the bytes of source it
+read. A suite writes them as `<script>.json` and JUnit XML `<script>.xml` in
+the report directory, and `run_all_tests.py` merges the JSON reports into a
+summary sorted by the slowest test.
+"""
+
+import os
+import json
+import socket
+import tempfile
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+from harness.snapshot import PROJECT_ROOT
+
+REPORT_DIR = os.path.join(PROJECT_ROOT, "test-reports")
+SUMMARY_NAME = "summary.json"
+
+TestRecord = namedtuple(
+    "TestRecord",
+    ["suite", "name", "status", "wall_time", "cpu_time", "peak_memory", "bytes_read", "message"],
+)
+
+
+def report_paths(report_dir, script_name):
+    """Return the (JSON, JUnit XML) report paths of a suite script"""
+    stem = os.path.splitext(os.path.basename(script_name))[0]
+    return os.path.join(report_dir, f"{stem}.json"), os.path.join(report_dir, f"{stem}.xml")
+
+
+def bytes_read(inputs):
+    """Return the total size of the distinct files in recorded `inputs`"""
+    return sum(size for _, size, _ in inputs.get("reads", {}).values())
+
+
+def format_bytes(count):
+    if count is None:
+        return "-"
+    for unit in ("B", "KiB", "MiB"):
+        if count < 1024 or unit == "MiB":
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+
+
+def _write_atomic(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        write(f)
+    os.replace(temp_path, path)
+
+
+def write_suite_reports(report_dir, script_name, suite, started, records):
+    """Write the JSON and JUnit XML reports of one suite run"""
+    json_path, xml_path = report_paths(report_dir, script_name)
+    report = {
+        "suite": suite,
+        "script": os.path.basename(script_name),
+        "started": started,
+        "wall_time": sum(record.wall_time for record in records),
+        "cpu_time": sum(record.cpu_time for record in records),
+        "tests": [record._asdict() for record in records],
+    }
+    _write_atomic(json_path, lambda f: f.write(json.dumps(report, indent=2).encode("utf-8")))
+    _write_atomic(xml_path, lambda f: ET.ElementTree(junit_suite(suite, started, records)).write(
+        f, encoding="utf-8", xml_declaration=True
+    ))
+    return json_path, xml_path
+
+
+def junit_suite(suite, started, records):
+    """Return a JUnit <testsuite> element for `records`"""
+    element = ET.Element("testsuite", {
+        "name": suite,
+        "tests": str(len(records)),
+        "failures": str(sum(1 for record in records if record.status == "failed")),
+        "errors": str(sum(1 for record in records if record.status == "error")),
+        "skipped": str(sum(1 for record in records if record.status == "skipped")),
+        "time": f"{sum(record.wall_time for record in records):.6f}",
+        "timestamp": started,
+        "hostname": socket.gethostname(),
+    })
+    for record in records:
+        case = ET.SubElement(element, "testcase", {
+            "classname": suite,
+            "name": record.name,
+            "time": f"{record.wall_time:.6f}",
+        })
+        if record.status in ("failed", "error"):
+            ET.SubElement(case, "failure" if record.status == "failed" else "error", {
+                "message": record.message or f"{record.name} failed",
+            })
+        elif record.status == "skipped":
+            ET.SubElement(case, "skipped", {"message": record.message or ""})
+        ET.SubElement(case, "system-out").text = (
+            f"cpu_time={record.cpu_time:.6f} peak_memory={record.peak_memory} bytes_read={record.bytes_read}"
+        )
+    return element
+
+
+def load_suite_report(json_path):
+    """Return the TestRecords of a suite JSON report, or None if it is missing or unreadable"""
+    try:
+        with open(json_path, "r") as f:
+            report = json.load(f)
+        return [TestRecord(**test) for test in report["tests"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def write_summary(report_dir, records):
+    """Write every record of the run, slowest first, and return them in that order"""
+    ordered = sorted(records, key=lambda record: record.wall_time, reverse=True)
+    summary = {
+        "wall_time": sum(record.wall_time for record in ordered),
+        "cpu_time": sum(record.cpu_time for record in ordered),
+        "tests": [record._asdict() for record in ordered],
+    }
+    _write_atomic(
+        os.path.join(report_dir, SUMMARY_NAME),
+        lambda f: f.write(json.dumps(summary, indent=2).encode("utf-8")),
+    )
+    return ordered
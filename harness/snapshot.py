@@ -0,0 +1,229 @@
+"""
+Source snapshot shared by the demo mode test suites.
+
+Every watched Kotlin file is loaded once and kept keyed by path, mtime and
+content hash. `run_all_tests.py` writes the snapshot into a memory-mapped store
+(on /dev/shm when available) and passes its location to the suite processes
+through the environment, so the suites read the sources from shared memory
+instead of going back to disk.
+"""
+
+import os
+import json
+import mmap
+import struct
+import hashlib
+import tempfile
+from collections import namedtuple
+
+PROJECT_ROOT = "/app"
+KOTLIN_ROOT = f"{PROJECT_ROOT}/app/src/main/kotlin/io/homeassistant/companion/android"
+
+# Environment variable holding the path of the shared snapshot store
+STORE_ENV = "HA_SOURCE_SNAPSHOT"
+
+WATCHED_FILES = [
+    f"{KOTLIN_ROOT}/demo/DemoModeManager.kt",
+    f"{KOTLIN_ROOT}/demo/DemoEntityRepository.kt",
+    f"{KOTLIN_ROOT}/demo/DemoIntegrationRepository.kt",
+    f"{KOTLIN_ROOT}/demo/DemoWebViewContent.kt",
+    f"{KOTLIN_ROOT}/onboarding/welcome/WelcomeFragment.kt",
+    f"{KOTLIN_ROOT}/onboarding/welcome/WelcomeView.kt",
+    f"{KOTLIN_ROOT}/webview/WebViewActivity.kt",
+    f"{KOTLIN_ROOT}/launch/LaunchActivity.kt",
+]
+
+# Kotlin source roots scanned by the whole-tree checks
+KOTLIN_TREE_ROOTS = [
+    f"{PROJECT_ROOT}/app",
+    f"{PROJECT_ROOT}/common",
+    f"{PROJECT_ROOT}/wear",
+    f"{PROJECT_ROOT}/automotive",
+    f"{PROJECT_ROOT}/build-logic",
+]
+
+# Directories never holding sources worth scanning
+PRUNED_DIRECTORIES = frozenset({"build", ".gradle", ".git", ".idea", ".harness-cache", "node_modules"})
+
+_MAGIC = b"HASNAP01"
+_HEADER = struct.Struct("<8sQ")
+
+SourceFile = namedtuple("SourceFile", ["path", "mtime_ns", "size", "sha256", "text"])
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def list_sources(roots, suffix=".kt"):
+    """Return the sorted paths under `roots` ending in `suffix`, skipping build output"""
+    found = []
+    pending = [root for root in roots if os.path.isdir(root)]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in PRUNED_DIRECTORIES:
+                        pending.append(entry.path)
+                elif entry.name.endswith(suffix):
+                    found.append(entry.path)
+    found.sort()
+    return found
+
+
+def listing_digest(paths):
+    return _digest("\n".join(paths).encode("utf-8"))
+
+
+def tree_key(roots, suffix):
+    return json.dumps([list(roots), suffix])
+
+
+class SourceSnapshot:
+    """Read-once view of the project sources, optionally backed by a shared store"""
+
+    def __init__(self, store_path=None):
+        self._files = {}
+        self._recording = None
+        self._store_index = {}
+        self._store_extras = {}
+        self._store_map = None
+        if store_path:
+            self._attach(store_path)
+
+    @classmethod
+    def from_environment(cls):
+        """Attach to the store published by the orchestrator, if there is one"""
+        return cls(os.environ.get(STORE_ENV))
+
+    def _attach(self, store_path):
+        try:
+            with open(store_path, "rb") as f:
+                self._store_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # A missing or empty store only costs us the disk reads
+            return
+        magic, index_length = _HEADER.unpack_from(self._store_map, 0)
+        if magic != _MAGIC:
+            self._store_map.close()
+            self._store_map = None
+            return
+        index = json.loads(self._store_map[_HEADER.size:_HEADER.size + index_length])
+        data_start = _HEADER.size + index_length
+        for path, (offset, length, mtime_ns, size, sha256) in index["files"].items():
+            self._store_index[path] = (data_start + offset, length, mtime_ns, size, sha256)
+        self._store_extras = index["extras"]
+
+    def extra(self, name):
+        """Return a value the orchestrator published next to the sources, or None"""
+        return self._store_extras.get(name)
+
+    def start_recording(self):
+        """Start collecting the paths read or probed, for the result cache"""
+        self._recording = {"reads": {}, "exists": {}, "trees": {}}
+
+    def stop_recording(self):
+        """Stop collecting and return what was recorded
+
+        {"reads": {path: [mtime_ns, size, sha256]}, "exists": {path: bool},
+        "trees": {tree_key: listing digest}}
+        """
+        recorded, self._recording = self._recording, None
+        return recorded
+
+    def note_read(self, path, mtime_ns, size, sha256):
+        """Record a read done elsewhere, e.g. by a worker process"""
+        if self._recording is not None:
+            self._recording["reads"][path] = [mtime_ns, size, sha256]
+
+    def walk(self, roots, suffix=".kt"):
+        """Return `list_sources(roots, suffix)`, recording the listing itself as an input"""
+        paths = list_sources(roots, suffix)
+        if self._recording is not None:
+            self._recording["trees"][tree_key(roots, suffix)] = listing_digest(paths)
+        return paths
+
+    def exists(self, path):
+        """Return whether `path` exists"""
+        result = os.path.exists(path)
+        if self._recording is not None:
+            self._recording["exists"][path] = result
+        return result
+
+    def get(self, path):
+        """Return the SourceFile for `path`, loading it at most once per mtime"""
+        stat = os.stat(path)
+        entry = self._files.get(path)
+        if entry is None or entry.mtime_ns != stat.st_mtime_ns or entry.size != stat.st_size:
+            entry = self._load_from_store(path, stat) or self._load_from_disk(path)
+            self._files[path] = entry
+        if self._recording is not None:
+            self._recording["reads"][path] = [entry.mtime_ns, entry.size, entry.sha256]
+        return entry
+
+    def read(self, path):
+        """Return the text of `path`"""
+        return self.get(path).text
+
+    def digest(self, path):
+        """Return the sha256 of `path`'s content"""
+        return self.get(path).sha256
+
+    def _load_from_store(self, path, stat):
+        stored = self._store_index.get(path)
+        if stored is None:
+            return None
+        offset, length, mtime_ns, size, sha256 = stored
+        if mtime_ns != stat.st_mtime_ns or size != stat.st_size:
+            # The file changed after the orchestrator took the snapshot
+            return None
+        text = self._store_map[offset:offset + length].decode("utf-8")
+        return SourceFile(path, mtime_ns, size, sha256, text)
+
+    def _load_from_disk(self, path):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            data = f.read()
+        return SourceFile(path, stat.st_mtime_ns, stat.st_size, _digest(data), data.decode("utf-8"))
+
+
+def _store_directory():
+    return "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def write_store(paths=WATCHED_FILES, extras=None, sources=None):
+    """Snapshot `paths` into a new shared store and return the store's path
+
+    Files that do not exist are left out; the suites report them themselves.
+    `extras` is any JSON-serializable data to publish to the suites, and
+    `sources` lets the caller reuse files it already loaded.
+    """
+    sources = sources or SourceSnapshot()
+    files = {}
+    chunks = []
+    offset = 0
+    for path in paths:
+        try:
+            entry = sources.get(path)
+        except OSError:
+            continue
+        data = entry.text.encode("utf-8")
+        files[path] = (offset, len(data), entry.mtime_ns, entry.size, entry.sha256)
+        chunks.append(data)
+        offset += len(data)
+
+    encoded_index = json.dumps({"files": files, "extras": extras or {}}).encode("utf-8")
+    fd, store_path = tempfile.mkstemp(prefix="ha-source-snapshot-", dir=_store_directory())
+    with os.fdopen(fd, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, len(encoded_index)))
+        f.write(encoded_index)
+        for data in chunks:
+            f.write(data)
+    return store_path
+
+
+def remove_store(store_path):
+    try:
+        os.unlink(store_path)
+    except OSError:
+        pass
@@ -0,0 +1,172 @@
+"""
+Base class shared by the demo mode test suites.
+"""
+
+import sys
+import time
+import argparse
+import resource
+import tracemalloc
+from datetime import datetime
+
+from harness.cache import ResultCache, changed_since, depends_on
+from harness.checks import CheckEngine
+from harness.kotlin import KotlinIndex
+from harness.profiling import SuiteProfiler
+from harness.report import REPORT_DIR, TestRecord, bytes_read, write_suite_reports
+from harness.snapshot import PROJECT_ROOT, SourceSnapshot
+
+
+def parse_suite_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a demo mode test suite")
+    parser.add_argument(
+        "--since", metavar="GIT_REF",
+        help="only run tests whose recorded inputs changed since GIT_REF",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="run every test and leave the result cache untouched",
+    )
+    parser.add_argument(
+        "--report-dir", default=REPORT_DIR,
+        help=f"where to write the JSON and JUnit XML reports (default: {REPORT_DIR})",
+    )
+    parser.add_argument(
+        "--no-trace-memory", action="store_true",
+        help="skip tracemalloc peak measurement, which slows allocation-heavy tests down",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        help="profile every test that runs with cProfile and write the stats under PROFILE_DIR",
+    )
+    return parser.parse_args(argv)
+
+
+def _cpu_time():
+    """CPU seconds used by this process and its reaped children (e.g. pool workers)"""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+class DemoSuite:
+    """Runs `test_*` methods, skipping the ones whose inputs did not change
+
+    Every test is measured (see harness.report) and `finish_run` writes the
+    suite's JSON and JUnit XML reports.
+    """
+
+    def __init__(self, argv=None):
+        args = parse_suite_args(argv)
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.tests_skipped = 0
+        self.project_root = PROJECT_ROOT
+        self.sources = SourceSnapshot.from_environment()
+        self.checks = CheckEngine(self.sources)
+        self.kotlin = KotlinIndex(self.sources)
+        self.suite_path = sys.modules[type(self).__module__].__file__
+        self.report_dir = args.report_dir
+        self.trace_memory = not args.no_trace_memory
+        self.profiler = SuiteProfiler(args.profile_dir, self.suite_path) if args.profile_dir else None
+        self.records = []
+        # Test functions and their last recorded inputs, for watch mode
+        self.registered = {}
+        self.inputs = {}
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.cache = None
+        self.changed = None
+        if not args.no_cache:
+            self.cache = ResultCache(type(self).__name__, self.suite_path, self.sources)
+            if args.since:
+                self.changed = changed_since(args.since)
+
+    def run_test(self, name, test_func):
+        """Run a single test"""
+        self.tests_run += 1
+        self.registered[name] = test_func
+        if self.cache is not None and self.cache.is_fresh(name, self.changed):
+            self.inputs[name] = self.cache.entry(name)
+            self.tests_passed += 1
+            self.tests_skipped += 1
+            print(f"⏭️  Skipped - {name} (inputs unchanged)")
+            self.records.append(TestRecord(
+                type(self).__name__, name, "skipped", 0.0, 0.0, 0, 0, "inputs unchanged",
+            ))
+            return True
+
+        print(f"\n🔍 Testing {name}...")
+
+        message = None
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+        cpu_start = _cpu_time()
+        wall_start = time.perf_counter()
+        self.sources.start_recording()
+        try:
+            result = self.profiler.run(name, test_func) if self.profiler else test_func()
+            if result:
+                self.tests_passed += 1
+                print(f"✅ Passed - {name}")
+            else:
+                print(f"❌ Failed - {name}")
+        except Exception as e:
+            print(f"❌ Failed - {name}: {str(e)}")
+            result = False
+            message = f"{type(e).__name__}: {e}"
+        finally:
+            inputs = self.sources.stop_recording()
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = _cpu_time() - cpu_start
+            peak_memory = None
+            if self.trace_memory:
+                peak_memory = max(0, tracemalloc.get_traced_memory()[1] - baseline)
+
+        self.inputs[name] = inputs
+        status = "passed" if result else ("error" if message else "failed")
+        self.records.append(TestRecord(
+            type(self).__name__, name, status, wall_time, cpu_time, peak_memory, bytes_read(inputs), message,
+        ))
+
+        if self.cache is not None:
+            if result:
+                self.cache.record(name, inputs)
+            else:
+                self.cache.forget(name)
+        return result
+
+    def issues(self):
+        """Return the list the suite collects issue messages in, if it has one"""
+        return []
+
+    def affected_by(self, paths):
+        """Return the names of the tests whose last run depended on any of `paths`"""
+        return [name for name, inputs in self.inputs.items() if depends_on(inputs, paths)]
+
+    def rerun(self, name):
+        """Run test `name` again, printing the issues it reports"""
+        issues = self.issues()
+        reported = len(issues)
+        # The paths changed since --since were listed at start-up and miss the edits made while watching,
+        # so reruns compare the recorded inputs with the disk instead
+        self.changed = None
+        result = self.run_test(name, self.registered[name])
+        for issue in issues[reported:]:
+            print(f"  - {issue}")
+        return result
+
+    def finish_run(self):
+        """Persist the result cache and the reports, and report how many tests the cache saved"""
+        if self.cache is not None:
+            self.cache.save()
+        tracemalloc.stop()
+        if self.profiler is not None:
+            self.profiler.finish()
+        try:
+            write_suite_reports(self.report_dir, self.suite_path, type(self).__name__, self.started, self.records)
+        except OSError as e:
+            print(f"⚠️  Could not write test reports to {self.report_dir}: {e}")
+        if self.tests_skipped:
+            print(f"\n⏭️  {self.tests_skipped} test(s) skipped, inputs unchanged since their last pass")
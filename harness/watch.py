@@ -0,0 +1,199 @@
+"""
+Watch mode for the demo mode suites (`run_all_tests.py --watch`).
+
+The suites run once in-process, which records the inputs of every test. After
+that, the directories holding those inputs (the demo, webview, launch and
+welcome sources, the check spec, and the Kotlin trees of the whole-tree
+checks) are watched with inotify, through ctypes, or by polling when inotify
+is unavailable. A save re-runs only the tests whose recorded inputs include
+the changed file, in the same process, so results print without paying for
+interpreter start-up or re-reading unchanged sources.
+"""
+
+import os
+import time
+import ctypes
+import select
+import struct
+import importlib
+import ctypes.util
+
+from harness.suite import DemoSuite
+
+# Extra time to wait after the first event, so that an editor's
+# write-then-rename save arrives as one batch
+DEBOUNCE_SECONDS = 0.02
+POLL_INTERVAL = 0.05
+
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Directory watcher on the Linux inotify API, called through ctypes"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.directories = {}
+        self.watched = set()
+
+    def update(self, directories):
+        for directory in set(directories) - self.watched:
+            descriptor = self._add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+            if descriptor >= 0:
+                self.directories[descriptor] = directory
+                self.watched.add(directory)
+
+    def _drain(self):
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                descriptor, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & _IN_Q_OVERFLOW:
+                    # Events were lost: treat every file in a watched directory as changed
+                    for directory in self.directories.values():
+                        changed.update(os.path.join(directory, entry) for entry in os.listdir(directory))
+                elif descriptor in self.directories and name:
+                    changed.add(os.path.join(self.directories[descriptor], os.fsdecode(name)))
+
+    def wait(self):
+        """Block until something changes and return the changed paths"""
+        while True:
+            select.select([self.fd], [], [])
+            changed = self._drain()
+            if changed:
+                time.sleep(DEBOUNCE_SECONDS)
+                return changed | self._drain()
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback watcher comparing directory listings and file stats"""
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.watched = set()
+        self.state = {}
+
+    def _scan(self, directory):
+        found = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        found[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass
+        return found
+
+    def update(self, directories):
+        for directory in set(directories) - self.watched:
+            self.watched.add(directory)
+            self.state.update(self._scan(directory))
+
+    def wait(self):
+        """Poll until something changes and return the changed paths"""
+        while True:
+            time.sleep(self.interval)
+            current = {}
+            for directory in self.watched:
+                current.update(self._scan(directory))
+            changed = {
+                path for path in current.keys() | self.state.keys()
+                if current.get(path) != self.state.get(path)
+            }
+            self.state = current
+            if changed:
+                return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher():
+    """Return an inotify watcher, or a polling one where inotify is unavailable"""
+    try:
+        return InotifyWatcher()
+    except (OSError, AttributeError) as e:
+        print(f"⚠️  inotify unavailable ({e}), polling every {POLL_INTERVAL * 1000:.0f} ms")
+        return PollingWatcher()
+
+
+def load_suites(scripts, argv):
+    """Import the suite scripts and instantiate their DemoSuite subclasses"""
+    suites = []
+    for script in scripts:
+        module = importlib.import_module(os.path.splitext(os.path.basename(script))[0])
+        for value in vars(module).values():
+            if isinstance(value, type) and issubclass(value, DemoSuite) and value.__module__ == module.__name__:
+                suites.append(value(argv))
+    return suites
+
+
+def watched_directories(suites):
+    directories = set()
+    for suite in suites:
+        for inputs in suite.inputs.values():
+            directories.update(os.path.dirname(path) for path in (*inputs["reads"], *inputs["exists"]))
+    return {directory for directory in directories if os.path.isdir(directory)}
+
+
+def watch(scripts, argv=()):
+    """Run the suites once, then re-run the tests affected by every change until interrupted"""
+    suites = load_suites(scripts, list(argv))
+    for suite in suites:
+        suite.run_all_tests()
+
+    watcher = open_watcher()
+    try:
+        watcher.update(watched_directories(suites))
+        print(f"\n👀 Watching {len(watcher.watched)} directories for changes (Ctrl+C to stop)", flush=True)
+        while True:
+            changed = watcher.wait()
+            started = time.perf_counter()
+            rerun = passed = 0
+            for suite in suites:
+                for name in suite.affected_by(changed):
+                    rerun += 1
+                    passed += bool(suite.rerun(name))
+                if suite.cache is not None:
+                    suite.cache.save()
+            if not rerun:
+                continue
+            elapsed = (time.perf_counter() - started) * 1000
+            names = ", ".join(sorted(
+                os.path.basename(path) for path in changed
+                if any(suite.affected_by({path}) for suite in suites)
+            ))
+            status = "✅" if passed == rerun else "❌"
+            print(f"{status} {passed}/{rerun} affected test(s) passed in {elapsed:.0f} ms after changes to {names}", flush=True)
+            watcher.update(watched_directories(suites))
+    except KeyboardInterrupt:
+        print("\n👋 Stopped watching")
+    finally:
+        watcher.close()
+    return 0
@@ -2,65 +2,285 @@
 """
 Comprehensive Test Suite for Home Assistant Android Demo Mode
 
-This script runs all test suites and provides a comprehensive report.
+This script runs all test suites concurrently and provides a comprehensive report.
+Each suite's output is streamed live, prefixed with the suite name, and the
+watched sources are snapshotted once, together with the evaluated check spec,
+into a shared store the suites read from.
 """
 
 import sys
-import subprocess
+import os
+import argparse
+import asyncio
+import pstats
 from datetime import datetime
 
-def run_test_suite(script_name, description):
-    """Run a test suite and return results"""
-    print(f"\n{'='*60}")
-    print(f"🧪 Running {description}")
-    print(f"{'='*60}")
-    
-    try:
-        result = subprocess.run([sys.executable, script_name], 
-                              capture_output=True, text=True, cwd="/app")
-        
-        print(result.stdout)
-        if result.stderr:
-            print("STDERR:", result.stderr)
-        
-        return result.returncode == 0, result.stdout
-    except Exception as e:
-        print(f"❌ Error running {script_name}: {str(e)}")
-        return False, str(e)
-
-def main():
+from harness.checks import SHARED_RESULTS, CheckEngine
+from harness.profiling import COLLAPSED_NAME, MERGED_NAME, merge_profiles, test_breakdown
+from harness.report import REPORT_DIR, SUMMARY_NAME, format_bytes, load_suite_report, report_paths, write_summary
+from harness.watch import watch
+from harness.snapshot import STORE_ENV, SourceSnapshot, write_store, remove_store
+
+PROJECT_ROOT = "/app"
+
+# (script, description, output prefix)
+TEST_SUITES = [
+    ("backend_test.py", "Basic Demo Mode Implementation Tests", "backend"),
+    ("compilation_test.py", "Advanced Compilation Readiness Tests", "compilation"),
+    ("integration_test.py", "Demo Mode Integration Flow Tests", "integration"),
+]
+
+DEFAULT_TIMEOUT = 300.0
+
+# Number of tests listed in the slowest-tests summary
+SLOWEST_SHOWN = 10
+
+STATUS_LABELS = {
+    "passed": "✅ PASSED",
+    "failed": "❌ FAILED",
+    "timeout": "⏱️  TIMEOUT",
+    "cancelled": "⏹️  CANCELLED",
+    "error": "❌ ERROR",
+}
+
+
+async def stream_output(stream, prefix, lines):
+    """Print every line of a suite's output as it arrives"""
+    while True:
+        raw = await stream.readline()
+        if not raw:
+            break
+        line = raw.decode("utf-8", errors="replace").rstrip("\n")
+        lines.append(line)
+        print(f"[{prefix}] {line}", flush=True)
+
+
+async def run_test_suite(script_name, description, prefix, semaphore, timeout, env, suite_args):
+    """Run a test suite and return (description, status, output)"""
+    lines = []
+    async with semaphore:
+        print(f"🧪 [{prefix}] Running {description}", flush=True)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, script_name, *suite_args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=PROJECT_ROOT,
+                env=env,
+            )
+        except Exception as e:
+            print(f"❌ Error running {script_name}: {str(e)}", flush=True)
+            return description, "error", str(e)
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(stream_output(process.stdout, prefix, lines), process.wait()),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            await stop_process(process)
+            print(f"⏱️  [{prefix}] Timed out after {timeout:g}s", flush=True)
+            return description, "timeout", "\n".join(lines)
+        except asyncio.CancelledError:
+            await stop_process(process)
+            raise
+
+    status = "passed" if process.returncode == 0 else "failed"
+    return description, status, "\n".join(lines)
+
+
+async def stop_process(process):
+    """Kill a suite process that is still running and reap it"""
+    if process.returncode is None:
+        process.kill()
+        await process.wait()
+
+
+async def run_test_suites(test_suites, jobs, timeout, fail_fast, env, suite_args=()):
+    """Run the suites with at most `jobs` at a time, in suite order in the result"""
+    semaphore = asyncio.Semaphore(jobs)
+    tasks = [
+        asyncio.create_task(run_test_suite(
+            script, description, prefix, semaphore, timeout, env, suite_args
+        ))
+        for script, description, prefix in test_suites
+    ]
+
+    if fail_fast:
+        for next_done in asyncio.as_completed(tasks):
+            _, status, _ = await next_done
+            if status != "passed":
+                for task in tasks:
+                    task.cancel()
+                break
+
+    results = []
+    for (script, description, prefix), outcome in zip(
+        test_suites, await asyncio.gather(*tasks, return_exceptions=True)
+    ):
+        if isinstance(outcome, asyncio.CancelledError):
+            results.append((description, "cancelled", ""))
+        elif isinstance(outcome, BaseException):
+            results.append((description, "error", str(outcome)))
+        else:
+            results.append(outcome)
+    return results
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run all demo mode test suites")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=len(TEST_SUITES),
+        help="maximum number of suites running at the same time (default: all)",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=DEFAULT_TIMEOUT,
+        help=f"per-suite timeout in seconds (default: {DEFAULT_TIMEOUT:g})",
+    )
+    parser.add_argument(
+        "--fail-fast", action="store_true",
+        help="cancel the remaining suites as soon as one fails",
+    )
+    parser.add_argument(
+        "--since", metavar="GIT_REF",
+        help="only run tests whose recorded inputs changed since GIT_REF (git diff)",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="run every test instead of skipping the ones whose inputs are unchanged",
+    )
+    parser.add_argument(
+        "--no-trace-memory", action="store_true",
+        help="skip the per-test tracemalloc peak, which inflates the timings of allocation-heavy tests",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="run every test under cProfile and merge the stats (combine with --no-cache to profile all tests)",
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="run the suites once in-process, then re-run the tests affected by each saved change",
+    )
+    parser.add_argument(
+        "--report-dir", default=REPORT_DIR,
+        help=f"where the suites write their JSON and JUnit XML reports (default: {REPORT_DIR})",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return args
+
+
+def print_slowest_tests(report_dir):
+    """Merge the suite reports into the run summary and print the slowest tests"""
+    records = []
+    for script, description, _ in TEST_SUITES:
+        suite_records = load_suite_report(report_paths(report_dir, script)[0])
+        if suite_records is None:
+            print(f"⚠️  No test report from {description}")
+            continue
+        records.extend(suite_records)
+    if not records:
+        return
+    ordered = write_summary(report_dir, records)
+
+    print(f"\n⏱️  SLOWEST TESTS (full summary in {os.path.join(report_dir, SUMMARY_NAME)})")
+    print(f"{'wall':>9} {'cpu':>9} {'peak mem':>10} {'read':>10}  test")
+    for record in ordered[:SLOWEST_SHOWN]:
+        if record.status == "skipped":
+            break
+        print(
+            f"{record.wall_time:8.3f}s {record.cpu_time:8.3f}s {format_bytes(record.peak_memory):>10} "
+            f"{format_bytes(record.bytes_read):>10}  {record.suite} :: {record.name}"
+        )
+    total_wall = sum(record.wall_time for record in ordered)
+    total_cpu = sum(record.cpu_time for record in ordered)
+    print(f"Total: {total_wall:.3f}s wall, {total_cpu:.3f}s CPU across {len(ordered)} tests")
+
+
+def print_profile(profile_dir):
+    """Merge the suites' profiles and print where the time went, per test and overall"""
+    breakdown = merge_profiles(profile_dir, [script for script, _, _ in TEST_SUITES])
+    if not breakdown:
+        print("\n⚠️  No profiles were recorded (all tests skipped? try --no-cache)")
+        return
+
+    print(f"\n🔬 PROFILE BY TEST (self time of the hottest functions)")
+    for suite, name, seconds, hottest in breakdown[:SLOWEST_SHOWN]:
+        print(f"{seconds:8.3f}s  {suite} :: {name}")
+        for label, self_seconds in hottest:
+            print(f"{'':12}{self_seconds:8.3f}s  {label}")
+
+    merged_path = os.path.join(profile_dir, MERGED_NAME)
+    _, hottest = test_breakdown(pstats.Stats(merged_path), top=SLOWEST_SHOWN)
+    print(f"\n🔥 HOTTEST FUNCTIONS ACROSS ALL SUITES (self time)")
+    for label, self_seconds in hottest:
+        print(f"{self_seconds:8.3f}s  {label}")
+    print(f"\nMerged stats: {merged_path} (python3 -m pstats)")
+    print(f"Collapsed stacks: {os.path.join(profile_dir, COLLAPSED_NAME)} (flamegraph.pl, speedscope)")
+
+
+def main(argv=None):
     """Run comprehensive test suite"""
+    args = parse_args(argv)
+
     print("🚀 Home Assistant Android Demo Mode - Comprehensive Test Suite")
     print(f"📅 Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("="*80)
-    
-    test_suites = [
-        ("backend_test.py", "Basic Demo Mode Implementation Tests"),
-        ("compilation_test.py", "Advanced Compilation Readiness Tests"),
-        ("integration_test.py", "Demo Mode Integration Flow Tests")
-    ]
-    
-    results = []
-    total_passed = 0
-    total_suites = len(test_suites)
-    
-    for script, description in test_suites:
-        passed, output = run_test_suite(script, description)
-        results.append((description, passed, output))
-        if passed:
-            total_passed += 1
-    
+    print("="*80, flush=True)
+
+    suite_args = []
+    if args.since:
+        suite_args += ["--since", args.since]
+    if args.no_cache:
+        suite_args.append("--no-cache")
+    if args.no_trace_memory:
+        suite_args.append("--no-trace-memory")
+    suite_args += ["--report-dir", args.report_dir]
+    profile_dir = os.path.join(args.report_dir, "profile")
+    if args.profile:
+        suite_args += ["--profile-dir", profile_dir]
+
+    # A suite that dies before reporting must not leave last run's report behind
+    for script, _, _ in TEST_SUITES:
+        for path in report_paths(args.report_dir, script):
+            if os.path.exists(path):
+                os.remove(path)
+
+    if args.watch:
+        # Memory tracing would only slow the re-runs down
+        if "--no-trace-memory" not in suite_args:
+            suite_args.append("--no-trace-memory")
+        return watch([script for script, _, _ in TEST_SUITES], suite_args)
+
+    # Evaluate the check spec once for all suites and publish it with the sources
+    sources = SourceSnapshot()
+    checks = CheckEngine(sources).evaluate_all()
+    store_path = write_store(extras={SHARED_RESULTS: checks}, sources=sources)
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    env[STORE_ENV] = store_path
+    try:
+        results = asyncio.run(run_test_suites(
+            TEST_SUITES, args.jobs, args.timeout, args.fail_fast, env, suite_args
+        ))
+    finally:
+        remove_store(store_path)
+    total_passed = sum(1 for _, status, _ in results if status == "passed")
+    total_suites = len(results)
+
     # Final Summary
     print(f"\n{'='*80}")
     print("📊 COMPREHENSIVE TEST RESULTS SUMMARY")
     print(f"{'='*80}")
-    
-    for description, passed, output in results:
-        status = "✅ PASSED" if passed else "❌ FAILED"
-        print(f"{status} - {description}")
-    
+
+    for description, status, output in results:
+        print(f"{STATUS_LABELS[status]} - {description}")
+
+    print_slowest_tests(args.report_dir)
+    if args.profile:
+        print_profile(profile_dir)
+
     print(f"\n🎯 Overall Results: {total_passed}/{total_suites} test suites passed")
-    
+
     if total_passed == total_suites:
         print("\n🎉 ALL TESTS PASSED! Demo mode implementation is ready.")
         print("\n✅ Key Findings:")
@@ -74,7 +294,7 @@ def main():
         print("  • UI includes responsive design and interactive elements")
         print("  • Entity actions (turn_on, turn_off, toggle, lock, unlock) are simulated")
         print("  • Code appears ready for Android compilation")
-        
+
         print("\n🔧 Demo Mode Features Verified:")
         print("  • 'Try Demo Mode' button in welcome screen")
         print("  • Demo server infrastructure (DemoModeManager, DemoEntityRepository, etc.)")
@@ -83,7 +303,7 @@ def main():
         print("  • Launch activity integration for demo startup flow")
         print("  • Dynamic sensor updates and interactive controls")
         print("  • Responsive UI design for different screen sizes")
-        
+
         return 0
     else:
         print(f"\n❌ {total_suites - total_passed} test suite(s) failed.")
@@ -91,4 +311,4 @@ def main():
         return 1
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main())